@@ -1,70 +1,100 @@
 import streamlit as st
-import boto3
 import requests
+import contextlib
+import functools
 import uuid
-# import os # Removed as unused
+import time
+import zipfile
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError, ClientError
 import pandas as pd # Added for st.dataframe
+try: # Private API, only used to shed queued calls of closed sessions
+    from streamlit.runtime import Runtime
+except ImportError:
+    Runtime = None
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from cactus_pipeline import (
+    ALLOWED_EXTENSIONS,
+    API_ENDPOINT_ROUTE_MULTI_DOCS,
+    API_ENDPOINT_ROUTE_RENT_ROLL,
+    MULTI_DOC_SLOTS,
+    MULTI_DOCS_PROPERTY_TYPE,
+    Settings,
+    is_allowed_file,
+)
+from cactus_pipeline.analytics import TOP_TENANT_COUNT, rent_roll_analytics
+from cactus_pipeline.batch import ZipTooLargeError, properties_from_zip
+from cactus_pipeline.cache import ResultCache
+from cactus_pipeline.clients import make_http_session, make_s3_client
+from cactus_pipeline.jobs import JobRegistry, next_poll_delay, FINAL_JOB_STATUSES, JOB_POLL_INITIAL_INTERVAL_SECONDS
+from cactus_pipeline.pipeline import Pipeline, describe_result
+from cactus_pipeline.exports import EXPORT_FORMATS, EXPORT_MIME_TYPES, export_frame
+from cactus_pipeline.rent_roll import RENT_ROLL_ROWS_KEY, date_columns, query_rent_roll
 
 st.set_page_config(layout="wide", initial_sidebar_state="collapsed") # Start with sidebar collapsed
 
+ANONYMOUS_USER_PREFIX = "anonymous:" # Owner of runs and jobs from sessions nobody signed in to (see may_open)
+
 # --- Initialize Session State ---
 if 'view' not in st.session_state: # For Multi-Docs Flow
     st.session_state.view = 'upload'
-if 'analysis_results' not in st.session_state: # For Multi-Docs Flow
-    st.session_state.analysis_results = None
+if 'analysis_run' not in st.session_state: # For Multi-Docs Flow: run_id of the shown result (payload lives in the run store)
+    st.session_state.analysis_run = None
 if 'analysis_nav' not in st.session_state: # For Multi-Docs Flow
     st.session_state.analysis_nav = None
 
 if 'run_id' not in st.session_state:
     st.session_state.run_id = str(uuid.uuid4())
+if 'anonymous_user' not in st.session_state: # Owner of this session's runs when nobody is signed in
+    st.session_state.anonymous_user = f"{ANONYMOUS_USER_PREFIX}{uuid.uuid4()}"
 
 # New session states for flow selection and Commercial Rent Roll
 if 'selected_flow' not in st.session_state:
     st.session_state.selected_flow = "Multi-Docs Smart Analysis" # Default flow
 if 'view_rent_roll' not in st.session_state: # For Rent Roll Flow
     st.session_state.view_rent_roll = 'upload_rr'
-if 'rent_roll_analysis_results' not in st.session_state: # For Rent Roll Flow
-    st.session_state.rent_roll_analysis_results = None
+if 'rent_roll_run' not in st.session_state: # For Rent Roll Flow: run_id of the shown result
+    st.session_state.rent_roll_run = None
+if 'batch_runs' not in st.session_state: # Last batch per flow: summary rows + run_ids of stored results
+    st.session_state.batch_runs = {}
+if 'staged_uploads' not in st.session_state: # Per flow: ((run_id, content_addressed), SpeculativeUploads)
+    st.session_state.staged_uploads = {}
 
 
 # --- Configuration & Secrets ---
 try:
-    # AWS/API Config
-    AWS_ACCESS_KEY_ID = st.secrets["AWS_ACCESS_KEY_ID"]
-    AWS_SECRET_ACCESS_KEY = st.secrets["AWS_SECRET_ACCESS_KEY"]
-    AWS_REGION = st.secrets["AWS_REGION"]
-    S3_BUCKET_NAME = st.secrets["S3_BUCKET_NAME"]
-    API_BASE_URL_MULTI_DOCS = st.secrets["API_BASE_URL"].rstrip('/') # Existing API for multi-docs
-
-    # Load new secret for Commercial Rent Roll API
-    # User needs to add this to .streamlit/secrets.toml
-    if "API_BASE_URL_COMMERCIAL_RENT_ROLL" in st.secrets:
-        API_BASE_URL_COMMERCIAL_RENT_ROLL = st.secrets["API_BASE_URL_COMMERCIAL_RENT_ROLL"].rstrip('/')
-    else:
-        API_BASE_URL_COMMERCIAL_RENT_ROLL = None # Will be checked before use
-
+    # AWS/API Config; API_BASE_URL_COMMERCIAL_RENT_ROLL is optional and checked before use
+    SETTINGS = Settings.from_mapping(
+        st.secrets, required=("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_REGION", "S3_BUCKET_NAME", "API_BASE_URL")
+    )
 except KeyError as e:
     # Adjusted error message slightly
     st.error(f"Missing a required secret in .streamlit/secrets.toml: {e}. Please ensure AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, S3_BUCKET_NAME, API_BASE_URL are set. If using Commercial Rent Roll, API_BASE_URL_COMMERCIAL_RENT_ROLL is also needed.")
     st.stop()
 
-API_ENDPOINT_ROUTE_MULTI_DOCS = "cactus-ai-multi-docs-smart-analysis"
-API_ENDPOINT_ROUTE_RENT_ROLL = "cactus-ai-commercial-rent-roll" # New route
-S3_BASE_FOLDER = "USER#2/ai-agent-rentroll-parser"
-ALLOWED_EXTENSIONS = ['pdf', 'xlsx', 'xls']
+API_BASE_URL_MULTI_DOCS = SETTINGS.api_base_url_multi_docs
+API_BASE_URL_COMMERCIAL_RENT_ROLL = SETTINGS.api_base_url_commercial_rent_roll
+
+JOB_POLL_TICK_SECONDS = 1 # How often the job status panel wakes up; the backend is polled less often (with backoff)
+BATCH_MAX_PARALLEL_LIMIT = 16
+RENT_ROLL_PAGE_SIZES = [50, 100, 250, 500, 1000] # Rows sent to the browser per page of the rent roll table
+RECENT_RUNS_LIMIT = 25 # Runs offered in the sidebar's "Recent runs" picker
+UPLOAD_SWEEP_INTERVAL_SECONDS = 60 * 60 # How often abandoned multipart uploads are looked for
+FLOW_ROUTES = {"Multi-Docs Smart Analysis": API_ENDPOINT_ROUTE_MULTI_DOCS, "Commercial Rent Roll Analysis": API_ENDPOINT_ROUTE_RENT_ROLL}
+FLOW_BACKEND_URLS = {"Multi-Docs Smart Analysis": API_BASE_URL_MULTI_DOCS, "Commercial Rent Roll Analysis": API_BASE_URL_COMMERCIAL_RENT_ROLL}
+
+if 'content_addressed_uploads' not in st.session_state:
+    st.session_state.content_addressed_uploads = SETTINGS.content_addressed_uploads
+if 'excel_preprocessing' not in st.session_state:
+    st.session_state.excel_preprocessing = SETTINGS.excel_preprocessing
+if 'job_mode' not in st.session_state:
+    st.session_state.job_mode = SETTINGS.api_job_mode
 
 # --- S3 Client (Initialize directly) ---
 @st.cache_resource
 def get_s3_client():
     try:
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            region_name=AWS_REGION
-        )
-        return s3_client
+        return make_s3_client(SETTINGS)
     except (NoCredentialsError, PartialCredentialsError):
         st.error("AWS credentials not found or incomplete. Check your secrets.toml.")
         return None
@@ -77,30 +107,576 @@ def get_s3_client():
 
 s3_client = get_s3_client() # Initialize directly
 
+# --- Pipeline (pooled HTTP session, result cache and job registry shared by all sessions) ---
+@st.cache_resource
+def get_pipeline():
+    return Pipeline(
+        SETTINGS,
+        s3_client=s3_client,
+        http_session=make_http_session(),
+        result_cache=ResultCache(SETTINGS.result_cache_path, SETTINGS.result_cache_max_mb * 1024 * 1024, SETTINGS.result_cache_ttl_hours * 3600),
+        job_registry=JobRegistry(SETTINGS.job_registry_path),
+    )
+
+pipeline = get_pipeline()
+result_cache = pipeline.result_cache
+job_registry = pipeline.job_registry
+run_store = pipeline.run_store
+
+@st.cache_resource(ttl=UPLOAD_SWEEP_INTERVAL_SECONDS, show_spinner=False)
+def schedule_upload_sweep():
+    """Abort abandoned multipart uploads in the background, at most once per interval per process."""
+    if s3_client is None:
+        return None
+    return pipeline.staging_executor.submit(pipeline.sweep_uploads)
+
+schedule_upload_sweep()
+
+# --- Helper Functions ---
+def upload_with_progress(files_by_slot, run_id, slot_labels=None, digests=None, staged=None):
+    """Upload through the pipeline with a total bar plus one bar per file (``staged``: uploads already under way)."""
+    slot_labels = slot_labels or {}
+    total_bar = st.progress(0.0, text="Uploading files ...")
+    file_bars = {slot: st.progress(0.0, text=f"{slot_labels.get(slot, slot)}: {f.name}") for slot, f in files_by_slot.items()}
+
+    def _render(progress):
+        total_bar.progress(progress.overall_fraction(), text=f"Uploading {len(files_by_slot)} file(s) ...")
+        for slot, bar in file_bars.items():
+            status = "done" if slot in progress.done else f"{progress.fraction(slot):.0%}"
+            bar.progress(progress.fraction(slot), text=f"{slot_labels.get(slot, slot)}: {progress.names[slot]} ({status})")
+
+    s3_keys, errors, progress = pipeline.upload(
+        files_by_slot, run_id, on_progress=_render,
+        content_addressed=st.session_state.content_addressed_uploads, digests=digests, staged=staged,
+    )
+    total_bar.progress(1.0, text=f"Uploaded {len(s3_keys)} of {len(files_by_slot)} file(s)")
+    for slot in s3_keys:
+        if slot in progress.reused:
+            st.info(f"{files_by_slot[slot].name} is unchanged since an earlier run; reused the copy already in S3")
+        else:
+            st.info(f"Successfully uploaded {files_by_slot[slot].name}")
+    for slot, message in errors.items():
+        st.error(f"{slot_labels.get(slot, slot)}: {message}")
+    return s3_keys, errors
+
+def preprocess_uploads(files_by_slot, s3_keys):
+    """Normalized sheets + manifest for the uploaded Excel files, if enabled in the sidebar. Returns slot -> manifest S3 key."""
+    if not st.session_state.excel_preprocessing:
+        return {}
+    with st.spinner("Pre-processing Excel sheets ..."):
+        return pipeline.preprocess_excel(files_by_slot, s3_keys, st.session_state.run_id)
+
+def staged_uploads_for(flow):
+    """The session's speculative uploads for ``flow``; a new run or upload mode cancels the old ones and starts over."""
+    mode = (st.session_state.run_id, st.session_state.content_addressed_uploads)
+    current = st.session_state.staged_uploads.get(flow)
+    if current is None or current[0] != mode:
+        if current is not None:
+            current[1].cancel_all()
+        current = (mode, pipeline.stage_uploads(*mode))
+        st.session_state.staged_uploads[flow] = current
+    return current[1]
 
-# --- Helper Functions (upload_to_s3, is_allowed_file) ---
-def upload_to_s3(file_obj, bucket_name, s3_folder, s3_client_instance):
-    if file_obj is None or s3_client_instance is None:
-        return ""
+def stage_files(flow, files_by_slot):
+    """Start uploading staged files right away, so the Run button only waits for what is still in flight.
 
-    file_name = file_obj.name
+    Nothing is staged for a flow whose backend URL is not configured: it can never be run.
+    """
+    if s3_client is None or FLOW_BACKEND_URLS[flow] is None:
+        return None
+    staged = staged_uploads_for(flow)
+    staged.sync({slot: f for slot, f in files_by_slot.items() if f and is_allowed_file(f.name)})
+    return staged
 
-    s3_key = f"{s3_folder}/{file_name}"
+def cancel_staged_uploads():
+    for _, staged in st.session_state.staged_uploads.values():
+        staged.cancel_all()
+    st.session_state.staged_uploads = {}
+
+# --- Backend Jobs (submit, poll, resume by run_id) ---
+def track_job(job):
+    """Make ``job`` the pending job of its flow and switch that flow to its job view."""
+    job = {**job, "poll_interval": JOB_POLL_INITIAL_INTERVAL_SECONDS, "next_poll_at": time.time(), "error": None}
+    st.session_state.pending_jobs[job["flow"]] = job
+    st.session_state.run_id = job["run_id"]
+    st.query_params["run_id"] = job["run_id"] # A page reload resumes the job from the URL
+    if job["flow"] == "Multi-Docs Smart Analysis":
+        st.session_state.view = 'job'
+    else:
+        st.session_state.view_rent_roll = 'job_rr'
+
+def forget_job(flow):
+    st.session_state.pending_jobs.pop(flow, None)
+    drop_run_from_url()
+
+def drop_run_from_url():
+    if "run_id" in st.query_params:
+        del st.query_params["run_id"]
+
+def start_backend_job(flow, route, payload, cache_key):
+    """Submit a job for the current run and start tracking it. Returns False (after showing the error) on failure."""
     try:
-        s3_client_instance.upload_fileobj(file_obj, bucket_name, s3_key)
-        st.info(f"Successfully uploaded {file_name}")
-        return s3_key
-    except ClientError as e:
-        st.error(f"Failed to upload {file_name} to S3: {e}")
-        return ""
-    except Exception as e:
-        st.error(f"An unexpected error occurred during S3 upload of {file_name}: {e}")
-        return ""
+        job_id = pipeline.submit_job(route, payload)
+    except requests.exceptions.HTTPError as http_err:
+        st.error(f"Job submission failed with HTTP error: {http_err}")
+        try: st.error(f"Error details from API: {http_err.response.json()}")
+        except ValueError: st.error(f"Response content from API: {http_err.response.text}")
+        return False
+    except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+        st.error(f"Job submission failed: {e}")
+        return False
+    job = {
+        "run_id": payload["run_id"], "flow": flow, "base_url": SETTINGS.base_url_for(route), "route": route, "job_id": job_id,
+        "cache_key": cache_key, "status": "queued", "submitted_at": time.time(), "user": current_user(),
+    }
+    job_registry.record(job)
+    track_job(job)
+    return True
+
+def resume_job_by_run_id():
+    """Sidebar callback: pick a previously submitted job back up from its run_id."""
+    run_id = st.session_state.resume_run_id_input.strip()
+    job = job_registry.get(run_id) if run_id else None
+    if job is None or not may_open(job["user"]): # Someone else's job is reported like an unknown one
+        st.session_state.resume_job_message = f"No job was submitted from this app for run ID '{run_id}'."
+        return
+    st.session_state.resume_job_message = None
+    # Switch to the job's flow before the flow radio is rendered
+    st.session_state.selected_flow = job["flow"]
+    st.session_state.flow_selection_radio = job["flow"]
+    track_job(job)
+
+@st.fragment(run_every=JOB_POLL_TICK_SECONDS)
+def render_job_status(flow, on_success):
+    """Poll the flow's pending job with backoff and hand a finished result to ``on_success``.
+
+    Runs as a fragment so only this panel reruns while waiting; the script
+    thread is free between ticks.
+    """
+    job = st.session_state.pending_jobs.get(flow)
+    if job is None:
+        return
+    now = time.time()
+    if job["status"] not in FINAL_JOB_STATUSES and now >= job["next_poll_at"]:
+        try:
+            job_state = pipeline.job_status(job["route"], job["job_id"], base_url=job["base_url"])
+            job["status"] = job_state.get("status", "unknown")
+            job["error"] = job_state.get("error")
+            job["poll_warning"] = None
+        except requests.exceptions.HTTPError as http_err:
+            if http_err.response is not None and http_err.response.status_code == 404:
+                job["status"], job["error"] = "failed", "The backend no longer knows this job."
+            else:
+                job["poll_warning"] = f"Status check failed, will retry: {http_err}"
+        except (requests.exceptions.RequestException, ValueError) as e: # Transient: keep polling
+            job["poll_warning"] = f"Status check failed, will retry: {e}"
+        job["poll_interval"], poll_delay = next_poll_delay(job["poll_interval"])
+        job["next_poll_at"] = now + poll_delay
+
+        if job["status"] == "succeeded":
+            job_registry.set_status(job["run_id"], "succeeded")
+            pipeline.tracer.record(job["run_id"], "job_wait", now - job["submitted_at"], route=job["route"])
+            forget_job(flow)
+            on_success(job_state.get("result") or {}, job["cache_key"])
+            st.rerun() # Full rerun to show the results view
+        if job["status"] == "failed":
+            job_registry.set_status(job["run_id"], "failed")
+
+    elapsed = int(now - job["submitted_at"])
+    if job["status"] == "failed":
+        st.error(f"Analysis job {job['job_id']} failed: {job.get('error') or 'no details from the backend'}")
+    else:
+        st.info(
+            f"Analysis job {job['job_id']} is **{job['status']}** ({elapsed // 60}m {elapsed % 60:02d}s elapsed, "
+            f"next check in {max(0, int(job['next_poll_at'] - now))}s). You can switch flows or reload the page; "
+            f"the job resumes from run ID `{job['run_id']}`."
+        )
+    if job.get("poll_warning"):
+        st.warning(job["poll_warning"])
+    if st.button("Back to upload" if job["status"] == "failed" else "Stop waiting", key=f"stop_job_{flow}"):
+        forget_job(flow)
+        if flow == "Multi-Docs Smart Analysis":
+            st.session_state.view = 'upload'
+        else:
+            st.session_state.view_rent_roll = 'upload_rr'
+        st.session_state.run_id = str(uuid.uuid4())
+        st.rerun()
+
+def render_timing_panel(run_id, route, render_started):
+    """Record how long the results view took to render, then show the run's stage timings if enabled."""
+    pipeline.tracer.record(run_id, "render", time.perf_counter() - render_started, route=route)
+    if not st.session_state.show_timings:
+        return
+    trace = pipeline.tracer.get(run_id)
+    with st.expander("Timing breakdown", expanded=True):
+        rows = trace.rows() if trace else []
+        if not rows:
+            st.caption("No timings were recorded for this run by this server process.")
+            return
+        st.dataframe(pd.DataFrame(rows), hide_index=True)
+        st.caption(f"Run ID `{run_id}`: {sum(row['Seconds'] for row in rows):.2f}s across {len(rows)} stage(s)")
+
+# --- Rent Roll Results Table (server-side search, sort and paging) ---
+@st.cache_data(max_entries=32, show_spinner=False)
+def rent_roll_view_positions(run_id, row_count, search, date_column, date_from, date_to, sort_by, descending, _frame):
+    """Row positions for the table controls, memoized per run and query so paging through them is free."""
+    return query_rent_roll(_frame, search, date_column, date_from, date_to, sort_by, descending)
+
+@st.fragment
+def render_rent_roll_table(run_id, frame):
+    """One page of the rent roll at a time; filtering and sorting run here, not in the browser.
+
+    A fragment, so the controls rerun only this table. Exports are generated
+    in chunks when a download button is clicked.
+    """
+    col_search, col_sort, col_order = st.columns([3, 2, 1], vertical_alignment="bottom")
+    search = col_search.text_input("Search tenant or suite", key="rr_table_search").strip()
+    sort_by = col_sort.selectbox(
+        "Sort by", [None, *frame.columns], format_func=lambda column: "Original order" if column is None else column, key="rr_table_sort"
+    )
+    descending = col_order.toggle("Descending", key="rr_table_descending")
+
+    date_column, date_from, date_to = None, None, None
+    lease_dates = [column for column in date_columns(frame) if frame[column].notna().any()]
+    if lease_dates:
+        col_date_column, col_date_range = st.columns([2, 4])
+        default_date = next((i for i, column in enumerate(lease_dates) if "end" in str(column).lower()), 0)
+        date_column = col_date_column.selectbox("Lease date", lease_dates, index=default_date, key="rr_table_date_column")
+        date_range = col_date_range.date_input(
+            "Between", value=[], min_value=frame[date_column].min().date(), max_value=frame[date_column].max().date(),
+            key=f"rr_table_date_range_{date_column}",
+        )
+        date_from = date_range[0] if len(date_range) > 0 else None
+        date_to = date_range[1] if len(date_range) > 1 else None
+
+    positions = rent_roll_view_positions(run_id, len(frame), search, date_column, date_from, date_to, sort_by, descending, frame)
+    table = st.container()
+    col_size, col_page, col_info = st.columns([1, 1, 3], vertical_alignment="bottom")
+    page_size = col_size.selectbox("Rows per page", RENT_ROLL_PAGE_SIZES, index=1, key="rr_table_page_size")
+    page_count = max(1, -(-len(positions) // page_size))
+    query = (run_id, search, date_column, date_from, date_to, sort_by, descending, page_size)
+    if st.session_state.get("rr_table_query") != query: # New rows or page size: back to the first page
+        st.session_state.rr_table_query = query
+        st.session_state.rr_table_page = 1
+    page = col_page.number_input("Page", min_value=1, max_value=page_count, key="rr_table_page")
+    start = (page - 1) * page_size
+    end = min(start + page_size, len(positions))
+    table.dataframe(frame.iloc[positions[start:end]], hide_index=True)
+    filtered_note = f" (filtered from {len(frame):,})" if len(positions) != len(frame) else ""
+    col_info.caption(f"Rows {start + 1 if end else 0:,}-{end:,} of {len(positions):,}{filtered_note}, page {page} of {page_count}")
+
+    st.caption("Export the full rent roll:")
+    for column, extension in zip(st.columns(len(EXPORT_FORMATS)), EXPORT_FORMATS):
+        column.download_button(
+            f"Download {extension[1:].upper()}", data=functools.partial(export_frame, frame, extension),
+            file_name=f"rent_roll_{run_id}{extension}", mime=EXPORT_MIME_TYPES[extension], on_click="ignore",
+            key=f"rr_export_{extension}",
+        )
+
+# --- Rent Roll Analytics (KPIs computed locally from the line items, memoized per run and day) ---
+@st.cache_resource(max_entries=32, show_spinner=False)
+def rent_roll_kpis(run_id, as_of, _frame):
+    """Analytics of a run's rent roll as of a date; computed once and shared by every session showing the run."""
+    started = time.perf_counter()
+    analytics = rent_roll_analytics(_frame, as_of=as_of)
+    pipeline.tracer.record(run_id, "analytics", time.perf_counter() - started, route=API_ENDPOINT_ROUTE_RENT_ROLL, rows=len(_frame))
+    return analytics
+
+def format_share(value):
+    return "n/a" if value is None else f"{value:.1%}"
+
+def format_years(value):
+    return "n/a" if value is None else f"{value:.1f} yrs"
+
+def render_rent_roll_analytics(run_id, frame):
+    """Summary cards, the lease expiry ladder, tenant concentration and occupancy by building."""
+    analytics = rent_roll_kpis(run_id, pd.Timestamp.today().normalize(), frame)
+    summary, columns = analytics.summary, analytics.columns
+    occupancy = summary.get("occupancy_area", summary["occupancy_units"])
+    cards = [
+        ("Occupancy", format_share(occupancy), f"{summary['occupied_units']:,} of {summary['units']:,} suites occupied"
+            + (f"; {format_share(summary['occupancy_units'])} by suite count" if "occupancy_area" in summary else "")),
+        ("In-place rent / SF", "n/a" if summary.get("rent_per_sf") is None else f"${summary['rent_per_sf']:,.2f}",
+            "Annual rent over the area of occupied suites reporting both"),
+        ("WALT", format_years(summary.get("walt_years_by_rent", summary.get("walt_years_by_area"))),
+            "Weighted average lease term remaining, by " + ("annual rent" if "walt_years_by_rent" in summary else "area")),
+        ("Annual rent", "n/a" if "annual_rent" not in summary else f"${summary['annual_rent']:,.0f}", "Occupied suites only"),
+        ("Largest tenant", format_share(summary.get("largest_tenant_share")),
+            f"Top {TOP_TENANT_COUNT} tenants: {format_share(summary.get('top_tenants_share'))}"),
+    ]
+    with st.expander("Rent roll analytics", expanded=True):
+        for column, (label, value, help_text) in zip(st.columns(len(cards)), cards):
+            column.metric(label, value, help=help_text, border=True)
+        read_from = ", ".join(f"{role.replace('_', ' ')} = `{column}`" for role, column in columns.items())
+        st.caption(f"As of {analytics.as_of:%Y-%m-%d}, read from: {read_from or 'no recognized columns'}")
+
+        tab_expiry, tab_tenants, tab_groups = st.tabs(["Lease expiries", "Top tenants", "Occupancy by building"])
+        with tab_expiry:
+            ladder = analytics.expiry_ladder
+            if ladder is None:
+                st.caption("No lease end date column was found.")
+            else:
+                measure = next(column for column in ("Annual rent", "Square feet", "Leases") if column in ladder.columns)
+                st.bar_chart(ladder.assign(Expiry=ladder["Expiry"].astype(str)), x="Expiry", y=measure, sort=False)
+                st.dataframe(ladder, hide_index=True)
+        with tab_tenants:
+            if analytics.top_tenants is None:
+                st.caption("No tenant column was found, or no suite is occupied.")
+            else:
+                st.dataframe(analytics.top_tenants, hide_index=True)
+        with tab_groups:
+            groups = analytics.occupancy_by_group
+            if groups is None:
+                st.caption("No building, property or floor column was found.")
+            else:
+                if len(groups) > 1:
+                    st.bar_chart(groups.assign(Group=groups["Group"].astype(str)), x="Group", y="Occupancy %", sort=False)
+                st.dataframe(groups, hide_index=True)
+
+# --- Multi-Docs Results (pre-escaped per run, rendered in a fragment) ---
+MULTI_DOCS_RESULT_PAGES = {
+    "Management Summary": {"api_key": "management_summary_data", "summary_key": "m_s_summary", "report_key": "full_report"},
+    "Occupancy Report": {"api_key": "occupancy_report_data", "summary_key": "o_r_summary", "report_key": "full_report"},
+    "Offering Memorandum": {"api_key": "offering_memo_data", "summary_key": "o_m_summary", "report_key": "full_report"},
+    "Other Document": {"api_key": "other_docs_data", "summary_key": "o_d_summary", "report_key": "full_report"}
+}
+
+def first_available_page(analysis_results_data):
+    """Display name of the first document with data in a Multi-Docs result, used as the initial results tab."""
+    first_result_key = next((k for k, v in analysis_results_data.items() if isinstance(v, dict) and v), None)
+    nav_map = {details["api_key"]: display_name for display_name, details in MULTI_DOCS_RESULT_PAGES.items()}
+    return nav_map.get(first_result_key) if first_result_key else None
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def rendered_multi_docs_pages(run_id, _analysis_results_data):
+    """Markdown-ready summary and full report per document of a run, escaped once per run_id (shared, not copied)."""
+    pages = {}
+    for display_name, details in MULTI_DOCS_RESULT_PAGES.items():
+        page_data = _analysis_results_data.get(details["api_key"])
+        # Check if the api_key exists and its value is a dictionary (implying data is present)
+        if isinstance(page_data, dict):
+            pages[display_name] = { # Escape $ for markdown
+                "summary": str(page_data.get(details["summary_key"], "No summary available.")).replace("$", "\\$"),
+                "full_report": str(page_data.get(details["report_key"], "No full report available.")).replace("$", "\\$"),
+            }
+    return pages
+
+@st.fragment
+def render_multi_docs_results(run_id, analysis_results_data):
+    """Document picker and the selected document's analysis.
+
+    A fragment, so switching documents reruns only this block, from text
+    escaped once per run. The full report is only sent once its expander is opened.
+    """
+    pages = rendered_multi_docs_pages(run_id, analysis_results_data)
+    available_pages = list(pages)
+    if not available_pages:
+        st.warning("Analysis completed, but no data was returned in the expected format for any document type.")
+        return
+    default_index_multi = 0
+    if st.session_state.analysis_nav in available_pages:
+        default_index_multi = available_pages.index(st.session_state.analysis_nav)
+    else: # if analysis_nav is not set or invalid, default to first available
+        st.session_state.analysis_nav = available_pages[0]
+
+    selected_page = st.radio(
+        "Select analysis to view:", options=available_pages, key="analysis_nav_main_radio_key", # Unique key
+        index=default_index_multi, horizontal=True
+    )
+    # Update session state if radio button changes the selection
+    if selected_page != st.session_state.analysis_nav:
+        st.session_state.analysis_nav = selected_page
+
+    st.markdown("---")
+    st.subheader(f"{selected_page} Analysis")
+    st.markdown("**Summary:**"); st.markdown(pages[selected_page]["summary"]); st.markdown("---")
+    with st.expander("View Full Report", key=f"full_report_{run_id}_{selected_page}", on_change="rerun") as full_report:
+        if full_report.open:
+            st.markdown(pages[selected_page]["full_report"])
+
+# --- Run Store (results live on disk by run_id; sessions keep only the run_id) ---
+def current_user():
+    """Who runs are stored for and listed to: the signed-in user's email, else this browser session.
+
+    Without authentication every session gets its own identity, so "Recent runs"
+    never lists another visitor's results.
+    """
+    return st.user.get("email") or st.session_state.anonymous_user
+
+def may_open(owner):
+    """Whether the current user may reopen a run or job of ``owner`` by its run_id (URL, sidebar).
+
+    A signed-in user's runs and jobs open only for that user. Anonymous
+    sessions and the CLI have no identity that survives a page reload, so
+    their run_id URLs are deliberate capability links: the unguessable id
+    (a uuid4) is what grants access, and anyone holding the URL can open them.
+    """
+    return owner is None or owner.startswith(ANONYMOUS_USER_PREFIX) or owner == current_user()
 
-def is_allowed_file(filename):
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+def save_run(route, result, cache_key=None, name=None):
+    """Put a finished result in the run store under the current run_id and return that run_id."""
+    run_id = st.session_state.run_id
+    pipeline.save_run(route, run_id, result, user=current_user(), name=name, cache_key=cache_key)
+    return run_id
 
+def show_multi_docs_results(run_id):
+    st.session_state.run_id = run_id
+    st.session_state.analysis_run = run_id
+    analysis_results_data = pipeline.load_run(run_id)
+    st.session_state.analysis_nav = first_available_page(analysis_results_data) if analysis_results_data else None
+    st.session_state.view = 'results'
+    st.query_params["run_id"] = run_id # A page reload reopens the result from the run store
+
+def show_rent_roll_results(run_id):
+    st.session_state.run_id = run_id
+    st.session_state.rent_roll_run = run_id
+    st.session_state.view_rent_roll = 'results_rr'
+    st.query_params["run_id"] = run_id
+
+def complete_multi_docs_analysis(analysis_results_data, cache_key, name=None):
+    """Store a finished Multi-Docs result (cache + run store) and switch to the results view."""
+    pipeline.store_result(API_ENDPOINT_ROUTE_MULTI_DOCS, cache_key, analysis_results_data)
+    show_multi_docs_results(save_run(API_ENDPOINT_ROUTE_MULTI_DOCS, analysis_results_data, cache_key, name))
+
+def complete_rent_roll_analysis(rent_roll_results_data, cache_key, name=None):
+    """Store a finished rent roll result (cache + run store) and switch to the results view."""
+    pipeline.store_result(API_ENDPOINT_ROUTE_RENT_ROLL, cache_key, rent_roll_results_data) # Only usable results are cached
+    show_rent_roll_results(save_run(API_ENDPOINT_ROUTE_RENT_ROLL, rent_roll_results_data, cache_key, name))
+
+def open_stored_run(run):
+    """Switch to the flow and results view of a stored run (``run`` as returned by RunStore.info/recent)."""
+    flow = next(flow for flow, route in FLOW_ROUTES.items() if route == run["route"])
+    # Switch flows before the flow radio is rendered (its widget state only exists after the first run)
+    st.session_state.selected_flow = flow
+    if 'flow_selection_radio' in st.session_state:
+        st.session_state.flow_selection_radio = flow
+    if flow == "Multi-Docs Smart Analysis":
+        show_multi_docs_results(run["run_id"])
+    else:
+        show_rent_roll_results(run["run_id"])
+
+def open_recent_run():
+    """Sidebar callback: reopen the run picked under "Recent runs"."""
+    run = run_store.info(st.session_state.recent_run_pick)
+    if run is not None and may_open(run["user"]):
+        open_stored_run(run)
+
+def describe_stored_run(run):
+    flow = "Multi-Docs" if run["route"] == API_ENDPOINT_ROUTE_MULTI_DOCS else "Rent Roll"
+    return f"{time.strftime('%b %d, %H:%M', time.localtime(run['created_at']))} · {flow} · {run['name'] or run['run_id'][:8]}"
+
+
+# --- Backend Admission (one fair queue per process for blocking backend calls, see Pipeline.admission) ---
+def queue_identity():
+    """Who a backend call queues as: the signed-in user, else the browser session, so anonymous sessions still take turns."""
+    return current_user()
+
+def session_liveness():
+    """Check whether this browser session is still connected, so its queued calls can be shed (None outside a server or without Runtime)."""
+    ctx = get_script_run_ctx()
+    if ctx is None or Runtime is None or not Runtime.exists():
+        return None
+    runtime, session_id = Runtime.instance(), ctx.session_id
+
+    def _is_connected():
+        try:
+            return runtime.is_active_session(session_id)
+        except (AttributeError, TypeError): # The private API changed: keep the call rather than shed a live session
+            return True
+    return _is_connected
+
+def call_backend_queued(route, payload):
+    """pipeline.call_backend, showing the queue position and estimated wait while the call waits for a backend slot."""
+    queue_status = st.empty()
+
+    def _show_queue_position(position, estimated_wait):
+        minutes, seconds = divmod(int(estimated_wait), 60)
+        queue_status.info(f"The analysis backend is busy: you are **#{position}** in the queue (estimated wait {minutes}m {seconds:02d}s).")
+
+    try:
+        return pipeline.call_backend(route, payload, user=queue_identity(), is_connected=session_liveness(), on_wait=_show_queue_position)
+    finally:
+        queue_status.empty()
+
+def describe_admission(stats):
+    """Sidebar line with running / queued backend calls per route."""
+    parts = []
+    for route, route_stats in stats.items():
+        flow = "Multi-Docs" if route == API_ENDPOINT_ROUTE_MULTI_DOCS else "Rent Roll"
+        parts.append(f"{flow} {route_stats['running']}/{route_stats['limit']} running, {route_stats['queued']} queued")
+    return "Backend: " + ("; ".join(parts) if parts else "idle")
+
+
+# --- Batch Mode (many properties / rent rolls per run, bounded parallelism) ---
+def run_batch(flow, items, analyze_item, max_parallel):
+    """Run ``analyze_item`` (a Pipeline.analyze_* method) for every ``(name, payload)`` with bounded parallelism.
+
+    Rows stream into a summary table as items finish. The finished batch is
+    kept in st.session_state.batch_runs[flow] and every result goes to the run
+    store, so any item can be opened later.
+    """
+    batch = {"rows": [], "stored": set()}
+    st.session_state.batch_runs[flow] = batch
+    progress_bar = st.progress(0.0, text=f"0 of {len(items)} item(s) finished")
+    table = st.empty()
+    user = current_user()
+
+    def _store_late(outcome): # Finished after a rerun or navigation stopped this loop: still reopenable from "Recent runs"
+        if outcome.ok:
+            pipeline.save_run(outcome.route, outcome.run_id, outcome.result, user=user, name=outcome.name)
+
+    outcomes = pipeline.run_many(
+        analyze_item, items, max_parallel, on_abandoned=_store_late,
+        content_addressed=st.session_state.content_addressed_uploads, force_refresh=st.session_state.force_refresh_results,
+        use_jobs=st.session_state.job_mode, user=queue_identity(), is_connected=session_liveness(),
+        preprocess_excel=st.session_state.excel_preprocessing,
+    )
+    with contextlib.closing(outcomes): # A rerun raises inside the loop; closing cancels what has not started
+        for finished, outcome in enumerate(outcomes, start=1):
+            row = {"Item": outcome.name, "Run ID": outcome.run_id}
+            if outcome.ok:
+                pipeline.save_run(outcome.route, outcome.run_id, outcome.result, user=user, name=outcome.name)
+                batch["stored"].add(outcome.run_id)
+                row.update({"Status": "Cached" if outcome.from_cache else "Done", "Seconds": round(outcome.seconds, 1), "Detail": describe_result(outcome.route, outcome.result)})
+            else:
+                row.update({"Status": "Failed", "Seconds": None, "Detail": outcome.error})
+            batch["rows"].append(row)
+            progress_bar.progress(finished / len(items), text=f"{finished} of {len(items)} item(s) finished")
+            table.dataframe(pd.DataFrame(batch["rows"]), hide_index=True)
+    return batch
+
+def render_batch_summary(flow, open_result):
+    """Summary table of the flow's last batch, with a picker to open one item's full result."""
+    batch = st.session_state.batch_runs.get(flow)
+    if not batch or not batch["rows"]:
+        return
+    st.subheader("Batch Results")
+    st.dataframe(pd.DataFrame(batch["rows"]), hide_index=True)
+    openable = [row for row in batch["rows"] if row["Run ID"] in batch["stored"]]
+    if not openable:
+        return
+    labels = {row["Run ID"]: f"{row['Item']} ({row['Status']})" for row in openable}
+    col_pick, col_open, col_clear = st.columns([4, 1, 1])
+    chosen_run_id = col_pick.selectbox("Open an item's results:", list(labels), format_func=labels.get, key=f"batch_pick_{flow}")
+    if col_open.button("Open", key=f"batch_open_{flow}"):
+        open_result(chosen_run_id)
+        st.rerun()
+    if col_clear.button("Clear batch", key=f"batch_clear_{flow}"):
+        st.session_state.batch_runs.pop(flow, None)
+        st.rerun()
+
+
+# --- Pending Jobs (restored from the URL on page reload) ---
+if 'pending_jobs' not in st.session_state:
+    st.session_state.pending_jobs = {}
+    resume_run_id = st.query_params.get("run_id")
+    resumed_job = job_registry.get(resume_run_id) if resume_run_id else None
+    resumed_run = run_store.info(resume_run_id) if resume_run_id else None
+    if resumed_job and resumed_job["status"] not in FINAL_JOB_STATUSES and may_open(resumed_job["user"]):
+        st.session_state.selected_flow = resumed_job["flow"]
+        track_job(resumed_job)
+    elif resumed_run and may_open(resumed_run["user"]):
+        open_stored_run(resumed_run)
 
 # --- Sidebar for Flow Selection ---
 flow_options = ["Multi-Docs Smart Analysis", "Commercial Rent Roll Analysis"]
@@ -123,6 +699,54 @@ selected_flow_from_radio = st.sidebar.radio(
     index=current_flow_index
 )
 
+st.sidebar.markdown("---")
+st.sidebar.checkbox(
+    "Reuse identical files already in S3",
+    key='content_addressed_uploads',
+    help="Hash each file before upload and skip sending bytes S3 already has from an earlier run.",
+)
+st.sidebar.checkbox(
+    "Pre-process Excel files",
+    key='excel_preprocessing',
+    help="Also upload each .xlsx as compressed per-sheet tables (hidden and empty sheets dropped) with a manifest the backend can read instead.",
+)
+st.sidebar.checkbox(
+    "Force refresh (ignore cached results)",
+    key='force_refresh_results',
+    help="Always call the backend, even when the same documents were analyzed before. The fresh result replaces the cached one.",
+)
+st.sidebar.checkbox(
+    "Run as background job",
+    key='job_mode',
+    help="Submit the analysis as a job and poll for the result, so long analyses don't hit the request timeout.",
+)
+st.sidebar.checkbox(
+    "Show timing breakdown",
+    key='show_timings',
+    help="Show how long each stage of the run (hashing, upload, backend call, decoding, rendering) took on the results page.",
+)
+with st.sidebar.expander("Resume a job"):
+    st.text_input("Run ID", key='resume_run_id_input')
+    st.button("Resume", key='resume_job_button', on_click=resume_job_by_run_id)
+    if st.session_state.get('resume_job_message'):
+        st.warning(st.session_state.resume_job_message)
+with st.sidebar.expander("Recent runs"):
+    recent_runs = {run["run_id"]: run for run in run_store.recent(user=current_user(), limit=RECENT_RUNS_LIMIT)}
+    if recent_runs:
+        st.selectbox("Run", list(recent_runs), format_func=lambda run_id: describe_stored_run(recent_runs[run_id]), key='recent_run_pick')
+        st.button("Open", key='open_recent_run_button', on_click=open_recent_run, help="Reopen the stored result without calling the backend.")
+    else:
+        st.caption("Finished analyses are listed here.")
+cache_stats = result_cache.stats()
+run_stats = run_store.stats()
+st.sidebar.caption(
+    f"Result cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+    f"{cache_stats['entries']} entries ({cache_stats['bytes'] / (1024 * 1024):.1f} MB)  \n"
+    f"Run store: {run_stats['entries']} runs ({run_stats['bytes'] / (1024 * 1024):.1f} MB), "
+    f"{run_stats['memory_entries']} decoded in memory ({run_stats['memory_bytes'] / (1024 * 1024):.1f} MB)  \n"
+    f"{describe_admission(pipeline.admission.stats())}"
+)
+
 # If the user changes the flow selection
 if selected_flow_from_radio != st.session_state.selected_flow:
     st.session_state.selected_flow = selected_flow_from_radio
@@ -131,12 +755,19 @@ if selected_flow_from_radio != st.session_state.selected_flow:
 
     # Reset view states for Multi-Docs flow
     st.session_state.view = 'upload'
-    st.session_state.analysis_results = None
+    st.session_state.analysis_run = None
     st.session_state.analysis_nav = None
 
     # Reset view states for Commercial Rent Roll flow
     st.session_state.view_rent_roll = 'upload_rr'
-    st.session_state.rent_roll_analysis_results = None
+    st.session_state.rent_roll_run = None
+    cancel_staged_uploads() # The other flow's file uploaders are gone
+
+    # A job still running in the newly selected flow takes over its view again
+    if selected_flow_from_radio in st.session_state.pending_jobs:
+        track_job(st.session_state.pending_jobs[selected_flow_from_radio])
+    else:
+        drop_run_from_url()
     st.rerun() # Rerun to apply changes immediately
 
 
@@ -164,11 +795,14 @@ if st.session_state.selected_flow == "Multi-Docs Smart Analysis":
         # )
 
         # Reset analysis state if returning to upload view (redundant if reset on flow change, but safe)
-        st.session_state.analysis_results = None
+        st.session_state.analysis_run = None
         st.session_state.analysis_nav = None
 
+        if st.button("Batch mode: analyze many properties at once", key="multi_docs_batch_mode_key"):
+            st.session_state.view = 'batch'; st.rerun()
+        render_batch_summary("Multi-Docs Smart Analysis", show_multi_docs_results)
+
         uploaded_files = {}
-        s3_run_folder = f"{S3_BASE_FOLDER}/{st.session_state.run_id}/multi_docs" # Specific subfolder
 
         col1, col2 = st.columns(2)
         with col1:
@@ -189,6 +823,7 @@ if st.session_state.selected_flow == "Multi-Docs Smart Analysis":
             uploaded_files["other_docs"] = st.file_uploader(
                 "Upload Other Document (PDF/Excel)", type=ALLOWED_EXTENSIONS, key="other_docs_upload"
             )
+        staged_uploads = stage_files("Multi-Docs Smart Analysis", uploaded_files)
         st.markdown("---")
 
         if st.button("Run Smart Analysis", type="primary", disabled=(s3_client is None)):
@@ -199,33 +834,34 @@ if st.session_state.selected_flow == "Multi-Docs Smart Analysis":
                 st.error("S3 Client could not be initialized. Cannot upload files or run analysis. Check AWS credentials in secrets.toml.")
                 st.stop()
 
-            s3_keys = {"management_summary_s3_key": "", "occupancy_report_s3_key": "", "offering_memo_s3_key": "", "other_docs_s3_key": ""}
-            with st.spinner("Uploading files ..."):
-                valid_uploads = False
-                # Standard file upload logic for multi-docs
-                if uploaded_files["management_summary"] and is_allowed_file(uploaded_files["management_summary"].name):
-                    s3_keys["management_summary_s3_key"] = upload_to_s3(uploaded_files["management_summary"], S3_BUCKET_NAME, s3_run_folder, s3_client)
-                    valid_uploads = True if s3_keys["management_summary_s3_key"] else valid_uploads
-                elif uploaded_files["management_summary"]:
-                     st.warning(f"Skipping Management Summary: Invalid file type for {uploaded_files['management_summary'].name}. Allowed: {', '.join(ALLOWED_EXTENSIONS)}")
-
-                if uploaded_files["occupancy_report"] and is_allowed_file(uploaded_files["occupancy_report"].name):
-                    s3_keys["occupancy_report_s3_key"] = upload_to_s3(uploaded_files["occupancy_report"], S3_BUCKET_NAME, s3_run_folder, s3_client)
-                    valid_uploads = True if s3_keys["occupancy_report_s3_key"] else valid_uploads
-                elif uploaded_files["occupancy_report"]:
-                     st.warning(f"Skipping Occupancy Report: Invalid file type for {uploaded_files['occupancy_report'].name}. Allowed: {', '.join(ALLOWED_EXTENSIONS)}")
-
-                if uploaded_files["offering_memo"] and is_allowed_file(uploaded_files["offering_memo"].name):
-                    s3_keys["offering_memo_s3_key"] = upload_to_s3(uploaded_files["offering_memo"], S3_BUCKET_NAME, s3_run_folder, s3_client)
-                    valid_uploads = True if s3_keys["offering_memo_s3_key"] else valid_uploads
-                elif uploaded_files["offering_memo"]:
-                     st.warning(f"Skipping Offering Memorandum: Invalid file type for {uploaded_files['offering_memo'].name}. Allowed: {', '.join(ALLOWED_EXTENSIONS)}")
-
-                if uploaded_files["other_docs"] and is_allowed_file(uploaded_files["other_docs"].name):
-                    s3_keys["other_docs_s3_key"] = upload_to_s3(uploaded_files["other_docs"], S3_BUCKET_NAME, s3_run_folder, s3_client)
-                    valid_uploads = True if s3_keys["other_docs_s3_key"] else valid_uploads
-                elif uploaded_files["other_docs"]:
-                     st.warning(f"Skipping Other Document: Invalid file type for {uploaded_files['other_docs'].name}. Allowed: {', '.join(ALLOWED_EXTENSIONS)}")
+            s3_keys = {f"{slot}_s3_key": "" for slot in MULTI_DOC_SLOTS}
+            files_to_upload = {}
+            for slot, label in MULTI_DOC_SLOTS.items():
+                staged_file = uploaded_files[slot]
+                if staged_file and is_allowed_file(staged_file.name):
+                    files_to_upload[slot] = staged_file
+                elif staged_file:
+                    st.warning(f"Skipping {label}: Invalid file type for {staged_file.name}. Allowed: {', '.join(ALLOWED_EXTENSIONS)}")
+
+            run_name = ", ".join(staged_file.name for staged_file in files_to_upload.values())
+            doc_hashes = pipeline.fingerprint(files_to_upload, st.session_state.run_id)
+            cache_key, cached_results = pipeline.lookup_cached(
+                API_ENDPOINT_ROUTE_MULTI_DOCS, doc_hashes, MULTI_DOCS_PROPERTY_TYPE, st.session_state.force_refresh_results,
+                run_id=st.session_state.run_id, preprocess_excel=st.session_state.excel_preprocessing,
+            )
+            if cached_results is not None:
+                st.success("These documents were analyzed before; loaded the cached result.")
+                staged_uploads.cancel_all() # Not needed after all
+                show_multi_docs_results(save_run(API_ENDPOINT_ROUTE_MULTI_DOCS, cached_results, cache_key, run_name))
+                st.rerun()
+
+            # All slots upload at once; failures are collected per slot and reported after the batch
+            uploaded_keys, upload_errors = upload_with_progress(
+                files_to_upload, st.session_state.run_id, MULTI_DOC_SLOTS, digests=doc_hashes, staged=staged_uploads
+            )
+            for slot, s3_key in uploaded_keys.items():
+                s3_keys[f"{slot}_s3_key"] = s3_key
+            valid_uploads = bool(uploaded_keys)
 
             if not valid_uploads and any(uploaded_files.values()): # If some files were attempted but all failed
                  st.error("Upload failed for all provided files. Please check file types or S3 connection errors above.")
@@ -234,41 +870,75 @@ if st.session_state.selected_flow == "Multi-Docs Smart Analysis":
                 st.warning("No valid documents were uploaded successfully. Cannot proceed with analysis.")
                 st.stop()
 
-            api_url = f"{API_BASE_URL_MULTI_DOCS}/{API_ENDPOINT_ROUTE_MULTI_DOCS}"
-            payload = {**s3_keys, "property_type": "self_storage", "run_id": st.session_state.run_id}
+            payload = pipeline.multi_docs_payload(uploaded_keys, st.session_state.run_id, preprocess_uploads(files_to_upload, uploaded_keys))
+            if st.session_state.job_mode:
+                if start_backend_job("Multi-Docs Smart Analysis", API_ENDPOINT_ROUTE_MULTI_DOCS, payload, cache_key):
+                    st.rerun()
+                st.stop()
             st.info(f"Calling Backend for Multi-Doc Analysis...")
             try:
                 with st.spinner("Performing smart analysis... This may take a moment."):
-                    response = requests.post(api_url, json=payload, timeout=300) # 5 min timeout
-                    response.raise_for_status()
+                    analysis_results_data = call_backend_queued(API_ENDPOINT_ROUTE_MULTI_DOCS, payload)
                 st.success("Multi-Doc Analysis Complete!")
-                analysis_results_data = response.json()
-                st.session_state.analysis_results = analysis_results_data
-                # Determine first page to show in results
-                first_result_key = next((k for k, v in analysis_results_data.items() if isinstance(v, dict) and v), None)
-                if first_result_key:
-                    nav_map = {"management_summary_data": "Management Summary", "occupancy_report_data": "Occupancy Report", "offering_memo_data": "Offering Memorandum", "other_docs_data": "Other Document"}
-                    st.session_state.analysis_nav = nav_map.get(first_result_key)
-                else:
-                    st.session_state.analysis_nav = None
-                st.session_state.view = 'results'
+                complete_multi_docs_analysis(analysis_results_data, cache_key, run_name)
                 st.rerun()
             except requests.exceptions.HTTPError as http_err:
                 st.error(f"API request failed with HTTP error: {http_err}")
                 try: st.error(f"Error details from API: {http_err.response.json()}")
                 except ValueError: st.error(f"Response content from API: {http_err.response.text}")
-                st.session_state.analysis_results = None
+                st.session_state.analysis_run = None
             except requests.exceptions.RequestException as req_err: # Other requests errors
                 st.error(f"API request failed: {req_err}")
-                st.session_state.analysis_results = None
+                st.session_state.analysis_run = None
             except Exception as e_other: # Catch other potential errors like JSON parsing if response is not JSON
                 st.error(f"An unexpected error occurred during API call or processing: {e_other}")
-                st.session_state.analysis_results = None
+                st.session_state.analysis_run = None
+
+    # =========================
+    # ===== BATCH VIEW (Multi-Docs) =====
+    # =========================
+    elif st.session_state.view == 'batch':
+        if st.button("Back to single analysis", key="multi_docs_single_mode_key"):
+            st.session_state.view = 'upload'; st.rerun()
+        st.header("Batch Analysis")
+        st.write(
+            "Upload one or more zip files with one folder per property. Files are placed into slots by name "
+            "(management / occupancy / offering memo; anything else is treated as Other Document)."
+        )
+        batch_zips = st.file_uploader("Upload property folders (ZIP)", type=["zip"], accept_multiple_files=True, key="multi_docs_batch_upload_key")
+        max_parallel = st.slider("Properties analyzed in parallel", 1, BATCH_MAX_PARALLEL_LIMIT, min(SETTINGS.batch_max_parallel, BATCH_MAX_PARALLEL_LIMIT), key="multi_docs_batch_parallel_key")
+        if st.button("Run Batch Analysis", type="primary", disabled=(s3_client is None or not batch_zips), key="run_multi_docs_batch_key"):
+            batch_items = []
+            for batch_zip in batch_zips:
+                try:
+                    properties = properties_from_zip(batch_zip)
+                except zipfile.BadZipFile:
+                    st.error(f"{batch_zip.name} is not a valid zip file."); continue
+                except ZipTooLargeError as e:
+                    st.error(f"{batch_zip.name} was not opened: {e}."); continue
+                for property_name, files_by_slot, skipped in properties:
+                    batch_items.append((property_name, files_by_slot))
+                    if skipped:
+                        st.warning(f"{property_name}: skipped {', '.join(skipped)} (unsupported type or slot already filled)")
+            if not batch_items:
+                st.warning("No properties with supported documents were found in the uploaded zip files."); st.stop()
+            st.info(f"Analyzing {len(batch_items)} properties, up to {max_parallel} at a time...")
+            run_batch("Multi-Docs Smart Analysis", batch_items, pipeline.analyze_multi_docs, max_parallel)
+            st.rerun()
+        render_batch_summary("Multi-Docs Smart Analysis", show_multi_docs_results)
+
+    # =========================
+    # ===== JOB VIEW (Multi-Docs) =====
+    # =========================
+    elif st.session_state.view == 'job':
+        st.header("Multi-Document Analysis Running")
+        render_job_status("Multi-Docs Smart Analysis", complete_multi_docs_analysis)
 
     # =========================
     # ===== RESULTS VIEW (Multi-Docs) =====
     # =========================
     elif st.session_state.view == 'results':
+        render_started = time.perf_counter()
         # Ensure sidebar is visible for results view
         # st.markdown(
         #     """<style>[data-testid="stSidebar"] { display: block; } </style>""", unsafe_allow_html=True,
@@ -286,58 +956,17 @@ if st.session_state.selected_flow == "Multi-Docs Smart Analysis":
         if st.sidebar.button("Start New Multi-Doc Analysis", key="multi_doc_new_analysis_results_key"):
             st.session_state.view = 'upload'
             st.session_state.run_id = str(uuid.uuid4()) # New run ID
-            st.session_state.analysis_results = None
+            st.session_state.analysis_run = None
             st.session_state.analysis_nav = None
+            drop_run_from_url()
             st.rerun()
         
         st.header("Multi-Document Analysis Results")
-        if st.session_state.analysis_results:
-            results = st.session_state.analysis_results
-            available_pages = []
-            page_details_map = {
-                "Management Summary": {"api_key": "management_summary_data", "summary_key": "m_s_summary", "report_key": "full_report"},
-                "Occupancy Report": {"api_key": "occupancy_report_data", "summary_key": "o_r_summary", "report_key": "full_report"},
-                "Offering Memorandum": {"api_key": "offering_memo_data", "summary_key": "o_m_summary", "report_key": "full_report"},
-                "Other Document": {"api_key": "other_docs_data", "summary_key": "o_d_summary", "report_key": "full_report"}
-            }
-            for display_name, details in page_details_map.items():
-                # Check if the api_key exists and its value is a dictionary (implying data is present)
-                if isinstance(results.get(details["api_key"]), dict):
-                    available_pages.append(display_name)
-
-            if not available_pages:
-                st.warning("Analysis completed, but no data was returned in the expected format for any document type.")
-            else:
-                default_index_multi = 0
-                if st.session_state.analysis_nav in available_pages:
-                    default_index_multi = available_pages.index(st.session_state.analysis_nav)
-                elif available_pages : # if analysis_nav is not set or invalid, default to first available
-                    st.session_state.analysis_nav = available_pages[0]
-                    # default_index_multi remains 0
-                
-                selected_page = st.radio(
-                    "Select analysis to view:", options=available_pages, key="analysis_nav_main_radio_key", # Unique key
-                    index=default_index_multi, horizontal=True
-                )
-                # Update session state if radio button changes the selection
-                if selected_page != st.session_state.analysis_nav :
-                    st.session_state.analysis_nav = selected_page
-                    # st.rerun() # Optional: uncomment if changing radio selection needs immediate full page effect
-
-                st.markdown("---")
-                selected_page_details = page_details_map.get(selected_page)
-                if selected_page_details:
-                    st.subheader(f"{selected_page} Analysis")
-                    page_data = results.get(selected_page_details["api_key"], {}) # Default to empty dict
-                    summary_content = str(page_data.get(selected_page_details["summary_key"], "No summary available."))
-                    full_report_content = str(page_data.get(selected_page_details["report_key"], "No full report available."))
-                    # Escape $ for markdown
-                    escaped_summary = summary_content.replace("$", "\\$")
-                    escaped_full_report = full_report_content.replace("$", "\\$")
-                    st.markdown("**Summary:**"); st.markdown(escaped_summary); st.markdown("---")
-                    with st.expander("View Full Report"): st.markdown(escaped_full_report)
-                else: st.error("An error occurred displaying the selected analysis.")
-        else: # No analysis_results in session state
+        analysis_results_data = pipeline.load_run(st.session_state.analysis_run) if st.session_state.analysis_run else None
+        if analysis_results_data:
+            render_multi_docs_results(st.session_state.run_id, analysis_results_data)
+            render_timing_panel(st.session_state.run_id, API_ENDPOINT_ROUTE_MULTI_DOCS, render_started)
+        else: # No run shown, or its result was evicted from the run store
             st.warning("No analysis results available. Go back to upload documents.")
             if st.button("Back to Multi-Doc Upload", key="back_to_multi_upload_key"):
                 st.session_state.view = 'upload'; st.rerun()
@@ -357,14 +986,17 @@ elif st.session_state.selected_flow == "Commercial Rent Roll Analysis":
     # ===== UPLOAD VIEW (Rent Roll) =====
     # =========================
     if st.session_state.view_rent_roll == 'upload_rr':
-        st.session_state.rent_roll_analysis_results = None # Reset previous results on new upload attempt
+        st.session_state.rent_roll_run = None # Reset previous results on new upload attempt
 
-        s3_run_folder_rr = f"{S3_BASE_FOLDER}/{st.session_state.run_id}/multi_docs" # Specific subfolder - CHANGED
+        if st.button("Batch mode: analyze many rent rolls at once", key="rent_roll_batch_mode_key"):
+            st.session_state.view_rent_roll = 'batch_rr'; st.rerun()
+        render_batch_summary("Commercial Rent Roll Analysis", show_rent_roll_results)
 
         uploaded_rent_roll_file = st.file_uploader(
             "Upload Commercial Rent Roll Document (PDF/Excel/XLS)",
             type=ALLOWED_EXTENSIONS, key="rent_roll_file_upload_key" # Unique key
         )
+        staged_uploads_rr = stage_files("Commercial Rent Roll Analysis", {"rent_roll": uploaded_rent_roll_file})
         st.markdown("---")
 
         # Check if the API URL for rent roll is configured
@@ -389,64 +1021,105 @@ elif st.session_state.selected_flow == "Commercial Rent Roll Analysis":
 
             s3_key_rr = ""
             if is_allowed_file(uploaded_rent_roll_file.name):
-                with st.spinner(f"Uploading {uploaded_rent_roll_file.name}..."):
-                    s3_key_rr = upload_to_s3(uploaded_rent_roll_file, S3_BUCKET_NAME, s3_run_folder_rr, s3_client)
+                doc_hashes_rr = pipeline.fingerprint({"rent_roll": uploaded_rent_roll_file}, st.session_state.run_id)
+                cache_key_rr, cached_results_rr = pipeline.lookup_cached(
+                    API_ENDPOINT_ROUTE_RENT_ROLL, doc_hashes_rr, force_refresh=st.session_state.force_refresh_results,
+                    run_id=st.session_state.run_id, preprocess_excel=st.session_state.excel_preprocessing,
+                )
+                if cached_results_rr is not None:
+                    st.success("This rent roll was analyzed before; loaded the cached result.")
+                    staged_uploads_rr.cancel_all()
+                    show_rent_roll_results(save_run(API_ENDPOINT_ROUTE_RENT_ROLL, cached_results_rr, cache_key_rr, uploaded_rent_roll_file.name))
+                    st.rerun()
+                uploaded_keys_rr, _ = upload_with_progress(
+                    {"rent_roll": uploaded_rent_roll_file}, st.session_state.run_id, {"rent_roll": "Rent Roll"}, digests=doc_hashes_rr,
+                    staged=staged_uploads_rr,
+                )
+                s3_key_rr = uploaded_keys_rr.get("rent_roll", "")
             else: # Should be caught by file_uploader type, but as a fallback
                 st.warning(f"Invalid file type: {uploaded_rent_roll_file.name}. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"); st.stop()
 
-            if not s3_key_rr: # If upload_to_s3 returned empty (error)
+            if not s3_key_rr: # If the upload failed (error shown above)
                 st.error("File upload failed. Cannot proceed with analysis."); st.stop()
 
-            api_url_rr = f"{API_BASE_URL_COMMERCIAL_RENT_ROLL}/{API_ENDPOINT_ROUTE_RENT_ROLL}"
-            payload_rr = {"doc_url": s3_key_rr, "run_id": st.session_state.run_id} # Include run_id - CHANGED KEY
+            manifests_rr = preprocess_uploads({"rent_roll": uploaded_rent_roll_file}, {"rent_roll": s3_key_rr})
+            payload_rr = pipeline.rent_roll_payload(s3_key_rr, st.session_state.run_id, manifests_rr.get("rent_roll"))
 
+            if st.session_state.job_mode:
+                if start_backend_job("Commercial Rent Roll Analysis", API_ENDPOINT_ROUTE_RENT_ROLL, payload_rr, cache_key_rr):
+                    st.rerun()
+                st.stop()
             st.info("Calling Rent Roll Backend...")
             try:
                 with st.spinner("Performing rent roll analysis... This may take a moment."):
-                    response_rr = requests.post(api_url_rr, json=payload_rr, timeout=300) # 5 min timeout
-                    response_rr.raise_for_status() # Raises HTTPError for bad responses (4XX or 5XX)
+                    rent_roll_results_data = call_backend_queued(API_ENDPOINT_ROUTE_RENT_ROLL, payload_rr) # Raises HTTPError for 4XX/5XX
                 st.success("Rent Roll Analysis Complete!")
-                st.session_state.rent_roll_analysis_results = response_rr.json()
-                st.session_state.view_rent_roll = 'results_rr'
+                complete_rent_roll_analysis(rent_roll_results_data, cache_key_rr, uploaded_rent_roll_file.name)
                 st.rerun()
             except requests.exceptions.HTTPError as http_err:
                 st.error(f"API request failed with HTTP error: {http_err}")
                 try: st.error(f"Error details from API: {http_err.response.json()}")
                 except ValueError: st.error(f"Response content from API: {http_err.response.text}") # If response is not JSON
-                st.session_state.rent_roll_analysis_results = None
+                st.session_state.rent_roll_run = None
             except requests.exceptions.RequestException as req_err: # Catches other non-HTTP errors (e.g., connection error)
                 st.error(f"API request failed: {req_err}")
-                st.session_state.rent_roll_analysis_results = None
+                st.session_state.rent_roll_run = None
             except Exception as e_other: # Catch other potential errors (e.g., JSON parsing if API returns non-JSON on success)
                 st.error(f"An unexpected error occurred: {e_other}")
-                st.session_state.rent_roll_analysis_results = None
+                st.session_state.rent_roll_run = None
         
+    # =========================
+    # ===== BATCH VIEW (Rent Roll) =====
+    # =========================
+    elif st.session_state.view_rent_roll == 'batch_rr':
+        if st.button("Back to single analysis", key="rent_roll_single_mode_key"):
+            st.session_state.view_rent_roll = 'upload_rr'; st.rerun()
+        st.header("Batch Analysis")
+        batch_files_rr = st.file_uploader(
+            "Upload Commercial Rent Roll Documents (PDF/Excel/XLS)", type=ALLOWED_EXTENSIONS,
+            accept_multiple_files=True, key="rent_roll_batch_upload_key"
+        )
+        max_parallel_rr = st.slider("Rent rolls analyzed in parallel", 1, BATCH_MAX_PARALLEL_LIMIT, min(SETTINGS.batch_max_parallel, BATCH_MAX_PARALLEL_LIMIT), key="rent_roll_batch_parallel_key")
+        if API_BASE_URL_COMMERCIAL_RENT_ROLL is None:
+            st.warning("Commercial Rent Roll Analysis is not available. The API URL (API_BASE_URL_COMMERCIAL_RENT_ROLL) is not configured in .streamlit/secrets.toml.")
+        run_batch_disabled_rr = API_BASE_URL_COMMERCIAL_RENT_ROLL is None or s3_client is None or not batch_files_rr
+        if st.button("Run Batch Analysis", type="primary", disabled=run_batch_disabled_rr, key="run_rent_roll_batch_key"):
+            batch_items_rr = [(batch_file.name, batch_file) for batch_file in batch_files_rr if is_allowed_file(batch_file.name)]
+            st.info(f"Analyzing {len(batch_items_rr)} rent rolls, up to {max_parallel_rr} at a time...")
+            run_batch("Commercial Rent Roll Analysis", batch_items_rr, pipeline.analyze_rent_roll, max_parallel_rr)
+            st.rerun()
+        render_batch_summary("Commercial Rent Roll Analysis", show_rent_roll_results)
+
+    # =========================
+    # ===== JOB VIEW (Rent Roll) =====
+    # =========================
+    elif st.session_state.view_rent_roll == 'job_rr':
+        st.header("Commercial Rent Roll Analysis Running")
+        render_job_status("Commercial Rent Roll Analysis", complete_rent_roll_analysis)
+
     # =========================
     # ===== RESULTS VIEW (Rent Roll) =====
     # =========================
     elif st.session_state.view_rent_roll == 'results_rr':
+        render_started = time.perf_counter()
         # Button in sidebar to start new analysis for this flow
         if st.sidebar.button("Start New Rent Roll Analysis", key="rent_roll_new_analysis_results_key"):
             st.session_state.view_rent_roll = 'upload_rr'
             st.session_state.run_id = str(uuid.uuid4()) # New run ID
-            st.session_state.rent_roll_analysis_results = None
+            st.session_state.rent_roll_run = None
+            drop_run_from_url()
             st.rerun()
 
         st.header("Commercial Rent Roll Analysis Results")
-        results_rr = st.session_state.rent_roll_analysis_results
+        results_rr = pipeline.load_run(st.session_state.rent_roll_run) if st.session_state.rent_roll_run else None
 
         if results_rr:
-            if results_rr.get("status") == "success" and "rent_roll_json_data" in results_rr:
-                data_to_display = results_rr["rent_roll_json_data"]
-                if isinstance(data_to_display, list) and data_to_display:
-                    try:
-                        df = pd.DataFrame(data_to_display)
-                        st.dataframe(df, hide_index=True) # Use hide_index for a cleaner table
-                    except Exception as e: # Catch potential errors during DataFrame creation
-                        st.error(f"Error displaying data as table: {e}")
-                        st.write("Raw data received from API:")
-                        st.json(data_to_display) # Show raw json for debugging
-                elif isinstance(data_to_display, list) and not data_to_display: # Empty list
+            if results_rr.get("status") == "success" and RENT_ROLL_ROWS_KEY in results_rr:
+                data_to_display = results_rr[RENT_ROLL_ROWS_KEY] # Typed frame built while the response streamed in
+                if isinstance(data_to_display, pd.DataFrame) and not data_to_display.empty:
+                    render_rent_roll_analytics(st.session_state.run_id, data_to_display)
+                    render_rent_roll_table(st.session_state.run_id, data_to_display)
+                elif isinstance(data_to_display, pd.DataFrame): # No line items
                     st.info("Analysis successful, but no rent roll line items were returned.")
                 else: # Data is not a list or has an unexpected structure
                     st.warning("Rent roll data received from API is not in the expected list format.")
@@ -455,8 +1128,9 @@ elif st.session_state.selected_flow == "Commercial Rent Roll Analysis":
             else: # Status not "success" or key "rent_roll_json_data" missing
                 st.error(f"Analysis did not return a successful status or expected data. Status: {results_rr.get('status', 'N/A')}")
                 st.write("Full API response:")
-                st.json(results_rr) # Show raw json for debugging
-        else: # No rent_roll_analysis_results in session state
+                st.json({key: f"<{len(value)} rows>" if isinstance(value, pd.DataFrame) else value for key, value in results_rr.items()}) # Show raw json for debugging
+            render_timing_panel(st.session_state.run_id, API_ENDPOINT_ROUTE_RENT_ROLL, render_started)
+        else: # No run shown, or its result was evicted from the run store
             st.warning("No rent roll analysis results available.")
             if st.button("Back to Rent Roll Upload", key="back_to_rr_upload_key"):
                 st.session_state.view_rent_roll = 'upload_rr'
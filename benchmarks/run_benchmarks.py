@@ -0,0 +1,232 @@
+"""Benchmarks for the Multi-Docs and Rent Roll paths against local stand-ins.
+
+Runs everything in-process: the S3 emulator (s3_emulator.py) and the stub
+backend (stub_backend.py), each with configurable latency. Results are written
+as JSON so runs can be compared over time::
+
+    python -m benchmarks.run_benchmarks --out bench.json
+    python -m benchmarks.run_benchmarks --quick                # small sizes, for a smoke run
+    python -m benchmarks.run_benchmarks --only upload --repeat 5
+
+Scenarios:
+  upload        Pipeline.upload of 1-4 files at several sizes (throughput)
+  end_to_end    analyze_multi_docs (4 files) and analyze_rent_roll, cache bypassed
+  parse         backend response download + JSON decode for large rent rolls / reports
+  dataframe     rent roll frame construction (plain pd.DataFrame vs streamed, typed) for 1k-200k rows,
+                and reopening a stored (Parquet) rent roll result
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+import stub_backend
+from benchmarks import s3_emulator
+from cactus_pipeline import API_ENDPOINT_ROUTE_MULTI_DOCS, API_ENDPOINT_ROUTE_RENT_ROLL, MULTI_DOC_SLOTS, Settings
+from cactus_pipeline.pipeline import Pipeline
+from cactus_pipeline.rent_roll import RENT_ROLL_ROWS_KEY, dump_rent_roll_result, iter_bytes, load_rent_roll_result, parse_rent_roll_json
+
+MB = 1024 * 1024
+BENCH_BUCKET = "bench"
+
+FULL_SIZES = {
+    "upload_file_mb": (1, 16, 64),
+    "upload_file_counts": (1, 2, 4),
+    "end_to_end_file_mb": 16,
+    "parse_rows": (1_000, 20_000, 100_000),
+    "parse_report_chars": (100_000, 1_000_000),
+    "dataframe_rows": (1_000, 10_000, 50_000, 200_000),
+}
+QUICK_SIZES = {
+    "upload_file_mb": (1, 8),
+    "upload_file_counts": (1, 4),
+    "end_to_end_file_mb": 2,
+    "parse_rows": (1_000, 10_000),
+    "parse_report_chars": (100_000,),
+    "dataframe_rows": (1_000, 10_000),
+}
+
+
+def make_file(name, size_bytes):
+    """In-memory document of ``size_bytes`` random bytes (1 MB block repeated)."""
+    block = os.urandom(min(size_bytes, MB))
+    file_obj = io.BytesIO((block * (size_bytes // len(block) + 1))[:size_bytes])
+    file_obj.name = name
+    return file_obj
+
+
+def timed(function, repeat):
+    """Run ``function`` ``repeat`` times; return (per-run seconds, last return value)."""
+    samples, value = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = function()
+        samples.append(time.perf_counter() - started)
+    return samples, value
+
+
+def summarize(name, params, samples, bytes_processed=None):
+    result = {
+        "name": name,
+        "params": params,
+        "repeat": len(samples),
+        "seconds": {"min": min(samples), "median": statistics.median(samples), "max": max(samples)},
+    }
+    if bytes_processed:
+        result["throughput_mb_s"] = bytes_processed / MB / statistics.median(samples)
+    return result
+
+
+class BenchEnvironment:
+    """S3 emulator + stub backend + a Pipeline wired to both, torn down on exit."""
+
+    def __init__(self, s3_latency, backend_latency, rent_roll_rows, report_chars):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.s3 = s3_emulator.serve(latency=s3_latency, buckets=[BENCH_BUCKET])
+        self.backend = stub_backend.StubBackend(backend_latency, rent_roll_rows, report_chars)
+        self.backend_server = stub_backend.serve(port=0, backend=self.backend)
+        backend_url = f"http://127.0.0.1:{self.backend_server.server_address[1]}"
+        self.pipeline = Pipeline(Settings(
+            s3_bucket_name=BENCH_BUCKET,
+            api_base_url_multi_docs=backend_url,
+            api_base_url_commercial_rent_roll=backend_url,
+            aws_access_key_id="bench",
+            aws_secret_access_key="bench",
+            aws_region="us-east-1",
+            s3_endpoint_url=self.s3.endpoint_url,
+            result_cache_path=os.path.join(self.cache_dir.name, "results.sqlite3"),
+            job_registry_path=os.path.join(self.cache_dir.name, "jobs.sqlite3"),
+            run_store_path=os.path.join(self.cache_dir.name, "runs.sqlite3"),
+            upload_checkpoint_path=os.path.join(self.cache_dir.name, "uploads.sqlite3"),
+            upload_spool_dir=os.path.join(self.cache_dir.name, "upload_spool"),
+        ))
+
+    def close(self):
+        self.s3.shutdown()
+        self.backend_server.shutdown()
+        self.cache_dir.cleanup()
+
+
+def bench_upload(env, sizes, repeat):
+    results = []
+    for file_mb in sizes["upload_file_mb"]:
+        for file_count in sizes["upload_file_counts"]:
+            slots = list(MULTI_DOC_SLOTS)[:file_count]
+            files = {slot: make_file(f"{slot}.pdf", file_mb * MB) for slot in slots}
+            samples, (_, errors, _) = timed(lambda: env.pipeline.upload(files, "bench-upload", content_addressed=False), repeat)
+            if errors:
+                raise RuntimeError(f"Upload benchmark failed: {errors}")
+            results.append(summarize("upload", {"files": file_count, "file_mb": file_mb}, samples, file_count * file_mb * MB))
+    return results
+
+
+def bench_end_to_end(env, sizes, repeat):
+    file_mb = sizes["end_to_end_file_mb"]
+    files = {slot: make_file(f"{slot}.pdf", file_mb * MB) for slot in MULTI_DOC_SLOTS}
+    rent_roll = make_file("rent_roll.xlsx", file_mb * MB)
+    samples_md, _ = timed(lambda: env.pipeline.analyze_multi_docs(files, force_refresh=True, use_jobs=False), repeat)
+    samples_rr, _ = timed(lambda: env.pipeline.analyze_rent_roll(rent_roll, force_refresh=True, use_jobs=False), repeat)
+    params = {"file_mb": file_mb, "backend_latency_s": env.backend.latency}
+    return [
+        summarize("end_to_end_multi_docs", {**params, "files": len(files)}, samples_md, len(files) * file_mb * MB),
+        summarize("end_to_end_rent_roll", {**params, "files": 1}, samples_rr, file_mb * MB),
+    ]
+
+
+def bench_parse(env, sizes, repeat):
+    results = []
+    payload = {"doc_url": "bench/rent_roll.xlsx", "run_id": "bench-parse"}
+    for rows in sizes["parse_rows"]:
+        env.backend.rent_roll_rows = rows
+        samples, _ = timed(lambda: env.pipeline.call_backend(API_ENDPOINT_ROUTE_RENT_ROLL, payload), repeat)
+        response_bytes = len(json.dumps(stub_backend.build_rent_roll_result(payload, rows)))
+        results.append(summarize("parse_rent_roll_response", {"rows": rows, "response_mb": round(response_bytes / MB, 2)}, samples, response_bytes))
+    payload = {**{f"{slot}_s3_key": f"bench/{slot}.pdf" for slot in MULTI_DOC_SLOTS}, "property_type": "self_storage", "run_id": "bench-parse"}
+    for report_chars in sizes["parse_report_chars"]:
+        env.backend.report_chars = report_chars
+        samples, result = timed(lambda: env.pipeline.call_backend(API_ENDPOINT_ROUTE_MULTI_DOCS, payload), repeat)
+        response_bytes = len(json.dumps(result))
+        results.append(summarize("parse_multi_docs_response", {"report_chars": report_chars, "response_mb": round(response_bytes / MB, 2)}, samples, response_bytes))
+    return results
+
+
+def bench_dataframe(sizes, repeat):
+    results = []
+    for rows in sizes["dataframe_rows"]:
+        line_items = stub_backend.build_rent_roll_rows(rows)
+        samples, _ = timed(lambda: pd.DataFrame(line_items), repeat)
+        results.append(summarize("dataframe_from_rent_roll", {"rows": rows}, samples))
+        body = json.dumps({"status": "success", RENT_ROLL_ROWS_KEY: line_items}).encode("utf-8")
+        samples, result = timed(lambda: parse_rent_roll_json(iter_bytes(body)), repeat)
+        results.append(summarize("streamed_rent_roll_frame", {"rows": rows}, samples, len(body)))
+        stored = dump_rent_roll_result(result)
+        samples, _ = timed(lambda: load_rent_roll_result(stored), repeat)
+        results.append(summarize("stored_rent_roll_load", {"rows": rows, "stored_mb": round(len(stored) / MB, 2)}, samples, len(stored)))
+    return results
+
+
+def environment_metadata():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": revision,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline against local S3 and backend stand-ins.")
+    parser.add_argument("--out", help="Write the JSON report here (default: stdout).")
+    parser.add_argument("--quick", action="store_true", help="Small sizes for a fast smoke run.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (median is reported).")
+    parser.add_argument("--only", choices=("upload", "end_to_end", "parse", "dataframe"), action="append", help="Run only these scenarios.")
+    parser.add_argument("--s3-latency", type=float, default=0.0, help="Seconds added to every S3 request.")
+    parser.add_argument("--backend-latency", type=float, default=0.5, help="Seconds the stub backend takes per analysis.")
+    args = parser.parse_args(argv)
+
+    sizes = QUICK_SIZES if args.quick else FULL_SIZES
+    scenarios = args.only or ["upload", "end_to_end", "parse", "dataframe"]
+    report = {"meta": {**environment_metadata(), "quick": args.quick, "s3_latency_s": args.s3_latency,
+                       "backend_latency_s": args.backend_latency}, "results": []}
+
+    env = BenchEnvironment(args.s3_latency, args.backend_latency, rent_roll_rows=250, report_chars=2000)
+    try:
+        if "upload" in scenarios:
+            report["results"] += bench_upload(env, sizes, args.repeat)
+        if "end_to_end" in scenarios:
+            report["results"] += bench_end_to_end(env, sizes, args.repeat)
+        if "parse" in scenarios:
+            env.backend.latency = 0 # Measure transfer + decode only
+            report["results"] += bench_parse(env, sizes, args.repeat)
+            env.backend.latency = args.backend_latency
+        if "dataframe" in scenarios:
+            report["results"] += bench_dataframe(sizes, args.repeat)
+    finally:
+        env.close()
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as out_file:
+            out_file.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
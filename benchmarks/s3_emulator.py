@@ -0,0 +1,235 @@
+"""In-process S3 stand-in for benchmarks.
+
+Implements the subset of the S3 REST API the pipeline uses, path-style, with
+objects held in memory: CreateBucket, PutObject, HeadObject, GetObject,
+DeleteObject, CopyObject, the multipart calls (Create/UploadPart/
+UploadPartCopy/Complete/Abort/ListMultipartUploads/ListParts). Requests are
+not authenticated. boto3's ``aws-chunked`` streaming bodies are decoded.
+
+    server = serve()                 # background thread, random free port
+    settings = Settings(..., s3_endpoint_url=server.endpoint_url)
+    ...
+    server.shutdown()
+
+An optional per-request ``latency`` (seconds) and ``bandwidth`` (bytes/s)
+simulate a remote bucket.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+
+def _etag(data):
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+def decode_aws_chunked(body):
+    """Strip aws-chunked framing (``<hex-size>[;ext]\\r\\n<data>\\r\\n ... 0\\r\\n<trailers>``)."""
+    decoded, position = bytearray(), 0
+    while True:
+        line_end = body.index(b"\r\n", position)
+        size = int(body[position:line_end].split(b";", 1)[0], 16)
+        position = line_end + 2
+        if size == 0:
+            return bytes(decoded)
+        decoded += body[position:position + size]
+        position += size + 2
+
+
+class S3State:
+    """Buckets, objects and in-progress multipart uploads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.uploads = {} # upload_id -> {"bucket", "key", "parts": {number: bytes}, "initiated"}
+        self.bytes_received = 0
+
+    def reset_counters(self):
+        with self.lock:
+            self.bytes_received = 0
+
+
+def make_handler(state, latency, bandwidth):
+    class S3Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # Keep-alive, like the real service
+
+        def log_message(self, format, *args):
+            pass
+
+        # --- Plumbing ---
+        def _parse(self):
+            url = urlsplit(self.path)
+            parts = url.path.lstrip("/").split("/", 1)
+            bucket = unquote(parts[0])
+            key = unquote(parts[1]) if len(parts) > 1 else ""
+            query = {name: values[0] for name, values in parse_qs(url.query, keep_blank_values=True).items()}
+            return bucket, key, query
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            if "aws-chunked" in (self.headers.get("Content-Encoding") or "") or self.headers.get("x-amz-decoded-content-length"):
+                body = decode_aws_chunked(body)
+            with state.lock:
+                state.bytes_received += len(body)
+            if bandwidth:
+                time.sleep(len(body) / bandwidth)
+            return body
+
+        def _send(self, status, body=b"", headers=None, content_type="application/xml"):
+            if latency:
+                time.sleep(latency)
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def _xml(self, status, root, inner):
+            self._send(status, f'<?xml version="1.0" encoding="UTF-8"?><{root}>{inner}</{root}>'.encode("utf-8"))
+
+        def _error(self, status, code, message=""):
+            self._xml(status, "Error", f"<Code>{code}</Code><Message>{escape(message)}</Message>")
+
+        def _copy_source(self):
+            source = unquote(self.headers["x-amz-copy-source"]).lstrip("/").split("?", 1)[0]
+            source_bucket, source_key = source.split("/", 1)
+            data = state.buckets.get(source_bucket, {}).get(source_key)
+            byte_range = self.headers.get("x-amz-copy-source-range")
+            if data is not None and byte_range:
+                start, end = (int(value) for value in byte_range.split("=", 1)[1].split("-"))
+                data = data[start:end + 1]
+            return data
+
+        # --- Verbs ---
+        def do_PUT(self):
+            bucket, key, query = self._parse()
+            if not key:
+                self._body()
+                with state.lock:
+                    state.buckets.setdefault(bucket, {})
+                return self._send(200)
+            if bucket not in state.buckets:
+                self._body()
+                return self._error(404, "NoSuchBucket", bucket)
+            if "uploadId" in query: # UploadPart / UploadPartCopy
+                upload = state.uploads.get(query["uploadId"])
+                if upload is None:
+                    self._body()
+                    return self._error(404, "NoSuchUpload", query["uploadId"])
+                if "x-amz-copy-source" in self.headers:
+                    self._body()
+                    data = self._copy_source()
+                    if data is None:
+                        return self._error(404, "NoSuchKey", "copy source")
+                    with state.lock:
+                        upload["parts"][int(query["partNumber"])] = data
+                    return self._xml(200, "CopyPartResult", f"<ETag>{escape(_etag(data))}</ETag>")
+                data = self._body()
+                with state.lock:
+                    upload["parts"][int(query["partNumber"])] = data
+                return self._send(200, headers={"ETag": _etag(data)})
+            if "x-amz-copy-source" in self.headers: # CopyObject
+                self._body()
+                data = self._copy_source()
+                if data is None:
+                    return self._error(404, "NoSuchKey", "copy source")
+                with state.lock:
+                    state.buckets[bucket][key] = data
+                modified = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+                return self._xml(200, "CopyObjectResult", f"<ETag>{escape(_etag(data))}</ETag><LastModified>{modified}</LastModified>")
+            data = self._body() # PutObject
+            with state.lock:
+                state.buckets[bucket][key] = data
+            self._send(200, headers={"ETag": _etag(data)})
+
+        def do_POST(self):
+            bucket, key, query = self._parse()
+            body = self._body()
+            if "uploads" in query: # CreateMultipartUpload
+                upload_id = uuid.uuid4().hex
+                with state.lock:
+                    state.uploads[upload_id] = {"bucket": bucket, "key": key, "parts": {}, "initiated": time.time()}
+                return self._xml(200, "InitiateMultipartUploadResult",
+                                 f"<Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key><UploadId>{upload_id}</UploadId>")
+            if "uploadId" in query: # CompleteMultipartUpload
+                with state.lock:
+                    upload = state.uploads.pop(query["uploadId"], None)
+                if upload is None:
+                    return self._error(404, "NoSuchUpload", query["uploadId"])
+                data = b"".join(upload["parts"][number] for number in sorted(upload["parts"]))
+                with state.lock:
+                    state.buckets.setdefault(bucket, {})[key] = data
+                return self._xml(200, "CompleteMultipartUploadResult",
+                                 f"<Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key><ETag>{escape(_etag(data))}</ETag>")
+            self._error(400, "NotImplemented", f"POST {self.path} ({len(body)} bytes)")
+
+        def do_HEAD(self):
+            bucket, key, _ = self._parse()
+            data = state.buckets.get(bucket, {}).get(key)
+            if data is None:
+                return self._send(404)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("ETag", _etag(data))
+            self.end_headers()
+
+        def do_GET(self):
+            bucket, key, query = self._parse()
+            if "uploads" in query: # ListMultipartUploads
+                prefix = query.get("prefix", "")
+                with state.lock:
+                    uploads = [(upload_id, upload) for upload_id, upload in state.uploads.items()
+                               if upload["bucket"] == bucket and upload["key"].startswith(prefix)]
+                inner = "".join(
+                    f"<Upload><Key>{escape(upload['key'])}</Key><UploadId>{upload_id}</UploadId>"
+                    f"<Initiated>{datetime.fromtimestamp(upload['initiated'], timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')}</Initiated></Upload>"
+                    for upload_id, upload in uploads
+                )
+                return self._xml(200, "ListMultipartUploadsResult", f"<Bucket>{escape(bucket)}</Bucket><IsTruncated>false</IsTruncated>{inner}")
+            if "uploadId" in query: # ListParts
+                upload = state.uploads.get(query["uploadId"])
+                if upload is None:
+                    return self._error(404, "NoSuchUpload", query["uploadId"])
+                inner = "".join(
+                    f"<Part><PartNumber>{number}</PartNumber><ETag>{escape(_etag(data))}</ETag><Size>{len(data)}</Size></Part>"
+                    for number, data in sorted(upload["parts"].items())
+                )
+                return self._xml(200, "ListPartsResult", f"<IsTruncated>false</IsTruncated>{inner}")
+            data = state.buckets.get(bucket, {}).get(key)
+            if data is None:
+                return self._error(404, "NoSuchKey", key)
+            self._send(200, data, headers={"ETag": _etag(data)}, content_type="application/octet-stream")
+
+        def do_DELETE(self):
+            bucket, key, query = self._parse()
+            with state.lock:
+                if "uploadId" in query:
+                    state.uploads.pop(query["uploadId"], None)
+                else:
+                    state.buckets.get(bucket, {}).pop(key, None)
+            self._send(204)
+
+    return S3Handler
+
+
+def serve(host="127.0.0.1", port=0, latency=0.0, bandwidth=None, buckets=()):
+    """Start the emulator on a background thread; ``server.endpoint_url`` and ``server.state`` describe it."""
+    state = S3State()
+    for bucket in buckets:
+        state.buckets[bucket] = {}
+    server = ThreadingHTTPServer((host, port), make_handler(state, latency, bandwidth))
+    server.daemon_threads = True
+    server.state = state
+    server.endpoint_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
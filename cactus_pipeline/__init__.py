@@ -0,0 +1,61 @@
+"""Cactus AI analysis pipeline: upload documents, call the analysis backend, collect results.
+
+Importable without Streamlit, e.g. from a notebook::
+
+    from cactus_pipeline import Pipeline, Settings
+
+    pipeline = Pipeline(Settings.load())
+    with open("rent_roll.xlsx", "rb") as rent_roll:
+        outcome = pipeline.analyze_rent_roll(rent_roll)
+
+The command line entry point is ``python -m cactus_pipeline`` (see cli.py).
+"""
+from .config import (
+    ALLOWED_EXTENSIONS,
+    API_ENDPOINT_ROUTE_MULTI_DOCS,
+    API_ENDPOINT_ROUTE_RENT_ROLL,
+    MULTI_DOC_SLOTS,
+    MULTI_DOCS_PROPERTY_TYPE,
+    S3_BASE_FOLDER,
+    Settings,
+    is_allowed_file,
+)
+
+# Pipeline pulls in boto3/requests; load it on first access so `import cactus_pipeline` stays cheap
+_LAZY_EXPORTS = {
+    "AnalysisOutcome": ".pipeline",
+    "Pipeline": ".pipeline",
+    "describe_result": ".pipeline",
+    "ResultCache": ".cache",
+    "RunStore": ".runs",
+    "ResumableUploads": ".resumable",
+    "AdmissionController": ".admission",
+    "AdmissionShed": ".admission",
+    "JobRegistry": ".jobs",
+    "JobFailedError": ".jobs",
+    "properties_from_zip": ".batch",
+    "ZipTooLargeError": ".batch",
+    "rent_roll_analytics": ".analytics",
+    "Tracer": ".tracing",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        import importlib
+
+        return getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = [
+    "ALLOWED_EXTENSIONS",
+    "API_ENDPOINT_ROUTE_MULTI_DOCS",
+    "API_ENDPOINT_ROUTE_RENT_ROLL",
+    "MULTI_DOC_SLOTS",
+    "MULTI_DOCS_PROPERTY_TYPE",
+    "S3_BASE_FOLDER",
+    "Settings",
+    "is_allowed_file",
+    *_LAZY_EXPORTS,
+]
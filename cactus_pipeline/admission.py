@@ -0,0 +1,171 @@
+"""Process-wide admission control for backend analysis calls.
+
+Every blocking backend call asks the AdmissionController for a slot of its
+route first. Each route has its own concurrency limit; calls beyond it wait
+in a queue that is fair across users: users take turns (round robin, in the
+order they started waiting) and each user's own calls run in FIFO order, so
+one user queueing a batch does not hold everyone else back. While waiting,
+callers are told their queue position and an estimated wait (from a moving
+average of how long calls of the route hold their slot). Queued calls whose
+``is_connected`` check turns False (their browser session went away) are
+shed before they reach the backend.
+"""
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+ADMISSION_POLL_SECONDS = 1.0 # How often a waiting caller re-checks its position (and gets on_wait)
+SERVICE_SECONDS_SMOOTHING = 0.2 # Weight of the newest call in the moving average of slot hold times
+
+
+class AdmissionShed(Exception):
+    """Raised to a queued caller whose session disconnected before it got a slot."""
+
+
+class _Ticket:
+    def __init__(self, number, route, user, is_connected):
+        self.number = number
+        self.route = route
+        self.user = user
+        self.is_connected = is_connected
+        self.enqueued_at = time.monotonic()
+        self.granted_at = None
+        self.shed = False
+        self.ready = threading.Event() # Set once granted or shed
+
+
+class _RouteQueue:
+    def __init__(self, limit, service_seconds):
+        self.limit = limit
+        self.service_seconds = service_seconds # Moving average of how long a call holds its slot
+        self.running = 0
+        self.waiting = {} # user -> deque of tickets, FIFO
+        self.turns = deque() # Users with waiting tickets, in the order they are served next
+
+    def queued(self):
+        return sum(len(tickets) for tickets in self.waiting.values())
+
+
+class AdmissionController:
+    """Per-route concurrency limits with a fair FIFO queue across users; safe to share between threads.
+
+    ``limits`` maps route -> calls allowed at once; other routes get
+    ``default_limit``. ``service_seconds`` seeds the wait estimate until
+    calls of a route have been timed.
+    """
+
+    def __init__(self, limits=None, default_limit=4, service_seconds=60.0):
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self.initial_service_seconds = service_seconds
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._numbers = itertools.count()
+        self.shed_count = 0
+
+    def _route(self, route):
+        queue = self._routes.get(route)
+        if queue is None:
+            queue = self._routes[route] = _RouteQueue(self.limits.get(route, self.default_limit), self.initial_service_seconds)
+        return queue
+
+    @contextmanager
+    def admit(self, route, user=None, is_connected=None, on_wait=None):
+        """Hold a slot of ``route`` for the duration of the ``with`` block, waiting for one if needed.
+
+        ``on_wait(position, estimated_wait_seconds)`` is called on the calling
+        thread about once a second while queued (position 1 is next); it may
+        raise to give up the place in the queue. Raises AdmissionShed if
+        ``is_connected()`` turns False while queued.
+        """
+        with self._lock:
+            ticket = _Ticket(next(self._numbers), route, user, is_connected)
+            queue = self._route(route)
+            if user not in queue.waiting:
+                queue.waiting[user] = deque()
+                queue.turns.append(user)
+            queue.waiting[user].append(ticket)
+            self._dispatch(queue)
+        try:
+            while not ticket.ready.is_set():
+                with self._lock:
+                    self._dispatch(queue) # Also sheds callers that disconnected since the last release
+                    if ticket.ready.is_set():
+                        break
+                    position, estimate = self._position(queue, ticket), self._estimate(queue, ticket)
+                if on_wait is not None:
+                    on_wait(position, estimate)
+                ticket.ready.wait(ADMISSION_POLL_SECONDS)
+            if ticket.shed:
+                raise AdmissionShed(f"Dropped from the {route} queue: the session disconnected.")
+            yield ticket
+        finally:
+            self._leave(queue, ticket)
+
+    def _dispatch(self, queue):
+        """Grant free slots to the users whose turn it is, skipping disconnected callers. Caller holds the lock."""
+        for user in list(queue.turns):
+            tickets = queue.waiting[user]
+            while tickets and tickets[0].is_connected is not None and not tickets[0].is_connected():
+                self._shed(tickets.popleft())
+            if not tickets:
+                self._drop_user(queue, user)
+        while queue.running < queue.limit and queue.turns:
+            user = queue.turns.popleft()
+            ticket = queue.waiting[user].popleft()
+            if queue.waiting[user]:
+                queue.turns.append(user) # Back of the line: other users go first
+            else:
+                del queue.waiting[user]
+            queue.running += 1
+            ticket.granted_at = time.monotonic()
+            ticket.ready.set()
+
+    def _shed(self, ticket):
+        ticket.shed = True
+        self.shed_count += 1
+        ticket.ready.set()
+
+    @staticmethod
+    def _drop_user(queue, user):
+        queue.waiting.pop(user, None)
+        if user in queue.turns:
+            queue.turns.remove(user)
+
+    def _leave(self, queue, ticket):
+        with self._lock:
+            if ticket.granted_at is not None:
+                queue.running -= 1
+                held = time.monotonic() - ticket.granted_at
+                queue.service_seconds += SERVICE_SECONDS_SMOOTHING * (held - queue.service_seconds)
+            elif not ticket.shed: # Gave up while queued (e.g. the script was stopped)
+                tickets = queue.waiting.get(ticket.user)
+                if tickets is not None and ticket in tickets:
+                    tickets.remove(ticket)
+                    if not tickets:
+                        self._drop_user(queue, ticket.user)
+            self._dispatch(queue)
+
+    def _position(self, queue, ticket):
+        """1-based place of ``ticket`` in the order the round robin will serve the queue."""
+        index = queue.waiting[ticket.user].index(ticket)
+        turn = queue.turns.index(ticket.user)
+        ahead = sum(min(len(tickets), index) for tickets in queue.waiting.values())
+        ahead += sum(1 for user in itertools.islice(queue.turns, turn) if len(queue.waiting[user]) > index)
+        return ahead + 1
+
+    def _estimate(self, queue, ticket):
+        """Rough seconds until ``ticket`` gets a slot: one average call per ``limit`` callers ahead of it."""
+        rounds = math.ceil(self._position(queue, ticket) / max(queue.limit, 1))
+        return rounds * queue.service_seconds
+
+    def stats(self):
+        """Route -> running / queued / limit / average seconds a call holds its slot."""
+        with self._lock:
+            return {
+                route: {"running": queue.running, "queued": queue.queued(), "limit": queue.limit, "service_seconds": queue.service_seconds}
+                for route, queue in self._routes.items()
+            }
@@ -0,0 +1,201 @@
+"""Rent roll KPIs computed locally from the typed line-item frame.
+
+Works on the DataFrame built by rent_roll.rent_roll_frame, so nothing goes
+back to the backend: occupancy (by units and by area, overall and per
+building), in-place rent per SF, WALT, the lease expiry ladder and tenant
+concentration. Columns are found by name (see the ``*_COLUMN_NAMES``
+tuples); a metric whose inputs are missing is left as None. Everything is
+computed with whole-column pandas/NumPy operations and group-bys, so 100k+
+line items take a fraction of a second.
+"""
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .rent_roll import SUITE_COLUMN_NAMES, TENANT_COLUMN_NAMES, find_column
+
+AREA_COLUMN_NAMES = ("square_feet", "sq_ft", "sqft", "sf", "rentable_sf", "rsf", "area", "size")
+ANNUAL_RENT_COLUMN_NAMES = ("annual_rent", "annual_base_rent", "base_rent_annual", "rent_annual")
+MONTHLY_RENT_COLUMN_NAMES = ("monthly_rent", "monthly_base_rent", "base_rent_monthly", "rent_monthly")
+LEASE_END_COLUMN_NAMES = ("lease_end", "lease_end_date", "lease_expiration", "lease_expiry", "expiration_date", "end_date")
+STATUS_COLUMN_NAMES = ("status", "occupancy_status", "unit_status")
+GROUP_COLUMN_NAMES = ("building", "property", "property_name", "floor")
+VACANT_PATTERN = r"vacant|available" # Status or tenant text of an empty suite
+EXPIRY_LADDER_YEARS = 10 # Years listed one by one; later expiries are pooled
+TOP_TENANT_COUNT = 10
+DAYS_PER_YEAR = 365.25
+
+
+@dataclass
+class RentRollAnalytics:
+    """KPIs of one rent roll as of a date. Frames are None when the columns they need are missing."""
+
+    as_of: pd.Timestamp
+    summary: dict
+    columns: dict = field(default_factory=dict) # Role (area, rent, ...) -> column of the rent roll it was read from
+    occupancy_by_group: Optional[pd.DataFrame] = None
+    expiry_ladder: Optional[pd.DataFrame] = None
+    top_tenants: Optional[pd.DataFrame] = None
+
+
+def _matches(values, pattern):
+    """Case-insensitive regex match per row; categoricals are matched once per category."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        matching = categories[categories.astype(str).str.contains(pattern, case=False, regex=True)]
+        return values.isin(matching).to_numpy()
+    return values.astype("string").str.contains(pattern, case=False, regex=True).fillna(False).to_numpy(dtype=bool)
+
+
+def _numeric(frame, column):
+    return pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def _ratio(numerator, denominator):
+    return float(numerator / denominator) if denominator else None
+
+
+def _weighted_mean(values, weights):
+    usable = ~np.isnan(values) & ~np.isnan(weights) & (weights > 0)
+    return _ratio(np.dot(values[usable], weights[usable]), weights[usable].sum())
+
+
+def _naive_utc(dates):
+    """Dates without a timezone (ISO dates with ``Z`` or an offset parse as tz-aware), converted to UTC if they had one."""
+    return dates.dt.tz_convert(None) if dates.dt.tz is not None else dates
+
+
+def resolve_columns(frame):
+    """Role -> column for every role found in ``frame``."""
+    roles = {
+        "tenant": find_column(frame, TENANT_COLUMN_NAMES),
+        "suite": find_column(frame, SUITE_COLUMN_NAMES),
+        "area": find_column(frame, AREA_COLUMN_NAMES),
+        "annual_rent": find_column(frame, ANNUAL_RENT_COLUMN_NAMES),
+        "monthly_rent": find_column(frame, MONTHLY_RENT_COLUMN_NAMES),
+        "lease_end": find_column(frame, LEASE_END_COLUMN_NAMES),
+        "status": find_column(frame, STATUS_COLUMN_NAMES),
+        "group": find_column(frame, GROUP_COLUMN_NAMES),
+    }
+    if roles["lease_end"] is not None and not pd.api.types.is_datetime64_any_dtype(frame[roles["lease_end"]]):
+        roles["lease_end"] = None
+    return {role: column for role, column in roles.items() if column is not None}
+
+
+def _vacant_mask(frame, columns):
+    vacant = np.zeros(len(frame), dtype=bool)
+    if "status" in columns:
+        vacant |= _matches(frame[columns["status"]], VACANT_PATTERN)
+    if "tenant" in columns:
+        tenants = frame[columns["tenant"]]
+        vacant |= tenants.isna().to_numpy() | _matches(tenants, VACANT_PATTERN)
+    return vacant
+
+
+def _annual_rent(frame, columns):
+    if "annual_rent" in columns:
+        return _numeric(frame, columns["annual_rent"])
+    if "monthly_rent" in columns:
+        return _numeric(frame, columns["monthly_rent"]) * 12
+    return None
+
+
+def _expiry_ladder(lease_end, occupied, area, rent, as_of, years):
+    """Occupied leases by year of expiry, with the share and cumulative share of rent (or area) rolling off."""
+    last_year = as_of.year + years - 1
+    labels = ["Expired / MTM", *(str(year) for year in range(as_of.year, last_year + 1)), f"{last_year + 1}+", "No end date"]
+    end_year = lease_end.dt.year.to_numpy(dtype="float64", na_value=np.nan)
+    codes = np.select(
+        [np.isnan(end_year), (lease_end < as_of).to_numpy(), end_year > last_year],
+        [len(labels) - 1, 0, len(labels) - 2],
+        default=np.nan_to_num(end_year - as_of.year + 1).astype("int64"),
+    )
+    bucket = pd.Categorical.from_codes(codes[occupied], categories=labels, ordered=True)
+    table = pd.DataFrame({"Expiry": bucket, "Leases": 1})
+    if area is not None:
+        table["Square feet"] = area[occupied]
+    if rent is not None:
+        table["Annual rent"] = rent[occupied]
+    ladder = table.groupby("Expiry", observed=False, sort=True).sum(min_count=0).reset_index()
+    share_of = "Annual rent" if rent is not None else "Square feet" if area is not None else "Leases"
+    total = ladder[share_of].sum()
+    ladder[f"% of {share_of.lower()}"] = ladder[share_of] / total * 100 if total else 0.0
+    ladder[f"Cumulative % of {share_of.lower()}"] = ladder[f"% of {share_of.lower()}"].cumsum()
+    return ladder
+
+
+def _top_tenants(tenants, occupied, area, rent, count):
+    table = pd.DataFrame({"Tenant": tenants[occupied].reset_index(drop=True), "Leases": 1})
+    if area is not None:
+        table["Square feet"] = area[occupied]
+    if rent is not None:
+        table["Annual rent"] = rent[occupied]
+    by_tenant = table.groupby("Tenant", observed=True, sort=False).sum(min_count=0)
+    rank_by = "Annual rent" if rent is not None else "Square feet" if area is not None else "Leases"
+    total = by_tenant[rank_by].sum()
+    top = by_tenant.nlargest(count, rank_by).reset_index()
+    top[f"% of {rank_by.lower()}"] = top[rank_by] / total * 100 if total else 0.0
+    return top, (_ratio(top[rank_by].sum(), total), _ratio(top[rank_by].iloc[0], total) if len(top) else None)
+
+
+def _occupancy_by_group(groups, vacant, area, rent):
+    table = pd.DataFrame({"Group": groups.reset_index(drop=True), "Units": 1, "Occupied units": (~vacant).astype("int64")})
+    if area is not None:
+        table["Square feet"] = np.nan_to_num(area)
+        table["Occupied square feet"] = np.where(vacant, 0.0, np.nan_to_num(area))
+    if rent is not None:
+        table["Annual rent"] = np.where(vacant, 0.0, np.nan_to_num(rent))
+    by_group = table.groupby("Group", observed=True, sort=True).sum()
+    if area is not None:
+        by_group["Occupancy %"] = by_group["Occupied square feet"] / by_group["Square feet"].where(by_group["Square feet"] > 0) * 100
+        if rent is not None:
+            by_group["Rent per SF"] = by_group["Annual rent"] / by_group["Occupied square feet"].where(by_group["Occupied square feet"] > 0)
+    else:
+        by_group["Occupancy %"] = by_group["Occupied units"] / by_group["Units"] * 100
+    return by_group.reset_index()
+
+
+def rent_roll_analytics(frame, as_of=None, expiry_years=EXPIRY_LADDER_YEARS, top_tenants=TOP_TENANT_COUNT):
+    """KPIs, expiry ladder, tenant concentration and per-building occupancy of a rent roll frame.
+
+    Lease terms and expiries are measured from ``as_of`` (default: today).
+    Suites count as vacant when their status or tenant says vacant/available
+    or the tenant is blank; only occupied suites enter rent, WALT and tenant figures.
+    """
+    as_of = pd.Timestamp(as_of if as_of is not None else pd.Timestamp.today()).normalize()
+    columns = resolve_columns(frame)
+    vacant = _vacant_mask(frame, columns)
+    occupied = ~vacant
+    area = _numeric(frame, columns["area"]) if "area" in columns else None
+    rent = _annual_rent(frame, columns)
+
+    summary = {"units": len(frame), "occupied_units": int(occupied.sum()), "occupancy_units": _ratio(occupied.sum(), len(frame))}
+    if area is not None:
+        total_area, occupied_area = np.nansum(area), np.nansum(area[occupied])
+        summary.update(square_feet=float(total_area), occupied_square_feet=float(occupied_area), occupancy_area=_ratio(occupied_area, total_area))
+    if rent is not None:
+        summary["annual_rent"] = float(np.nansum(rent[occupied]))
+        if area is not None:
+            # In-place rent per SF over occupied suites that report both rent and area
+            has_both = occupied & ~np.isnan(rent) & ~np.isnan(area)
+            summary["rent_per_sf"] = _ratio(rent[has_both].sum(), area[has_both].sum())
+
+    analytics = RentRollAnalytics(as_of, summary, columns)
+    if "lease_end" in columns:
+        lease_end = _naive_utc(frame[columns["lease_end"]])
+        remaining = np.clip((lease_end - as_of).dt.days.to_numpy(dtype="float64", na_value=np.nan) / DAYS_PER_YEAR, 0, None)
+        in_place = occupied & ~np.isnan(remaining)
+        if rent is not None:
+            summary["walt_years_by_rent"] = _weighted_mean(remaining[in_place], rent[in_place])
+        if area is not None:
+            summary["walt_years_by_area"] = _weighted_mean(remaining[in_place], area[in_place])
+        analytics.expiry_ladder = _expiry_ladder(lease_end, occupied, area, rent, as_of, expiry_years)
+    if "tenant" in columns and occupied.any():
+        analytics.top_tenants, (summary["top_tenants_share"], summary["largest_tenant_share"]) = _top_tenants(
+            frame[columns["tenant"]], occupied, area, rent, top_tenants
+        )
+    if "group" in columns:
+        analytics.occupancy_by_group = _occupancy_by_group(frame[columns["group"]], vacant, area, rent)
+    return analytics
@@ -0,0 +1,78 @@
+"""Batch inputs: split a zip of property folders into Multi-Docs items."""
+import io
+import os
+import re
+import zipfile
+
+from .config import is_allowed_file
+
+# Limits on one uploaded zip, checked against its directory before anything is decompressed
+BATCH_ZIP_MAX_ENTRIES = 1000 # Members of any kind (files, folders, skipped files)
+BATCH_ZIP_MAX_FILE_BYTES = 200 * 1024 * 1024 # One document, uncompressed
+BATCH_ZIP_MAX_TOTAL_BYTES = 2 * 1024 * 1024 * 1024 # All documents read from the zip, uncompressed
+
+# Filename keywords used to place files from a property folder into Multi-Docs slots (anything else -> other_docs)
+BATCH_SLOT_KEYWORDS = {
+    "management_summary": ("management", "mgmt"),
+    "occupancy_report": ("occupancy", "rent roll", "rentroll", "unit mix"),
+    "offering_memo": ("offering", "memorandum", "om"),
+}
+
+
+def slot_for_filename(file_name):
+    """Multi-Docs slot a file from a property folder belongs to, guessed from its name."""
+    normalized = " ".join(re.split(r"[^a-z0-9]+", os.path.splitext(file_name)[0].lower())).strip()
+    tokens = set(normalized.split())
+    for slot, keywords in BATCH_SLOT_KEYWORDS.items():
+        if any((keyword in normalized) if " " in keyword else (keyword in tokens) for keyword in keywords):
+            return slot
+    return "other_docs"
+
+
+class ZipTooLargeError(ValueError):
+    """A batch zip exceeds BATCH_ZIP_MAX_ENTRIES, BATCH_ZIP_MAX_FILE_BYTES or BATCH_ZIP_MAX_TOTAL_BYTES."""
+
+
+def properties_from_zip(zip_file):
+    """Split a zip of property folders into batch items.
+
+    Each top-level folder is one property (files at the root form a property
+    named after the zip). Returns ``[(property_name, files_by_slot, skipped_names)]``;
+    files are in-memory copies carrying a ``name`` so they upload like UploadedFiles.
+    Raises ZipTooLargeError, before reading the offending member, for zips over
+    the BATCH_ZIP_* limits (zipfile never inflates a member past its recorded size).
+    """
+    with zipfile.ZipFile(zip_file) as archive:
+        if len(archive.infolist()) > BATCH_ZIP_MAX_ENTRIES:
+            raise ZipTooLargeError(f"it has more than {BATCH_ZIP_MAX_ENTRIES} entries")
+        entries = [
+            info for info in archive.infolist()
+            if not info.is_dir() and "__MACOSX" not in info.filename
+            and not os.path.basename(info.filename).startswith(".")
+        ]
+        paths = {info.filename: [part for part in info.filename.split("/") if part] for info in entries}
+        # A zip of a single wrapping folder ("batch/PropA/x.pdf") is treated as that folder's contents
+        while paths and all(len(parts) > 2 for parts in paths.values()) and len({parts[0] for parts in paths.values()}) == 1:
+            paths = {name: parts[1:] for name, parts in paths.items()}
+
+        zip_stem = os.path.splitext(os.path.basename(getattr(zip_file, "name", "batch.zip")))[0]
+        properties = {}
+        total_bytes = 0
+        for info in entries:
+            parts = paths[info.filename]
+            property_name = parts[0] if len(parts) > 1 else zip_stem
+            files_by_slot, skipped = properties.setdefault(property_name, ({}, []))
+            file_name = parts[-1]
+            slot = slot_for_filename(file_name)
+            if not is_allowed_file(file_name) or slot in files_by_slot:
+                skipped.append(file_name)
+                continue
+            if info.file_size > BATCH_ZIP_MAX_FILE_BYTES:
+                raise ZipTooLargeError(f"{file_name} is larger than {BATCH_ZIP_MAX_FILE_BYTES // (1024 * 1024)} MB uncompressed")
+            total_bytes += info.file_size
+            if total_bytes > BATCH_ZIP_MAX_TOTAL_BYTES:
+                raise ZipTooLargeError(f"its documents add up to more than {BATCH_ZIP_MAX_TOTAL_BYTES // (1024 * 1024)} MB uncompressed")
+            file_obj = io.BytesIO(archive.read(info))
+            file_obj.name = file_name
+            files_by_slot[slot] = file_obj
+    return [(name, files, skipped) for name, (files, skipped) in sorted(properties.items()) if files]
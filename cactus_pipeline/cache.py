@@ -0,0 +1,108 @@
+"""Persistent client-side cache of backend results, keyed by document fingerprints."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from .rent_roll import PARQUET_MAGIC
+
+
+def result_cache_key(route, doc_hashes, property_type=None, preprocess_excel=False, base_url=None):
+    """Cache key for a backend call: everything that shapes its result.
+
+    That is the route and the backend serving it, the property type, whether
+    normalized Excel sheets go with the documents, and slot -> SHA-256 of
+    every input.
+    """
+    key_material = json.dumps(
+        {"route": route, "base_url": base_url, "property_type": property_type, "preprocess_excel": bool(preprocess_excel), "docs": doc_hashes},
+        sort_keys=True,
+    )
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+def _as_bytes(payload):
+    return payload.encode("utf-8") if isinstance(payload, str) else payload
+
+
+def pack_payload(payload):
+    """Bytes to store for a dumped result: zlib-compressed, except Parquet, whose pages are compressed already."""
+    payload = _as_bytes(payload)
+    return payload if payload[:4] == PARQUET_MAGIC else zlib.compress(payload)
+
+
+def unpack_payload(stored):
+    """Inverse of pack_payload; a zlib stream never starts with the Parquet magic, so the two cannot be confused."""
+    return stored if stored[:4] == PARQUET_MAGIC else zlib.decompress(stored)
+
+
+class ResultCache:
+    """Persistent backend-result cache with TTL and total-size (LRU) eviction.
+
+    Payloads are stored as JSON by default, zlib-compressed unless they are
+    Parquet (see pack_payload). Hit/miss counters
+    are kept in the same database so they survive restarts. ``dumps``/``loads``
+    let a caller encode and decode payloads itself (e.g. rent rolls held as
+    frames, stored as Parquet); ``dumps`` may return text or bytes.
+    """
+
+    def __init__(self, path, max_bytes, ttl_seconds):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "cache_key TEXT PRIMARY KEY, route TEXT, created_at REAL, last_access REAL, size INTEGER, payload BLOB)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+            self._conn.executemany("INSERT OR IGNORE INTO stats (name, value) VALUES (?, 0)", [("hits",), ("misses",)])
+
+    def _count(self, name):
+        self._conn.execute("UPDATE stats SET value = value + 1 WHERE name = ?", (name,))
+
+    def get(self, cache_key, loads=json.loads):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT payload FROM results WHERE cache_key = ? AND created_at >= ?", (cache_key, now - self.ttl_seconds)
+            ).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            self._conn.execute("UPDATE results SET last_access = ? WHERE cache_key = ?", (now, cache_key))
+            self._count("hits")
+        return loads(unpack_payload(row[0]))
+
+    def put(self, cache_key, route, result, dumps=json.dumps):
+        payload = pack_payload(dumps(result))
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (cache_key, route, created_at, last_access, size, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                (cache_key, route, now, now, len(payload), payload),
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for cache_key, size in self._conn.execute("SELECT cache_key, size FROM results ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM results WHERE cache_key = ?", (cache_key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {"hits": counters.get("hits", 0), "misses": counters.get("misses", 0), "entries": entries, "bytes": total}
@@ -0,0 +1,194 @@
+"""Headless entry point: ``python -m cactus_pipeline <flow> FILES... [--out results.parquet]``.
+
+Examples::
+
+    python -m cactus_pipeline rent-roll ./files/*.xlsx --out results.parquet
+    python -m cactus_pipeline multi-docs --offering-memo om.pdf --occupancy-report occ.xlsx --out reports.csv
+    python -m cactus_pipeline multi-docs-batch properties.zip --parallel 8 --out reports.jsonl
+    python -m cactus_pipeline sweep-uploads --older-than-hours 12
+
+Settings are read from ``.streamlit/secrets.toml`` (or ``--secrets``) and
+environment variables with the same names. One JSON summary line per item is
+printed to stdout as items finish; the exit code is 1 if any item failed.
+Heavy dependencies (boto3, pandas) are only imported once a command runs, so
+``--help`` and argument errors return immediately.
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import zipfile
+
+from .config import API_ENDPOINT_ROUTE_MULTI_DOCS, MULTI_DOC_SLOTS, Settings, is_allowed_file
+
+OUTPUT_FORMATS = (".parquet", ".csv", ".json", ".jsonl", ".xlsx")
+
+
+def _expand(patterns):
+    """Expand globs ourselves too, so quoted patterns work from cron and Windows shells."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        paths.extend(matches or [pattern])
+    return paths
+
+
+def _input_paths(args):
+    """Every input file the command will open (glob patterns expanded)."""
+    if args.command == "rent-roll":
+        return _expand(args.files)
+    if args.command == "multi-docs":
+        return [getattr(args, slot) for slot in MULTI_DOC_SLOTS if getattr(args, slot)]
+    if args.command == "multi-docs-batch":
+        return _expand(args.zips)
+    return []
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cactus-analyze", description="Run Cactus AI analyses without the Streamlit app.")
+    parser.add_argument("--secrets", help="Path to a secrets.toml (default: .streamlit/secrets.toml if present).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(subparser):
+        subparser.add_argument("--out", help=f"Write results to a file ({', '.join(OUTPUT_FORMATS)}).")
+        subparser.add_argument("--parallel", type=int, help="Items analyzed at once (default: BATCH_MAX_PARALLEL).")
+        subparser.add_argument("--force-refresh", action="store_true", help="Ignore cached results and call the backend.")
+        subparser.add_argument("--content-addressed", action="store_true", default=None, help="Skip uploading files already in S3.")
+        subparser.add_argument("--jobs", action="store_true", default=None, help="Submit as backend jobs and poll for results.")
+        subparser.add_argument(
+            "--preprocess-excel", action="store_true", default=None, help="Also upload normalized sheets of .xlsx files with a manifest."
+        )
+
+    rent_roll = subparsers.add_parser("rent-roll", help="Analyze one or more commercial rent rolls (one run each).")
+    rent_roll.add_argument("files", nargs="+", help="Rent roll files or glob patterns.")
+    add_common(rent_roll)
+
+    multi_docs = subparsers.add_parser("multi-docs", help="Analyze one property's documents.")
+    for slot, label in MULTI_DOC_SLOTS.items():
+        multi_docs.add_argument(f"--{slot.replace('_', '-')}", dest=slot, help=f"{label} file.")
+    add_common(multi_docs)
+
+    multi_docs_batch = subparsers.add_parser("multi-docs-batch", help="Analyze zips with one folder per property.")
+    multi_docs_batch.add_argument("zips", nargs="+", help="Zip files or glob patterns.")
+    add_common(multi_docs_batch)
+
+    sweep_uploads = subparsers.add_parser("sweep-uploads", help="Abort abandoned multipart uploads and delete unclaimed staged files (e.g. from cron).")
+    sweep_uploads.add_argument("--older-than-hours", type=float, help="Cutoff age (default: UPLOAD_ABANDON_HOURS).")
+    return parser
+
+
+def outcomes_to_frame(outcomes):
+    """Flatten outcomes into one table: rent roll line items, or one row per analyzed Multi-Docs document."""
+    import pandas as pd
+
+    from .rent_roll import RENT_ROLL_ROWS_KEY
+
+    frames, rows = [], []
+    for outcome in outcomes:
+        if not outcome.ok:
+            continue
+        if outcome.route == API_ENDPOINT_ROUTE_MULTI_DOCS:
+            for slot, label in MULTI_DOC_SLOTS.items():
+                page_data = outcome.result.get(f"{slot}_data")
+                if isinstance(page_data, dict):
+                    summary = next((v for k, v in page_data.items() if k.endswith("_summary")), None)
+                    rows.append({"item": outcome.name, "run_id": outcome.run_id, "document": label,
+                                 "summary": summary, "full_report": page_data.get("full_report")})
+        else:
+            line_items = outcome.result.get(RENT_ROLL_ROWS_KEY) if isinstance(outcome.result, dict) else None
+            if isinstance(line_items, pd.DataFrame) and not line_items.empty:
+                frame = line_items.copy()
+                frame.insert(0, "run_id", outcome.run_id)
+                frame.insert(0, "source_file", outcome.name)
+                frames.append(frame)
+    if rows:
+        frames.append(pd.DataFrame(rows))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def write_output(frame, path):
+    from .exports import EXPORT_FORMATS, write_frame
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension in EXPORT_FORMATS:
+        write_frame(frame, path)
+    elif extension == ".json":
+        frame.to_json(path, orient="records", date_format="iso")
+    elif extension == ".jsonl":
+        frame.to_json(path, orient="records", lines=True, date_format="iso")
+    else:
+        raise ValueError(f"Unsupported output format {extension!r}; use one of {', '.join(OUTPUT_FORMATS)}.")
+
+
+def _summary_line(outcome):
+    from .pipeline import describe_result
+
+    return json.dumps({
+        "item": outcome.name,
+        "run_id": outcome.run_id,
+        "status": "failed" if not outcome.ok else ("cached" if outcome.from_cache else "done"),
+        "seconds": round(outcome.seconds, 2) if outcome.seconds is not None else None,
+        "detail": outcome.error if not outcome.ok else describe_result(outcome.route, outcome.result),
+    })
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "out", None) and os.path.splitext(args.out)[1].lower() not in OUTPUT_FORMATS:
+        parser.error(f"--out must end in one of {', '.join(OUTPUT_FORMATS)}")
+    missing = [path for path in _input_paths(args) if not os.path.isfile(path)]
+    if missing:
+        parser.error(f"No such file: {', '.join(missing)}")
+    try:
+        settings = Settings.load(args.secrets)
+    except KeyError as e:
+        parser.error(f"Missing required setting {e} (set it in secrets.toml or the environment).")
+
+    from .batch import ZipTooLargeError, properties_from_zip
+    from .pipeline import Pipeline
+
+    pipeline = Pipeline(settings)
+    if args.command == "sweep-uploads":
+        print(json.dumps({"aborted_uploads": pipeline.sweep_uploads(args.older_than_hours)}), flush=True)
+        return 0
+    options = {
+        "content_addressed": args.content_addressed, "force_refresh": args.force_refresh, "use_jobs": args.jobs,
+        "preprocess_excel": args.preprocess_excel,
+    }
+    with contextlib.ExitStack() as stack:
+        if args.command == "rent-roll":
+            paths = [path for path in _expand(args.files) if is_allowed_file(path)]
+            items = [(os.path.basename(path), stack.enter_context(open(path, "rb"))) for path in paths]
+            analyze = pipeline.analyze_rent_roll
+        elif args.command == "multi-docs":
+            files_by_slot = {slot: stack.enter_context(open(getattr(args, slot), "rb")) for slot in MULTI_DOC_SLOTS if getattr(args, slot)}
+            if not files_by_slot:
+                parser.error("Pass at least one document, e.g. --offering-memo om.pdf")
+            items = [(os.path.basename(next(iter(files_by_slot.values())).name), files_by_slot)]
+            analyze = pipeline.analyze_multi_docs
+        else:
+            items = []
+            for zip_path in _expand(args.zips):
+                with open(zip_path, "rb") as zip_file:
+                    try:
+                        items.extend((name, files) for name, files, _ in properties_from_zip(zip_file))
+                    except zipfile.BadZipFile:
+                        parser.error(f"{zip_path} is not a valid zip file.")
+                    except ZipTooLargeError as e:
+                        parser.error(f"{zip_path} was not opened: {e}.")
+            analyze = pipeline.analyze_multi_docs
+        if not items:
+            parser.error("No supported input files were found.")
+
+        outcomes = []
+        for outcome in pipeline.run_many(analyze, items, args.parallel, **options):
+            outcomes.append(outcome)
+            print(_summary_line(outcome), flush=True)
+
+    if args.out:
+        write_output(outcomes_to_frame(outcomes), args.out)
+        print(f"Wrote {args.out}", file=sys.stderr)
+    return 0 if all(outcome.ok for outcome in outcomes) else 1
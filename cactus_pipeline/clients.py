@@ -0,0 +1,96 @@
+"""Pooled S3 and HTTP clients shared by every run in the process."""
+import boto3
+import requests
+from botocore.config import Config as BotoConfig
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .uploads import S3_TRANSFER_CONFIG, UPLOAD_MAX_WORKERS
+
+# --- HTTP / S3 Connection Pooling ---
+HTTP_POOL_CONNECTIONS = 4 # Distinct backend hosts kept pooled
+HTTP_POOL_MAXSIZE = 32 # Keep-alive connections per host, shared by all sessions
+HTTP_CONNECT_TIMEOUT_SECONDS = 5
+HTTP_ANALYSIS_READ_TIMEOUT_SECONDS = 300 # Blocking analysis call (5 min)
+HTTP_JOB_READ_TIMEOUT_SECONDS = 30 # Job submit / status calls
+HTTP_RETRY_ATTEMPTS = 3
+HTTP_RETRY_BACKOFF_FACTOR = 0.5 # 0.5s, 1s, 2s ...
+HTTP_RETRY_BACKOFF_JITTER = 0.5 # Plus up to 0.5s random jitter per attempt
+HTTP_RETRY_STATUSES = (502, 503, 504)
+S3_MAX_POOL_CONNECTIONS = UPLOAD_MAX_WORKERS * S3_TRANSFER_CONFIG.max_concurrency # One connection per part in flight
+S3_CLIENT_CONFIG = BotoConfig(
+    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+    connect_timeout=HTTP_CONNECT_TIMEOUT_SECONDS,
+    read_timeout=60,
+    retries={"max_attempts": 5, "mode": "adaptive"},
+    tcp_keepalive=True,
+)
+
+
+def make_s3_client(settings):
+    return boto3.client(
+        's3',
+        aws_access_key_id=settings.aws_access_key_id,
+        aws_secret_access_key=settings.aws_secret_access_key,
+        region_name=settings.aws_region,
+        endpoint_url=settings.s3_endpoint_url,
+        config=S3_CLIENT_CONFIG,
+    )
+
+
+class _BackendRetry(Retry):
+    """Retry policy that never repeats a POST the backend may have received.
+
+    A POST is retried only if it failed to connect, or was answered 503 with a
+    Retry-After header (the service turned it away). A read timeout, dropped
+    connection or 502/504 after it was sent is handed back instead: a gateway
+    answers 504 once it has forwarded the request, so the analysis may already
+    be running. Other methods are retried as configured.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method == "POST" and not (status_code == 503 and has_retry_after):
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if method == "POST" and error is not None and not self._is_connection_error(error):
+            raise error.with_traceback(_stacktrace)
+        return super().increment(method, url, response=response, error=error, _pool=_pool, _stacktrace=_stacktrace)
+
+
+def make_http_session():
+    """Keep-alive session for both backend APIs, with retry on transient failures (see _BackendRetry for POSTs)."""
+    retry = _BackendRetry(
+        total=HTTP_RETRY_ATTEMPTS,
+        connect=HTTP_RETRY_ATTEMPTS,
+        read=HTTP_RETRY_ATTEMPTS,
+        status=HTTP_RETRY_ATTEMPTS,
+        status_forcelist=HTTP_RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "POST"}),
+        backoff_factor=HTTP_RETRY_BACKOFF_FACTOR,
+        backoff_jitter=HTTP_RETRY_BACKOFF_JITTER, # urllib3 >= 2
+        respect_retry_after_header=True,
+        raise_on_status=False, # Hand the last 5xx back so raise_for_status reports it
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def backend_post(http_session, url, payload, read_timeout=HTTP_ANALYSIS_READ_TIMEOUT_SECONDS, stream=False):
+    """POST to a backend route on the pooled session, keyed for safe retries by the payload's run_id.
+
+    With ``stream=True`` only the headers are read; the caller consumes (or
+    closes) the body, which returns the connection to the pool.
+    """
+    return http_session.post(
+        url, json=payload, headers={"Idempotency-Key": payload["run_id"]},
+        timeout=(HTTP_CONNECT_TIMEOUT_SECONDS, read_timeout), stream=stream,
+    )
+
+
+def backend_get(http_session, url, read_timeout=HTTP_JOB_READ_TIMEOUT_SECONDS, stream=False):
+    return http_session.get(url, timeout=(HTTP_CONNECT_TIMEOUT_SECONDS, read_timeout), stream=stream)
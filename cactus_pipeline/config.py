@@ -0,0 +1,127 @@
+"""Settings and shared constants for the analysis pipeline.
+
+Settings come from the same keys the Streamlit app reads from
+``.streamlit/secrets.toml``; outside Streamlit they can also be supplied as
+environment variables of the same name (environment wins).
+"""
+import os
+from dataclasses import dataclass
+from typing import Mapping, Optional
+
+API_ENDPOINT_ROUTE_MULTI_DOCS = "cactus-ai-multi-docs-smart-analysis"
+API_ENDPOINT_ROUTE_RENT_ROLL = "cactus-ai-commercial-rent-roll"
+S3_BASE_FOLDER = "USER#2/ai-agent-rentroll-parser"
+ALLOWED_EXTENSIONS = ['pdf', 'xlsx', 'xls']
+MULTI_DOCS_PROPERTY_TYPE = "self_storage" # Multi-Docs currently supports self storage only
+
+# Multi-Docs upload slots, in display order (slot -> label shown to the user)
+MULTI_DOC_SLOTS = {
+    "management_summary": "Management Summary",
+    "occupancy_report": "Occupancy Report",
+    "offering_memo": "Offering Memorandum",
+    "other_docs": "Other Document",
+}
+
+DEFAULT_SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+REQUIRED_SETTINGS = ("S3_BUCKET_NAME", "API_BASE_URL")
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+def is_allowed_file(filename):
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Connection details and feature defaults for one pipeline."""
+
+    s3_bucket_name: str
+    api_base_url_multi_docs: str
+    api_base_url_commercial_rent_roll: Optional[str] = None
+    aws_access_key_id: Optional[str] = None # None -> boto3's default credential chain
+    aws_secret_access_key: Optional[str] = None
+    aws_region: Optional[str] = None
+    s3_endpoint_url: Optional[str] = None # S3-compatible endpoint (MinIO, local emulator); None -> AWS
+    content_addressed_uploads: bool = False
+    excel_preprocessing: bool = False # Also upload normalized sheets + manifest next to each .xlsx (see workbooks.py)
+    excel_preprocess_format: str = "parquet" # "parquet" or "csv" (gzipped)
+    api_job_mode: bool = False
+    result_cache_path: str = os.path.join(".cache", "results.sqlite3")
+    result_cache_max_mb: int = 512
+    result_cache_ttl_hours: int = 24 * 7
+    job_registry_path: str = os.path.join(".cache", "jobs.sqlite3")
+    run_store_path: str = os.path.join(".cache", "runs.sqlite3")
+    run_store_max_mb: int = 2048
+    run_store_memory_mb: int = 256 # Decoded results kept in memory, shared by all sessions
+    upload_checkpoint_path: str = os.path.join(".cache", "uploads.sqlite3")
+    upload_spool_dir: str = os.path.join(".cache", "upload_spool")
+    upload_abandon_hours: int = 24 # Unfinished multipart uploads and unclaimed staged files older than this are removed by the sweeper
+    batch_max_parallel: int = 4
+    backend_max_concurrent_multi_docs: int = 4 # Blocking backend calls in flight per process; more wait in a fair queue
+    backend_max_concurrent_rent_roll: int = 4
+    trace_log_path: Optional[str] = None # JSON line per timed stage; None -> logging only
+    metrics_textfile_path: Optional[str] = None # Prometheus textfile; None -> not written
+
+    @classmethod
+    def from_mapping(cls, values: Mapping, required=REQUIRED_SETTINGS):
+        """Build settings from secrets-style keys. Raises KeyError naming the first missing required key."""
+        for key in required:
+            if key not in values:
+                raise KeyError(key)
+        rent_roll_url = values.get("API_BASE_URL_COMMERCIAL_RENT_ROLL")
+        return cls(
+            s3_bucket_name=values["S3_BUCKET_NAME"],
+            api_base_url_multi_docs=values["API_BASE_URL"].rstrip('/'),
+            api_base_url_commercial_rent_roll=rent_roll_url.rstrip('/') if rent_roll_url else None,
+            aws_access_key_id=values.get("AWS_ACCESS_KEY_ID"),
+            aws_secret_access_key=values.get("AWS_SECRET_ACCESS_KEY"),
+            aws_region=values.get("AWS_REGION"),
+            s3_endpoint_url=values.get("S3_ENDPOINT_URL"),
+            content_addressed_uploads=_as_bool(values.get("CONTENT_ADDRESSED_UPLOADS", False)),
+            excel_preprocessing=_as_bool(values.get("EXCEL_PREPROCESSING", False)),
+            excel_preprocess_format=values.get("EXCEL_PREPROCESS_FORMAT", cls.excel_preprocess_format),
+            api_job_mode=_as_bool(values.get("API_JOB_MODE", False)),
+            result_cache_path=values.get("RESULT_CACHE_PATH", cls.result_cache_path),
+            result_cache_max_mb=int(values.get("RESULT_CACHE_MAX_MB", cls.result_cache_max_mb)),
+            result_cache_ttl_hours=int(values.get("RESULT_CACHE_TTL_HOURS", cls.result_cache_ttl_hours)),
+            job_registry_path=values.get("JOB_REGISTRY_PATH", cls.job_registry_path),
+            run_store_path=values.get("RUN_STORE_PATH", cls.run_store_path),
+            run_store_max_mb=int(values.get("RUN_STORE_MAX_MB", cls.run_store_max_mb)),
+            run_store_memory_mb=int(values.get("RUN_STORE_MEMORY_MB", cls.run_store_memory_mb)),
+            upload_checkpoint_path=values.get("UPLOAD_CHECKPOINT_PATH", cls.upload_checkpoint_path),
+            upload_spool_dir=values.get("UPLOAD_SPOOL_DIR", cls.upload_spool_dir),
+            upload_abandon_hours=int(values.get("UPLOAD_ABANDON_HOURS", cls.upload_abandon_hours)),
+            batch_max_parallel=int(values.get("BATCH_MAX_PARALLEL", cls.batch_max_parallel)),
+            backend_max_concurrent_multi_docs=int(values.get("BACKEND_MAX_CONCURRENT_MULTI_DOCS", cls.backend_max_concurrent_multi_docs)),
+            backend_max_concurrent_rent_roll=int(values.get("BACKEND_MAX_CONCURRENT_RENT_ROLL", cls.backend_max_concurrent_rent_roll)),
+            trace_log_path=values.get("TRACE_LOG_PATH"),
+            metrics_textfile_path=values.get("METRICS_TEXTFILE_PATH"),
+        )
+
+    @classmethod
+    def load(cls, secrets_path=None, environ=None):
+        """Settings for headless use: a secrets.toml file (if present) overlaid with environment variables."""
+        environ = os.environ if environ is None else environ
+        secrets_path = secrets_path or DEFAULT_SECRETS_PATH
+        values = {}
+        if os.path.exists(secrets_path):
+            try:
+                import tomllib
+                with open(secrets_path, "rb") as secrets_file:
+                    values.update(tomllib.load(secrets_file))
+            except ImportError: # Python < 3.11
+                import toml
+                values.update(toml.load(secrets_path))
+        values.update({key: value for key, value in environ.items() if key.isupper()})
+        return cls.from_mapping(values)
+
+    def base_url_for(self, route):
+        if route == API_ENDPOINT_ROUTE_RENT_ROLL:
+            return self.api_base_url_commercial_rent_roll
+        return self.api_base_url_multi_docs
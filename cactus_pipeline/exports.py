@@ -0,0 +1,85 @@
+"""Chunked export of result frames to CSV, Parquet and Excel.
+
+Each writer walks the frame EXPORT_CHUNK_ROWS rows at a time and streams
+into the target file (CSV text, Parquet row groups, a write-only Excel
+sheet), so an export never holds a second full copy of the data in memory.
+"""
+import io
+import os
+
+EXPORT_CHUNK_ROWS = 50_000
+EXPORT_SPOOL_MAX_BYTES = 16 * 1024 * 1024 # Files uploaded from exports spill to a temp file on disk above this
+EXCEL_MAX_ROWS = 1_048_575 # One sheet, minus the header row
+EXPORT_MIME_TYPES = {
+    ".csv": "text/csv",
+    ".parquet": "application/vnd.apache.parquet",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+EXPORT_FORMATS = tuple(EXPORT_MIME_TYPES)
+
+
+def _chunks(frame):
+    for start in range(0, len(frame), EXPORT_CHUNK_ROWS):
+        yield frame.iloc[start:start + EXPORT_CHUNK_ROWS]
+
+
+def write_csv(frame, binary_file):
+    text_file = io.TextIOWrapper(binary_file, encoding="utf-8", newline="")
+    for index, chunk in enumerate(_chunks(frame)):
+        chunk.to_csv(text_file, index=False, header=index == 0)
+    if frame.empty:
+        frame.to_csv(text_file, index=False)
+    text_file.flush()
+    text_file.detach() # Leave binary_file open for the caller
+
+
+def write_parquet(frame, binary_file):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+    with pq.ParquetWriter(binary_file, schema, compression="zstd") as writer:
+        for chunk in _chunks(frame):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def write_excel(frame, binary_file):
+    from openpyxl import Workbook
+
+    if len(frame) > EXCEL_MAX_ROWS:
+        raise ValueError(f"{len(frame):,} rows do not fit in one Excel sheet; export CSV or Parquet instead.")
+    workbook = Workbook(write_only=True) # Rows are serialized as they are appended
+    sheet = workbook.create_sheet()
+    sheet.append([str(column) for column in frame.columns])
+    for chunk in _chunks(frame):
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(binary_file)
+
+
+_WRITERS = {".csv": write_csv, ".parquet": write_parquet, ".xlsx": write_excel}
+
+
+def write_frame(frame, path_or_file, extension=None):
+    """Write ``frame`` to a path (format from its extension) or to a binary file object (``extension`` required)."""
+    if extension is None:
+        extension = os.path.splitext(path_or_file)[1].lower()
+    if extension not in _WRITERS:
+        raise ValueError(f"Unsupported export format {extension!r}; use one of {', '.join(EXPORT_FORMATS)}.")
+    if isinstance(path_or_file, (str, os.PathLike)):
+        with open(path_or_file, "wb") as binary_file:
+            _WRITERS[extension](frame, binary_file)
+    else:
+        _WRITERS[extension](frame, path_or_file)
+
+
+def export_frame(frame, extension):
+    """The exported file as bytes, the one form every consumer (st.download_button included) accepts.
+
+    Download buttons hold the whole file in memory anyway, so there is nothing
+    to gain from spooling it to disk first.
+    """
+    buffer = io.BytesIO()
+    write_frame(frame, buffer, extension)
+    return buffer.getvalue()
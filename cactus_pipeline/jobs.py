@@ -0,0 +1,99 @@
+"""Backend job mode: submit to ``{route}/jobs`` and poll ``{route}/jobs/{job_id}``.
+
+Jobs are recorded in a small local registry keyed by run_id so a run can be
+picked up again after a page reload, a flow switch, or from another process.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from .clients import backend_get, backend_post, HTTP_JOB_READ_TIMEOUT_SECONDS
+
+JOB_POLL_INITIAL_INTERVAL_SECONDS = 2.0
+JOB_POLL_MAX_INTERVAL_SECONDS = 30.0
+JOB_POLL_BACKOFF = 1.5
+FINAL_JOB_STATUSES = ("succeeded", "failed")
+
+
+class JobFailedError(RuntimeError):
+    """The backend reported a job as failed (or no longer knows it)."""
+
+
+class JobRegistry:
+    """Local record of submitted backend jobs, so a run can be picked up again by its run_id.
+
+    ``user`` is who submitted the job (None for jobs recorded before owners were kept).
+    """
+
+    COLUMNS = ("run_id", "flow", "base_url", "route", "job_id", "cache_key", "status", "submitted_at", "user")
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (run_id TEXT PRIMARY KEY, flow TEXT, base_url TEXT, route TEXT, "
+                "job_id TEXT, cache_key TEXT, status TEXT, submitted_at REAL, user TEXT)"
+            )
+            if "user" not in {column[1] for column in self._conn.execute("PRAGMA table_info(jobs)")}: # Registry from before jobs had owners
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN user TEXT")
+
+    def record(self, job):
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' for _ in self.COLUMNS)})",
+                tuple(job[column] for column in self.COLUMNS),
+            )
+
+    def get(self, run_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE run_id = ?", (run_id,)).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def set_status(self, run_id, status):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET status = ? WHERE run_id = ?", (status, run_id))
+
+
+def submit_backend_job(http_session, base_url, route, payload):
+    """Submit an analysis job and return its job id (the backend ties it to payload["run_id"])."""
+    response = backend_post(http_session, f"{base_url}/{route}/jobs", payload, read_timeout=HTTP_JOB_READ_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return response.json()["job_id"]
+
+
+def fetch_backend_job(http_session, base_url, route, job_id, read_json=None):
+    """Current job state: {"status": queued|running|succeeded|failed, "result": ..., "error": ...}.
+
+    ``read_json(response)`` decodes a streamed response instead of ``response.json()``.
+    """
+    response = backend_get(http_session, f"{base_url}/{route}/jobs/{job_id}", stream=read_json is not None)
+    response.raise_for_status()
+    return read_json(response) if read_json else response.json()
+
+
+def next_poll_delay(interval):
+    """Backed-off polling interval and the jittered delay to wait before the next poll."""
+    interval = min(interval * JOB_POLL_BACKOFF, JOB_POLL_MAX_INTERVAL_SECONDS)
+    return interval, interval * random.uniform(0.8, 1.2)
+
+
+def wait_for_job(http_session, base_url, route, job_id, timeout=None, sleep=time.sleep, read_json=None):
+    """Block until the job finishes and return its result. Raises JobFailedError or TimeoutError."""
+    started = time.time()
+    interval = JOB_POLL_INITIAL_INTERVAL_SECONDS
+    sleep(interval)
+    while True:
+        job_state = fetch_backend_job(http_session, base_url, route, job_id, read_json)
+        if job_state.get("status") == "succeeded":
+            return job_state.get("result") or {}
+        if job_state.get("status") == "failed":
+            raise JobFailedError(job_state.get("error") or f"Job {job_id} failed without details from the backend.")
+        if timeout is not None and time.time() - started > timeout:
+            raise TimeoutError(f"Job {job_id} did not finish within {timeout}s.")
+        interval, delay = next_poll_delay(interval)
+        sleep(delay)
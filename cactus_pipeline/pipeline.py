@@ -0,0 +1,438 @@
+"""Upload + submit + result pipeline for both analysis flows, independent of Streamlit.
+
+A Pipeline owns the pooled S3 client, HTTP session, result cache, run store,
+upload checkpoints, job registry and the admission queue for backend calls,
+and is safe to share between threads: the Streamlit app keeps one per
+process, the CLI builds one per invocation, and notebooks can do either.
+"""
+import functools
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import requests
+
+from .admission import AdmissionController
+from .cache import ResultCache, result_cache_key
+from .clients import backend_post, make_http_session, make_s3_client
+from .config import (
+    API_ENDPOINT_ROUTE_MULTI_DOCS,
+    API_ENDPOINT_ROUTE_RENT_ROLL,
+    MULTI_DOC_SLOTS,
+    MULTI_DOCS_PROPERTY_TYPE,
+    S3_BASE_FOLDER,
+)
+from .jobs import JobRegistry, fetch_backend_job, submit_backend_job, wait_for_job
+from .rent_roll import RENT_ROLL_ROWS_KEY, dump_rent_roll_result, load_rent_roll_result, read_rent_roll_response
+from .resumable import ResumableUploads
+from .runs import RunStore
+from .tracing import Tracer
+from .uploads import SPECULATIVE_DELETE_WORKERS, SPECULATIVE_UPLOAD_WORKERS, SpeculativeUploads, file_name_of, hash_file, run_folder, upload_files_concurrently
+from .workbooks import is_preprocessable, upload_preprocessed
+
+
+@dataclass
+class AnalysisOutcome:
+    """Result of one analyzed item (a property for Multi-Docs, a file for rent rolls)."""
+
+    route: Optional[str]
+    run_id: str
+    name: str
+    result: Any = None
+    from_cache: bool = False
+    seconds: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def is_successful_rent_roll(result):
+    return isinstance(result, dict) and result.get("status") == "success"
+
+
+def describe_result(route, result):
+    """One-line outcome for summary tables."""
+    if route == API_ENDPOINT_ROUTE_MULTI_DOCS:
+        analyzed = [label for slot, label in MULTI_DOC_SLOTS.items() if isinstance(result.get(f"{slot}_data"), dict)]
+        return f"{len(analyzed)} document(s) analyzed" if analyzed else "No document data returned"
+    if is_successful_rent_roll(result):
+        rows = result.get(RENT_ROLL_ROWS_KEY)
+        return f"{0 if rows is None else len(rows)} line items"
+    return f"Status: {result.get('status', 'N/A') if isinstance(result, dict) else 'unexpected response'}"
+
+
+def _outcome_of(future, name, run_id):
+    """A finished run_many item's outcome, with its exception turned into ``error``."""
+    try:
+        return future.result()
+    except requests.exceptions.HTTPError as http_err:
+        return AnalysisOutcome(None, run_id, name, error=f"API request failed with HTTP error: {http_err}")
+    except Exception as e:
+        return AnalysisOutcome(None, run_id, name, error=str(e))
+
+
+def _deliver_abandoned(on_abandoned, future, name, run_id):
+    if not future.cancelled():
+        on_abandoned(_outcome_of(future, name, run_id))
+
+
+class Pipeline:
+    """Runs analyses end to end: fingerprint, cache lookup, upload, backend call, cache store.
+
+    The steps are also exposed individually so an interactive client can show
+    progress between them. Clients that are not passed in are created on first
+    use from ``settings``. Steps given a ``run_id`` are timed into ``tracer``.
+    """
+
+    def __init__(
+        self, settings, s3_client=None, http_session=None, result_cache=None, job_registry=None, tracer=None, run_store=None,
+        resumable_uploads=None, admission=None,
+    ):
+        self.settings = settings
+        self._s3_client = s3_client
+        self._http_session = http_session
+        self._result_cache = result_cache
+        self._run_store = run_store
+        self._resumable_uploads = resumable_uploads
+        self._admission = admission
+        self._job_registry = job_registry
+        self._tracer = tracer
+        self._staging_executor = None
+        self._staging_delete_executor = None
+        self._lock = threading.Lock()
+
+    # --- Shared clients (created lazily, once) ---
+    @property
+    def s3_client(self):
+        with self._lock:
+            if self._s3_client is None:
+                self._s3_client = make_s3_client(self.settings)
+            return self._s3_client
+
+    @property
+    def http_session(self):
+        with self._lock:
+            if self._http_session is None:
+                self._http_session = make_http_session()
+            return self._http_session
+
+    @property
+    def result_cache(self):
+        with self._lock:
+            if self._result_cache is None:
+                self._result_cache = ResultCache(
+                    self.settings.result_cache_path,
+                    self.settings.result_cache_max_mb * 1024 * 1024,
+                    self.settings.result_cache_ttl_hours * 3600,
+                )
+            return self._result_cache
+
+    @property
+    def run_store(self):
+        with self._lock:
+            if self._run_store is None:
+                self._run_store = RunStore(
+                    self.settings.run_store_path,
+                    self.settings.run_store_max_mb * 1024 * 1024,
+                    self.settings.run_store_memory_mb * 1024 * 1024,
+                )
+            return self._run_store
+
+    @property
+    def resumable_uploads(self):
+        with self._lock:
+            if self._resumable_uploads is None:
+                self._resumable_uploads = ResumableUploads(self.settings.upload_checkpoint_path, self.settings.upload_spool_dir)
+            return self._resumable_uploads
+
+    @property
+    def admission(self):
+        """Per-route limits on concurrent backend calls, shared by every caller of this pipeline."""
+        with self._lock:
+            if self._admission is None:
+                self._admission = AdmissionController({
+                    API_ENDPOINT_ROUTE_MULTI_DOCS: self.settings.backend_max_concurrent_multi_docs,
+                    API_ENDPOINT_ROUTE_RENT_ROLL: self.settings.backend_max_concurrent_rent_roll,
+                })
+            return self._admission
+
+    @property
+    def job_registry(self):
+        with self._lock:
+            if self._job_registry is None:
+                self._job_registry = JobRegistry(self.settings.job_registry_path)
+            return self._job_registry
+
+    @property
+    def tracer(self):
+        with self._lock:
+            if self._tracer is None:
+                self._tracer = Tracer(self.settings.trace_log_path, self.settings.metrics_textfile_path)
+            return self._tracer
+
+    @property
+    def staging_executor(self):
+        """Worker pool for speculative uploads of staged files (see stage_uploads)."""
+        with self._lock:
+            if self._staging_executor is None:
+                self._staging_executor = ThreadPoolExecutor(max_workers=SPECULATIVE_UPLOAD_WORKERS, thread_name_prefix="staged-upload")
+            return self._staging_executor
+
+    @property
+    def staging_delete_executor(self):
+        """Worker pool deleting replaced speculative uploads; separate because staged uploads wait for these deletes."""
+        with self._lock:
+            if self._staging_delete_executor is None:
+                self._staging_delete_executor = ThreadPoolExecutor(max_workers=SPECULATIVE_DELETE_WORKERS, thread_name_prefix="staged-delete")
+            return self._staging_delete_executor
+
+    def stage_uploads(self, run_id, content_addressed=None):
+        """SpeculativeUploads into the run's S3 folder: upload files while they are staged, collect them in ``upload``."""
+        if content_addressed is None:
+            content_addressed = self.settings.content_addressed_uploads
+        return SpeculativeUploads(
+            self.staging_executor, self.settings.s3_bucket_name, run_folder(run_id), self.s3_client, content_addressed,
+            resumable=self.resumable_uploads, run_id=run_id, delete_executor=self.staging_delete_executor,
+        )
+
+    # --- Individual steps ---
+    def fingerprint(self, files_by_slot, run_id=None):
+        """Slot -> SHA-256 of each file."""
+        with self.tracer.stage(run_id, "hash", files=len(files_by_slot)):
+            return {slot: hash_file(file_obj) for slot, file_obj in files_by_slot.items()}
+
+    def lookup_cached(self, route, doc_hashes, property_type=None, force_refresh=False, run_id=None, preprocess_excel=None):
+        """Return ``(cache_key, cached_result_or_None)``; ``force_refresh`` skips the lookup.
+
+        ``preprocess_excel`` (default: the setting) says whether the call sends
+        normalized sheets; results with and without them are cached apart.
+        """
+        preprocess_excel = self.settings.excel_preprocessing if preprocess_excel is None else preprocess_excel
+        cache_key = result_cache_key(route, doc_hashes, property_type, preprocess_excel, self.settings.base_url_for(route))
+        if force_refresh:
+            return cache_key, None
+        with self.tracer.stage(run_id, "cache_lookup", route=route) as stage:
+            if route == API_ENDPOINT_ROUTE_RENT_ROLL:
+                cached = self.result_cache.get(cache_key, loads=load_rent_roll_result)
+            else:
+                cached = self.result_cache.get(cache_key)
+            stage["hit"] = cached is not None
+        return cache_key, cached
+
+    def store_result(self, route, cache_key, result):
+        """Cache a backend result if it is usable (rent rolls must report success)."""
+        if route != API_ENDPOINT_ROUTE_RENT_ROLL:
+            self.result_cache.put(cache_key, route, result)
+        elif is_successful_rent_roll(result):
+            self.result_cache.put(cache_key, route, result, dumps=dump_rent_roll_result)
+
+    def save_run(self, route, run_id, result, user=None, name=None, cache_key=None):
+        """Keep a finished run's result in the run store, so it can be reopened by run_id."""
+        dumps = dump_rent_roll_result if route == API_ENDPOINT_ROUTE_RENT_ROLL else json.dumps
+        self.run_store.put(run_id, route, result, user=user, name=name, cache_key=cache_key, dumps=dumps)
+
+    def load_run(self, run_id):
+        """A stored run's result, or None if it is unknown or was evicted."""
+        return self.run_store.get(run_id, decoders={API_ENDPOINT_ROUTE_RENT_ROLL: load_rent_roll_result})
+
+    def upload(self, files_by_slot, run_id, on_progress=None, content_addressed=None, digests=None, staged=None):
+        """Upload files to the run's S3 folder concurrently. Returns ``(s3_keys, errors, progress)``.
+
+        With ``staged`` (from stage_uploads) the files were already uploading
+        in the background; only the uploads still in flight are waited for.
+        """
+        if content_addressed is None:
+            content_addressed = self.settings.content_addressed_uploads
+        with self.tracer.stage(run_id, "upload", files=len(files_by_slot)) as stage:
+            started = time.perf_counter()
+            if staged is not None:
+                s3_keys, errors, progress = staged.collect(files_by_slot, on_progress=on_progress)
+            else:
+                s3_keys, errors, progress = upload_files_concurrently(
+                    files_by_slot, self.settings.s3_bucket_name, run_folder(run_id), self.s3_client,
+                    on_progress=on_progress, content_addressed=content_addressed, digests=digests,
+                    resumable=self.resumable_uploads, run_id=run_id,
+                )
+            sent_bytes = sum(progress.total[slot] for slot in s3_keys if slot not in progress.reused)
+            stage.update(bytes=sent_bytes, reused=len(progress.reused), failed=len(errors))
+            if staged is not None: # Bytes mostly went out before this stage; its time is the remaining wait
+                stage["speculative"] = True
+            else:
+                stage["throughput_mb_s"] = round(sent_bytes / (1024 * 1024) / max(time.perf_counter() - started, 1e-6), 2)
+        return s3_keys, errors, progress
+
+    def preprocess_excel(self, files_by_slot, s3_keys, run_id):
+        """Upload normalized sheets and a manifest next to each uploaded Excel workbook. Returns slot -> manifest S3 key.
+
+        Pre-processing is an optional extra: a workbook that cannot be read is
+        skipped (counted as ``failed`` on the trace stage) and the backend falls
+        back to the original.
+        """
+        workbooks = {slot: f for slot, f in files_by_slot.items() if slot in s3_keys and is_preprocessable(file_name_of(f))}
+        manifests = {}
+        if not workbooks:
+            return manifests
+        with self.tracer.stage(run_id, "preprocess", files=len(workbooks)) as stage:
+            sent_bytes, failed = 0, 0
+            for slot, file_obj in workbooks.items():
+                try:
+                    manifests[slot], sent = upload_preprocessed(
+                        file_obj, self.settings.s3_bucket_name, s3_keys[slot], self.s3_client, self.settings.excel_preprocess_format
+                    )
+                    sent_bytes += sent
+                except Exception:
+                    failed += 1
+            stage.update(bytes=sent_bytes, failed=failed)
+        return manifests
+
+    def sweep_uploads(self, older_than_hours=None):
+        """Abort multipart uploads and delete staged files abandoned for longer than ``upload_abandon_hours``; returns the uploads aborted."""
+        if older_than_hours is None:
+            older_than_hours = self.settings.upload_abandon_hours
+        return self.resumable_uploads.sweep(
+            self.s3_client, self.settings.s3_bucket_name, S3_BASE_FOLDER, older_than_hours * 3600
+        )
+
+    @staticmethod
+    def multi_docs_payload(s3_keys, run_id, manifests=None):
+        """Backend payload; ``manifests`` (slot -> manifest S3 key from preprocess_excel) add ``{slot}_manifest_s3_key``."""
+        payload = {**{f"{slot}_s3_key": s3_keys.get(slot, "") for slot in MULTI_DOC_SLOTS}, "property_type": MULTI_DOCS_PROPERTY_TYPE, "run_id": run_id}
+        payload.update({f"{slot}_manifest_s3_key": manifest_key for slot, manifest_key in (manifests or {}).items()})
+        return payload
+
+    @staticmethod
+    def rent_roll_payload(s3_key, run_id, manifest_key=None):
+        payload = {"doc_url": s3_key, "run_id": run_id}
+        if manifest_key:
+            payload["doc_manifest_s3_key"] = manifest_key
+        return payload
+
+    def call_backend(self, route, payload, user=None, is_connected=None, on_wait=None):
+        """Blocking analysis call. Raises requests exceptions on failure; returns the decoded JSON.
+
+        The call first waits for a slot of its route (see AdmissionController;
+        ``user``, ``is_connected`` and ``on_wait`` are passed to ``admit``) and
+        holds it until the response is read. Rent roll responses are streamed:
+        line items become a typed DataFrame (``result["rent_roll_json_data"]``)
+        as they arrive.
+        """
+        run_id = payload.get("run_id")
+        streamed = route == API_ENDPOINT_ROUTE_RENT_ROLL
+        queued = time.perf_counter()
+        with self.admission.admit(route, user=user, is_connected=is_connected, on_wait=on_wait):
+            self.tracer.record(run_id, "queue", time.perf_counter() - queued, route=route)
+            with self.tracer.stage(run_id, "backend", route=route) as stage:
+                response = backend_post(self.http_session, f"{self.settings.base_url_for(route)}/{route}", payload, stream=streamed)
+                stage["status"] = response.status_code
+                if not streamed:
+                    stage["bytes"] = len(response.content)
+            response.raise_for_status()
+            with self.tracer.stage(run_id, "decode", route=route) as stage:
+                if not streamed:
+                    return response.json()
+                result, stage["bytes"] = read_rent_roll_response(response)
+                return result
+
+    @staticmethod
+    def _job_reader(route):
+        """Streaming decoder for job states of ``route`` (rent roll rows arrive under "result")."""
+        if route != API_ENDPOINT_ROUTE_RENT_ROLL:
+            return None
+        return lambda response: read_rent_roll_response(response, ("result", RENT_ROLL_ROWS_KEY))[0]
+
+    def submit_job(self, route, payload):
+        with self.tracer.stage(payload.get("run_id"), "job_submit", route=route):
+            return submit_backend_job(self.http_session, self.settings.base_url_for(route), route, payload)
+
+    def job_status(self, route, job_id, base_url=None):
+        return fetch_backend_job(self.http_session, base_url or self.settings.base_url_for(route), route, job_id, self._job_reader(route))
+
+    def wait_for_job(self, route, job_id, timeout=None, run_id=None):
+        with self.tracer.stage(run_id, "job_wait", route=route):
+            return wait_for_job(
+                self.http_session, self.settings.base_url_for(route), route, job_id, timeout=timeout, read_json=self._job_reader(route)
+            )
+
+    # --- End-to-end runs ---
+    def _analyze(
+        self, route, files_by_slot, payload_for, property_type, run_id, name, content_addressed, force_refresh, use_jobs, user, is_connected,
+        preprocess_excel,
+    ):
+        run_id = run_id or str(uuid.uuid4())
+        started = time.time()
+        doc_hashes = self.fingerprint(files_by_slot, run_id)
+        preprocess_excel = self.settings.excel_preprocessing if preprocess_excel is None else preprocess_excel
+        cache_key, cached = self.lookup_cached(route, doc_hashes, property_type, force_refresh, run_id, preprocess_excel)
+        if cached is not None:
+            return AnalysisOutcome(route, run_id, name, cached, True, time.time() - started)
+        s3_keys, errors, _ = self.upload(files_by_slot, run_id, content_addressed=content_addressed, digests=doc_hashes)
+        if not s3_keys:
+            raise RuntimeError("; ".join(errors.values()) or "No documents were uploaded.")
+        manifests = self.preprocess_excel(files_by_slot, s3_keys, run_id) if preprocess_excel else {}
+        payload = payload_for(s3_keys, run_id, manifests)
+        use_jobs = self.settings.api_job_mode if use_jobs is None else use_jobs
+        if use_jobs:
+            result = self.wait_for_job(route, self.submit_job(route, payload), run_id=run_id)
+        else:
+            result = self.call_backend(route, payload, user=user, is_connected=is_connected)
+        self.store_result(route, cache_key, result)
+        return AnalysisOutcome(route, run_id, name, result, False, time.time() - started)
+
+    def analyze_multi_docs(
+        self, files_by_slot, run_id=None, name=None, content_addressed=None, force_refresh=False, use_jobs=None, user=None, is_connected=None,
+        preprocess_excel=None,
+    ):
+        """Analyze one property's documents (slot -> file). Raises on upload or API failure."""
+        return self._analyze(
+            API_ENDPOINT_ROUTE_MULTI_DOCS, files_by_slot, self.multi_docs_payload, MULTI_DOCS_PROPERTY_TYPE,
+            run_id, name, content_addressed, force_refresh, use_jobs, user, is_connected, preprocess_excel,
+        )
+
+    def analyze_rent_roll(
+        self, file_obj, run_id=None, name=None, content_addressed=None, force_refresh=False, use_jobs=None, user=None, is_connected=None,
+        preprocess_excel=None,
+    ):
+        """Analyze one rent roll file. Raises on upload or API failure."""
+        if self.settings.api_base_url_commercial_rent_roll is None:
+            raise RuntimeError("API_BASE_URL_COMMERCIAL_RENT_ROLL is not configured.")
+        return self._analyze(
+            API_ENDPOINT_ROUTE_RENT_ROLL, {"rent_roll": file_obj},
+            lambda s3_keys, item_run_id, manifests: self.rent_roll_payload(s3_keys["rent_roll"], item_run_id, manifests.get("rent_roll")),
+            None, run_id, name, content_addressed, force_refresh, use_jobs, user, is_connected, preprocess_excel,
+        )
+
+    def run_many(self, analyze, items, max_parallel=None, on_abandoned=None, **options):
+        """Run ``analyze(payload, name=..., **options)`` for every ``(name, payload)`` with bounded parallelism.
+
+        Each item gets its own run_id. Yields AnalysisOutcome objects as items
+        finish; failures are reported through ``outcome.error`` rather than raised.
+        If the caller stops early (closes the generator, e.g. on a Streamlit
+        rerun), items not started yet are cancelled without waiting for the
+        running ones, whose outcomes go to ``on_abandoned`` (on a worker thread)
+        when they finish.
+        """
+        max_parallel = max_parallel or self.settings.batch_max_parallel
+        items = list(items)
+        if not items:
+            return
+        executor = ThreadPoolExecutor(max_workers=max_parallel)
+        futures, delivered = {}, set()
+        try:
+            for name, payload in items:
+                run_id = str(uuid.uuid4())
+                futures[executor.submit(analyze, payload, run_id=run_id, name=name, **options)] = (name, run_id)
+            for future in as_completed(futures):
+                delivered.add(future)
+                yield _outcome_of(future, *futures[future])
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            if on_abandoned is not None:
+                for future, (name, run_id) in futures.items():
+                    if future not in delivered:
+                        future.add_done_callback(functools.partial(_deliver_abandoned, on_abandoned, name=name, run_id=run_id))
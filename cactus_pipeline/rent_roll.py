@@ -0,0 +1,418 @@
+"""Streaming ingestion of rent roll results into one typed DataFrame per run.
+
+The backend answers ``{"status": ..., "rent_roll_json_data": [{...}, ...]}``.
+Line items are decoded straight off the response stream, each buffered run
+of whole items in one call to the C JSON decoder, and gathered into chunks
+of RENT_ROLL_CHUNK_ROWS rows. Chunks are concatenated once at the end, where
+each column's type (numeric, date or text) is decided over the whole column
+and applied to it in one vectorized conversion. Peak memory is one chunk of
+row dicts plus the columnar frame, instead of the raw body, a list of every
+row dict and a DataFrame rebuilt per rerun. Stored results (result cache,
+run store) are Parquet, so reopening one is a columnar read, not a JSON parse.
+"""
+import codecs
+import io
+import json
+import re
+
+import numpy as np
+import pandas as pd
+
+RENT_ROLL_ROWS_KEY = "rent_roll_json_data"
+RENT_ROLL_CHUNK_ROWS = 5000 # Row dicts held before they are converted to columns
+RESPONSE_CHUNK_BYTES = 256 * 1024
+STORED_RESULT_METADATA_KEY = b"cactus.rent_roll_result" # Parquet metadata entry holding the rest of a stored result
+PARQUET_MAGIC = b"PAR1"
+BATCH_CUT_ATTEMPTS = 8 # Candidate cuts tried per batch before falling back to one element at a time
+CATEGORY_MAX_UNIQUE_RATIO = 0.5 # Text columns with at most this share of distinct values become categoricals
+
+# Dates as the backend writes them: ISO (2024-01-31, optionally with a time) or US (01/31/2024)
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?)?$")
+_US_DATE = re.compile(r"^\d{1,2}/\d{1,2}/\d{4}$")
+_WHITESPACE = " \t\r\n"
+_SKIP_WHITESPACE = re.compile(r"[ \t\r\n]*")
+
+
+def _chunk_kind(values):
+    """'numeric', 'date', 'us_date' or 'text' for one chunk of a column; None if the chunk has no values."""
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    if inferred == "empty":
+        return None
+    if inferred in ("integer", "floating", "mixed-integer-float"):
+        return "numeric" # JSON numbers (and nulls) only
+    if inferred == "string":
+        present = values.dropna().unique() # Lease dates repeat a lot; each distinct string is checked once
+        if all(_ISO_DATE.match(value) for value in present):
+            return "date"
+        if all(_US_DATE.match(value) for value in present):
+            return "us_date"
+    return "text"
+
+
+def _as_text(value):
+    """Text form of a JSON value in a column that mixes types (numbers and strings, nested values, ...)."""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return json.dumps(value)
+
+
+def _convert(values, kind):
+    """``values`` as ``kind``, or None if some of them do not fit it (the column is then text)."""
+    if kind == "numeric":
+        converted = pd.to_numeric(values, errors="coerce")
+    elif kind == "date":
+        try:
+            converted = pd.to_datetime(values, errors="coerce", format="ISO8601")
+        except ValueError: # Mixed offsets (or offsets next to naive dates): compare them all in UTC
+            converted = pd.to_datetime(values, errors="coerce", format="ISO8601", utc=True)
+    else:
+        converted = pd.to_datetime(values, errors="coerce", format="%m/%d/%Y")
+    return converted if converted.notna().sum() == values.notna().sum() else None
+
+
+def _text_column(values, rows):
+    """A text column: categorical if it repeats enough, else pandas strings (booleans-only columns become nullable booleans)."""
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    if inferred == "empty":
+        return values
+    if inferred == "boolean":
+        return values.astype("boolean")
+    if inferred != "string":
+        values = values.map(_as_text)
+    if values.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * rows:
+        return values.astype("category")
+    return values.astype("str")
+
+
+class RentRollFrameBuilder:
+    """Collects line items (dicts) into a typed DataFrame, RENT_ROLL_CHUNK_ROWS rows at a time."""
+
+    def __init__(self, chunk_rows=RENT_ROLL_CHUNK_ROWS):
+        self.chunk_rows = chunk_rows
+        self._rows = []
+        self._chunks = []
+        self._kinds = {} # column -> kinds seen in chunks that had values
+
+    def add(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.chunk_rows:
+            self._flush()
+
+    def _flush(self):
+        chunk = pd.DataFrame(self._rows, dtype=object)
+        self._rows = []
+        for column in chunk.columns:
+            kinds = self._kinds.setdefault(column, set())
+            if "text" not in kinds: # Once any chunk is text the whole column is
+                kind = _chunk_kind(chunk[column])
+                if kind is not None:
+                    kinds.add(kind)
+        self._chunks.append(chunk)
+
+    def finish(self):
+        """The whole rent roll as one frame (empty if no rows were added).
+
+        Each column's type is decided over all of its values: numeric or date
+        if every chunk that has values agrees and every value converts,
+        otherwise text for the whole column.
+        """
+        if self._rows:
+            self._flush()
+        if not self._chunks:
+            return pd.DataFrame()
+        frame = pd.concat(self._chunks, ignore_index=True) if len(self._chunks) > 1 else self._chunks[0]
+        self._chunks = []
+        for column, kinds in self._kinds.items():
+            converted = _convert(frame[column], next(iter(kinds))) if len(kinds) == 1 and kinds != {"text"} else None
+            if converted is not None:
+                frame[column] = converted
+                continue
+            frame[column] = _text_column(frame[column], len(frame))
+        return frame
+
+
+def rent_roll_frame(rows):
+    """Typed frame from already-decoded line items."""
+    builder = RentRollFrameBuilder()
+    for row in rows:
+        builder.add(row)
+    return builder.finish()
+
+
+class _JsonStream:
+    """Pulls JSON tokens and values off an iterable of byte chunks, buffering only what is undecoded."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def _fill(self, min_new_chars=1):
+        """Read until at least ``min_new_chars`` more characters are buffered. Returns False at end of input."""
+        if self._position:
+            self._buffer = self._buffer[self._position:]
+            self._position = 0
+        target = len(self._buffer) + min_new_chars
+        while len(self._buffer) < target:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._buffer += self._utf8.decode(b"", final=True)
+                self._eof = True
+                return False
+            self._buffer += self._utf8.decode(bytes(chunk))
+        return True
+
+    def peek(self):
+        """Next non-whitespace character without consuming it ('' at end of input)."""
+        while True:
+            while self._position < len(self._buffer) and self._buffer[self._position] in _WHITESPACE:
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._fill():
+                return ""
+
+    def next_char(self):
+        char = self.peek()
+        self._position += 1
+        return char
+
+    def expect(self, char):
+        found = self.next_char()
+        if found != char:
+            raise json.JSONDecodeError(f"Expecting {char!r}, found {found!r}", self._buffer, self._position - 1)
+
+    def value(self):
+        """Decode the next complete value, reading more input until it (and anything after a bare number) is buffered."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._fill(max(len(self._buffer) - self._position, RESPONSE_CHUNK_BYTES)) # Double the window
+                continue
+            if end < len(self._buffer) or self._eof:
+                self._position = end
+                return value
+            self._fill() # A number may continue in the next chunk
+
+    def _batch(self, start):
+        """Decode the run of whole objects buffered from ``start`` in one C call; ``(items, next_position)`` or None.
+
+        A cut after some ``},`` is accepted only if ``[`` + text + ``]`` is
+        valid JSON, which holds exactly at a boundary between elements (a cut
+        inside a string or a nested value leaves it unbalanced), so candidates
+        are tried from the last one back.
+        """
+        buffer = self._buffer
+        cut = buffer.rfind("},", start)
+        for _ in range(BATCH_CUT_ATTEMPTS):
+            if cut <= start:
+                return None
+            try:
+                return json.loads(f"[{buffer[start:cut + 1]}]"), cut + 2
+            except json.JSONDecodeError:
+                cut = buffer.rfind("},", start, cut)
+        return None
+
+    def array_batches(self):
+        """Yield the elements of the array starting here as lists: every whole object buffered at once, then one at a time."""
+        self.expect("[")
+        if self.peek() == "]":
+            self._position += 1
+            return
+        scan, skip = self._decoder.scan_once, _SKIP_WHITESPACE.match
+        while True:
+            buffer = self._buffer
+            start = skip(buffer, self._position).end()
+            batch = self._batch(start)
+            if batch is not None:
+                items, self._position = batch
+                yield items
+                continue
+            try:
+                value, end = scan(buffer, start)
+                separator_at = skip(buffer, end).end()
+                complete = separator_at < len(buffer)
+            except (StopIteration, json.JSONDecodeError):
+                complete = False
+            if not complete: # Element or its separator not fully buffered yet
+                if self._eof:
+                    self._position = start
+                    self.value() # Raises the decode error
+                    raise json.JSONDecodeError("Expecting ',' or ']'", "", 0)
+                self._position = start
+                self._fill(max(len(buffer) - start, RESPONSE_CHUNK_BYTES))
+                continue
+            yield [value]
+            separator = buffer[separator_at]
+            self._position = separator_at + 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise json.JSONDecodeError(f"Expecting ',' or ']', found {separator!r}", "", 0)
+
+
+def _read_object(stream, rows_path):
+    """Decode an object whose ``rows_path`` member (a list of rows, possibly nested) streams into a frame."""
+    stream.expect("{")
+    result = {}
+    if stream.peek() == "}":
+        stream.next_char()
+        return result
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if rows_path and key == rows_path[0] and len(rows_path) > 1 and stream.peek() == "{":
+            result[key] = _read_object(stream, rows_path[1:])
+        elif rows_path and key == rows_path[0] and len(rows_path) == 1 and stream.peek() == "[":
+            result[key] = _read_rows(stream)
+        else:
+            result[key] = stream.value()
+        separator = stream.next_char()
+        if separator == "}":
+            return result
+        if separator != ",":
+            raise json.JSONDecodeError(f"Expecting ',' or '}}', found {separator!r}", "", 0)
+
+
+def _read_rows(stream):
+    builder = RentRollFrameBuilder()
+    for rows in stream.array_batches():
+        for row in rows:
+            builder.add(row)
+    return builder.finish()
+
+
+def parse_rent_roll_json(chunks, rows_path=(RENT_ROLL_ROWS_KEY,)):
+    """Decode a JSON document from byte chunks, building the list at ``rows_path`` into a typed frame.
+
+    Anything that is not an object with that list (an error body, an
+    unexpected shape) is decoded as plain JSON.
+    """
+    stream = _JsonStream(chunks)
+    result = _read_object(stream, tuple(rows_path)) if stream.peek() == "{" else stream.value()
+    if stream.peek():
+        raise json.JSONDecodeError("Extra data after the JSON document", "", 0)
+    return result
+
+
+def read_rent_roll_response(response, rows_path=(RENT_ROLL_ROWS_KEY,)):
+    """Parse a streamed (``stream=True``) requests response. Returns ``(result, bytes_received)``."""
+    received = 0
+
+    def _chunks():
+        nonlocal received
+        for chunk in response.iter_content(RESPONSE_CHUNK_BYTES):
+            received += len(chunk)
+            yield chunk
+
+    with response:
+        return parse_rent_roll_json(_chunks(), rows_path), received
+
+
+def iter_bytes(data, chunk_size=RESPONSE_CHUNK_BYTES):
+    """Slices of an in-memory JSON document, so it can go through the streaming parser without a decoded copy."""
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+
+# --- Storage (result cache / run store) ---
+def dump_rent_roll_result(result):
+    """A rent roll result as bytes for the result cache and run store.
+
+    A result holding a rows frame is stored as Parquet, with the rest of the
+    result as JSON in the file's metadata, so loading it back is a columnar
+    read instead of a JSON parse; anything else is stored as JSON.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows = result.get(RENT_ROLL_ROWS_KEY) if isinstance(result, dict) else None
+    if not isinstance(rows, pd.DataFrame):
+        return json.dumps(result).encode("utf-8")
+    table = pa.Table.from_pandas(rows, preserve_index=False)
+    envelope = json.dumps({key: value for key, value in result.items() if key != RENT_ROLL_ROWS_KEY})
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), STORED_RESULT_METADATA_KEY: envelope.encode("utf-8")})
+    sink = io.BytesIO()
+    pq.write_table(table, sink, compression="zstd")
+    return sink.getvalue()
+
+
+def load_rent_roll_result(data):
+    """Inverse of dump_rent_roll_result; results stored as JSON text (e.g. by older versions) are streamed into a frame."""
+    import pyarrow.parquet as pq
+
+    if bytes(data[:4]) != PARQUET_MAGIC:
+        return parse_rent_roll_json(iter_bytes(data))
+    table = pq.read_table(io.BytesIO(data))
+    result = json.loads(table.schema.metadata[STORED_RESULT_METADATA_KEY])
+    result[RENT_ROLL_ROWS_KEY] = table.to_pandas()
+    return result
+
+
+# --- Querying (search / date filter / sort) for paged views ---
+TENANT_COLUMN_NAMES = ("tenant_name", "tenant", "lessee", "occupant")
+SUITE_COLUMN_NAMES = ("suite", "unit", "space", "suite_number", "unit_number")
+
+
+def find_column(frame, names):
+    """First column of ``frame`` whose name matches one of ``names`` (case-insensitive), or None."""
+    by_lower_name = {str(column).lower(): column for column in frame.columns}
+    return next((by_lower_name[name] for name in names if name in by_lower_name), None)
+
+
+def date_columns(frame):
+    return [column for column in frame.columns if pd.api.types.is_datetime64_any_dtype(frame[column])]
+
+
+def _contains(values, text):
+    """Case-insensitive substring match; categoricals are matched once per category, not per row."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        matching = categories[categories.astype(str).str.contains(text, case=False, regex=False)]
+        return values.isin(matching).to_numpy()
+    return values.astype("string").str.contains(text, case=False, regex=False).fillna(False).to_numpy(dtype=bool)
+
+
+def _day_start(day, dates):
+    """Midnight of ``day`` in the timezone of ``dates`` (ISO dates with ``Z`` or an offset parse as UTC), naive if they are."""
+    return pd.Timestamp(day).tz_localize(dates.dt.tz)
+
+
+def query_rent_roll(frame, search="", date_column=None, date_from=None, date_to=None, sort_by=None, descending=False):
+    """Row positions of ``frame`` matching the filters, in display order.
+
+    ``search`` matches tenant and suite columns; ``date_from``/``date_to``
+    (inclusive dates) bound ``date_column``. Unmatched or empty filters are
+    ignored; rows with no value in ``sort_by`` sort last.
+    """
+    mask = np.ones(len(frame), dtype=bool)
+    search = (search or "").strip()
+    if search:
+        search_columns = [column for column in (find_column(frame, TENANT_COLUMN_NAMES), find_column(frame, SUITE_COLUMN_NAMES)) if column is not None]
+        if search_columns:
+            matches = np.zeros(len(frame), dtype=bool)
+            for column in search_columns:
+                matches |= _contains(frame[column], search)
+            mask &= matches
+    if date_column in frame.columns and (date_from or date_to):
+        dates = frame[date_column]
+        if date_from:
+            mask &= (dates >= _day_start(date_from, dates)).to_numpy()
+        if date_to:
+            mask &= (dates < _day_start(date_to, dates) + pd.Timedelta(days=1)).to_numpy()
+    positions = np.flatnonzero(mask)
+    if sort_by in frame.columns:
+        values = frame[sort_by].iloc[positions]
+        values.index = positions
+        positions = values.sort_values(ascending=not descending, kind="stable", na_position="last").index.to_numpy()
+    return positions
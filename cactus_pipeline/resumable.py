@@ -0,0 +1,385 @@
+"""Resumable multipart uploads for large documents.
+
+The file is first spooled to disk in fixed-size chunks (files already on
+disk are read in place), then sent as an S3 multipart upload whose completed
+parts are checkpointed in a small SQLite table, together with the SHA-256 of
+the content. A retry of the same content resumes after the last good part
+instead of re-sending everything, and at most ``RESUMABLE_MAX_CONCURRENCY``
+parts are read into memory at a time. The retry need not use the same key:
+each CLI or batch invocation uploads under a fresh run id, so an unfinished
+upload of the same content elsewhere in the bucket is finished under its
+old key and then copied server-side to the new one. Multipart uploads
+abandoned for longer than the cutoff are aborted by
+``ResumableUploads.sweep``, together with their checkpoints and spool files.
+The sweep also deletes objects that speculative uploads recorded as staged
+and no analysis ever claimed (see uploads.py).
+
+Spooling bounds memory only for streams that are not already resident: a
+Streamlit ``UploadedFile`` holds its whole content in RAM, so the spool copy
+saves nothing there. It still gives the parts a file to be read from and lets
+a retry within the same process resume.
+
+Uploads of one key are serialized within the process: with content-addressed
+keys two sessions can send the same file at once, and they share its spool
+file and checkpoint. A spool file is only removed once no upload of its key is
+in flight, and an upload that waited for an identical one to finish reuses it.
+"""
+import contextlib
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+from botocore.exceptions import BotoCoreError, ClientError
+from s3transfer.utils import ReadFileChunk, signal_not_transferring, signal_transferring
+
+RESUMABLE_MIN_BYTES = 8 * 1024 * 1024 # Smaller files go in a single PUT (same threshold as S3_TRANSFER_CONFIG)
+RESUMABLE_PART_BYTES = 16 * 1024 * 1024
+RESUMABLE_MAX_PARTS = 10_000 # S3 limit; larger files get larger parts
+RESUMABLE_MAX_CONCURRENCY = 4 # Parts in flight (and in memory) per file
+RESUMABLE_PART_ATTEMPTS = 3 # Tries per part within one upload call; after that the upload is left to resume
+SPOOL_CHUNK_BYTES = 8 * 1024 * 1024
+TRANSFER_ERRORS = (ClientError, BotoCoreError, OSError) # Worth retrying / resuming; anything else abandons the upload
+
+
+def _part_bytes(size):
+    return max(RESUMABLE_PART_BYTES, math.ceil(size / RESUMABLE_MAX_PARTS))
+
+
+def _content_digest(path):
+    """SHA-256 hex digest of a spooled file (the same digest uploads.hash_file computes)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as spooled:
+        for chunk in iter(lambda: spooled.read(SPOOL_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _count_sent_bytes_only(s3_client):
+    """Report part progress only while a request body is on the wire, not while botocore checksums it (as s3transfer does)."""
+    events = s3_client.meta.events
+    events.register_first("request-created.s3", signal_not_transferring, unique_id="s3upload-not-transferring")
+    events.register_last("request-created.s3", signal_transferring, unique_id="s3upload-transferring")
+
+
+def _is_missing_upload(error):
+    return error.response.get("Error", {}).get("Code") in ("NoSuchUpload", "404")
+
+
+class _KeyClaim:
+    """In-process uploads of one key: held while uploading, counted while waiting for it."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+        self.completed = None # Digest of the content the last holder finished uploading
+
+
+class ResumableUploads:
+    """Checkpointed multipart uploads, spooled through ``spool_dir``; safe to share between threads."""
+
+    def __init__(self, checkpoint_path, spool_dir):
+        self.spool_dir = spool_dir
+        self._lock = threading.Lock()
+        self._claims = {} # (bucket, s3_key) -> _KeyClaim of uploads in flight or waiting
+        os.makedirs(spool_dir, exist_ok=True)
+        if os.path.dirname(checkpoint_path):
+            os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+        self._conn = sqlite3.connect(checkpoint_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads (bucket TEXT, s3_key TEXT, run_id TEXT, upload_id TEXT, "
+                "size INTEGER, part_bytes INTEGER, identity TEXT, started_at REAL, PRIMARY KEY (bucket, s3_key))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS parts (upload_id TEXT, part_number INTEGER, etag TEXT, "
+                "PRIMARY KEY (upload_id, part_number))"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS staged (bucket TEXT, s3_key TEXT, staged_at REAL, PRIMARY KEY (bucket, s3_key))")
+
+    # --- Checkpoints ---
+    def checkpoint(self, bucket, s3_key):
+        """The recorded upload of ``s3_key`` with its finished parts (number -> ETag), or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id, upload_id, size, part_bytes, identity, started_at FROM uploads WHERE bucket = ? AND s3_key = ?",
+                (bucket, s3_key),
+            ).fetchone()
+            if row is None:
+                return None
+            parts = dict(self._conn.execute("SELECT part_number, etag FROM parts WHERE upload_id = ?", (row[1],)).fetchall())
+        return dict(zip(("run_id", "upload_id", "size", "part_bytes", "identity", "started_at"), row), parts=parts)
+
+    def _record_upload(self, bucket, s3_key, run_id, upload_id, size, part_bytes, identity):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO uploads (bucket, s3_key, run_id, upload_id, size, part_bytes, identity, started_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (bucket, s3_key, run_id, upload_id, size, part_bytes, identity, time.time()),
+            )
+
+    def _record_part(self, upload_id, part_number, etag):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO parts (upload_id, part_number, etag) VALUES (?, ?, ?)", (upload_id, part_number, etag))
+
+    def _unfinished_upload_of(self, bucket, identity, size, part_bytes, s3_key):
+        """Key of a checkpointed upload of the same content to another key of ``bucket``, most recent first, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT s3_key FROM uploads WHERE bucket = ? AND identity = ? AND size = ? AND part_bytes = ? AND s3_key != ? "
+                "ORDER BY started_at DESC LIMIT 1",
+                (bucket, identity, size, part_bytes, s3_key),
+            ).fetchone()
+        return row and row[0]
+
+    def _forget(self, bucket, s3_key, upload_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM uploads WHERE bucket = ? AND s3_key = ?", (bucket, s3_key))
+            self._conn.execute("DELETE FROM parts WHERE upload_id = ?", (upload_id,))
+
+    # --- Staged objects ---
+    def record_staged(self, bucket, s3_key):
+        """Note an object written before any analysis asked for it; ``sweep`` deletes it unless forget_staged is called first."""
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO staged (bucket, s3_key, staged_at) VALUES (?, ?, ?)", (bucket, s3_key, time.time()))
+
+    def forget_staged(self, bucket, s3_key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM staged WHERE bucket = ? AND s3_key = ?", (bucket, s3_key))
+
+    # --- Spooling ---
+    def spool_path(self, bucket, s3_key):
+        return os.path.join(self.spool_dir, hashlib.sha256(f"{bucket}/{s3_key}".encode("utf-8")).hexdigest() + ".spool")
+
+    def _spool(self, file_obj, bucket, s3_key):
+        """Path of the file's bytes on disk: the file itself if it is a regular file, else a chunk-by-chunk copy."""
+        name = getattr(file_obj, "name", None)
+        if hasattr(file_obj, "fileno") and isinstance(name, str) and os.path.isfile(name):
+            return name, False
+        path = self.spool_path(bucket, s3_key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        file_obj.seek(0)
+        with open(temp_path, "wb") as spooled:
+            for chunk in iter(lambda: file_obj.read(SPOOL_CHUNK_BYTES), b""):
+                spooled.write(chunk)
+        file_obj.seek(0)
+        os.replace(temp_path, path)
+        return path, True
+
+    def _claim(self, bucket, s3_key):
+        with self._lock:
+            claim = self._claims.setdefault((bucket, s3_key), _KeyClaim())
+            claim.users += 1
+        return claim
+
+    def _release(self, bucket, s3_key, claim):
+        with self._lock:
+            claim.users -= 1
+            if not claim.users:
+                del self._claims[(bucket, s3_key)]
+
+    def _remove_spool(self, bucket, s3_key, holders=0):
+        """Remove the key's spool file unless uploads other than the ``holders`` calling this still use it."""
+        with self._lock:
+            claim = self._claims.get((bucket, s3_key))
+            if claim is not None and claim.users > holders:
+                return
+            spool = self.spool_path(bucket, s3_key)
+            if os.path.exists(spool):
+                os.remove(spool)
+
+    # --- Uploads ---
+    def upload(self, file_obj, bucket, s3_key, s3_client, run_id=None, progress_callback=None, digest=None):
+        """Upload ``file_obj`` to ``s3_key`` as a checkpointed multipart upload and return the key.
+
+        Resumes a checkpointed upload of the same content (by SHA-256, which
+        ``digest`` supplies when already known) to the same key, or else to
+        another key of the bucket, which is completed there and copied over.
+        On failure the checkpoint and spool file are kept for the next
+        attempt; a cancellation raised from ``progress_callback`` aborts the
+        upload and forgets it. Concurrent uploads to the same key wait for
+        each other.
+        """
+        claim = self._claim(bucket, s3_key)
+        try:
+            with claim.lock:
+                return self._upload(claim, file_obj, bucket, s3_key, s3_client, run_id, progress_callback, digest)
+        finally:
+            self._release(bucket, s3_key, claim)
+
+    def _upload(self, claim, file_obj, bucket, s3_key, s3_client, run_id, progress_callback, digest):
+        path, spooled = self._spool(file_obj, bucket, s3_key)
+        size = os.path.getsize(path)
+        part_bytes = _part_bytes(size)
+        identity = digest or _content_digest(path)
+        if claim.completed == identity: # An upload we waited for just sent the same file
+            if progress_callback:
+                progress_callback(size)
+            if spooled:
+                self._remove_spool(bucket, s3_key, holders=1)
+            return s3_key
+        claim.completed = None
+        checkpoint = self.checkpoint(bucket, s3_key)
+        if checkpoint and (checkpoint["size"], checkpoint["identity"], checkpoint["part_bytes"]) != (size, identity, part_bytes):
+            self._abort_upload(bucket, s3_key, checkpoint["upload_id"], s3_client) # A different file was being uploaded to this key
+            checkpoint = None
+        with self._previous_upload(bucket, s3_key, checkpoint, identity, size, part_bytes) as previous_key:
+            upload_key = previous_key or s3_key
+            if previous_key is not None:
+                checkpoint = self.checkpoint(bucket, previous_key)
+            done = None
+            if checkpoint is not None:
+                upload_id, done = checkpoint["upload_id"], self._confirmed_parts(s3_client, bucket, upload_key, checkpoint)
+            if done is None:
+                upload_key = s3_key
+                upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=s3_key)["UploadId"]
+                self._record_upload(bucket, s3_key, run_id, upload_id, size, part_bytes, identity)
+                done = {}
+
+            part_count = max(1, math.ceil(size / part_bytes))
+            callbacks = [progress_callback] if progress_callback else None
+            if callbacks:
+                _count_sent_bytes_only(s3_client)
+            if progress_callback and done:
+                progress_callback(sum(min(part_bytes, size - (number - 1) * part_bytes) for number in done))
+
+            def _send_part(number):
+                start = (number - 1) * part_bytes
+                for attempt in range(1, RESUMABLE_PART_ATTEMPTS + 1):
+                    with ReadFileChunk.from_filename(path, start, part_bytes, callbacks=callbacks, enable_callbacks=False) as body:
+                        try:
+                            response = s3_client.upload_part(Bucket=bucket, Key=upload_key, UploadId=upload_id, PartNumber=number, Body=body)
+                        except TRANSFER_ERRORS:
+                            if progress_callback and body.tell():
+                                progress_callback(-body.tell()) # Un-count the failed attempt
+                            if attempt == RESUMABLE_PART_ATTEMPTS:
+                                raise
+                            continue
+                    self._record_part(upload_id, number, response["ETag"])
+                    return
+
+            try:
+                with ThreadPoolExecutor(max_workers=RESUMABLE_MAX_CONCURRENCY) as executor:
+                    futures = [executor.submit(_send_part, number) for number in range(1, part_count + 1) if number not in done]
+                    finished, _ = wait(futures, return_when=FIRST_EXCEPTION)
+                    failed = next((future for future in finished if future.exception() is not None), None)
+                    if failed is not None:
+                        for future in futures:
+                            future.cancel()
+                        failed.result()
+            except TRANSFER_ERRORS as e:
+                if isinstance(e, ClientError) and _is_missing_upload(e): # Aborted underneath us (e.g. by the sweeper): start over next time
+                    self._forget(bucket, upload_key, upload_id)
+                raise
+            except BaseException: # Not a transfer failure (e.g. the upload was cancelled): don't keep it around
+                self._abort_upload(bucket, upload_key, upload_id, s3_client)
+                self._remove_spool(bucket, s3_key, holders=1)
+                raise
+
+            parts = self._parts_of(upload_id)
+            s3_client.complete_multipart_upload(
+                Bucket=bucket, Key=upload_key, UploadId=upload_id,
+                MultipartUpload={"Parts": [{"PartNumber": number, "ETag": parts[number]} for number in sorted(parts)]},
+            )
+            self._forget(bucket, upload_key, upload_id)
+            if upload_key != s3_key: # Finished a previous invocation's upload: move it where this one asked for it
+                s3_client.copy({"Bucket": bucket, "Key": upload_key}, bucket, s3_key)
+                s3_client.delete_object(Bucket=bucket, Key=upload_key)
+                self._remove_spool(bucket, upload_key, holders=1)
+            claim.completed = identity
+            if spooled:
+                self._remove_spool(bucket, s3_key, holders=1)
+            return s3_key
+
+    @contextlib.contextmanager
+    def _previous_upload(self, bucket, s3_key, checkpoint, identity, size, part_bytes):
+        """Hold the key of an unfinished upload of the same content to another key, if ``s3_key`` has none of its own.
+
+        Yields None when there is no such upload or an upload to that key is
+        running right now.
+        """
+        other_key = None if checkpoint is not None else self._unfinished_upload_of(bucket, identity, size, part_bytes, s3_key)
+        if other_key is None:
+            yield None
+            return
+        claim = self._claim(bucket, other_key)
+        try:
+            if not claim.lock.acquire(blocking=False):
+                yield None
+                return
+            try:
+                yield other_key
+            finally:
+                claim.lock.release()
+        finally:
+            self._release(bucket, other_key, claim)
+
+    def _parts_of(self, upload_id):
+        with self._lock:
+            return dict(self._conn.execute("SELECT part_number, etag FROM parts WHERE upload_id = ?", (upload_id,)).fetchall())
+
+    def _confirmed_parts(self, s3_client, bucket, s3_key, checkpoint):
+        """Checkpointed parts S3 still holds with the same ETag, or None if the multipart upload is gone."""
+        try:
+            listed = s3_client.list_parts(Bucket=bucket, Key=s3_key, UploadId=checkpoint["upload_id"], MaxParts=RESUMABLE_MAX_PARTS)
+        except ClientError as e:
+            if not _is_missing_upload(e):
+                raise
+            self._forget(bucket, s3_key, checkpoint["upload_id"])
+            return None
+        in_s3 = {part["PartNumber"]: part["ETag"] for part in listed.get("Parts", [])}
+        return {number: etag for number, etag in checkpoint["parts"].items() if in_s3.get(number) == etag}
+
+    def abort(self, bucket, s3_key, s3_client):
+        """Abort the checkpointed upload of ``s3_key`` (if any) and remove its checkpoint and spool file."""
+        self._abort(bucket, s3_key, s3_client)
+
+    def _abort(self, bucket, s3_key, s3_client, holders=0):
+        checkpoint = self.checkpoint(bucket, s3_key)
+        if checkpoint is not None:
+            self._abort_upload(bucket, s3_key, checkpoint["upload_id"], s3_client)
+        self._remove_spool(bucket, s3_key, holders)
+
+    def _abort_upload(self, bucket, s3_key, upload_id, s3_client):
+        try:
+            s3_client.abort_multipart_upload(Bucket=bucket, Key=s3_key, UploadId=upload_id)
+        except ClientError as e:
+            if not _is_missing_upload(e):
+                raise
+        self._forget(bucket, s3_key, upload_id)
+
+    def sweep(self, s3_client, bucket, prefix, older_than_seconds):
+        """Abort multipart uploads under ``prefix`` started more than ``older_than_seconds`` ago.
+
+        Covers uploads from any process or client, checkpointed or not, and
+        removes stale spool files and objects staged (record_staged) before the
+        cutoff but never claimed. Returns the number of uploads aborted.
+        """
+        cutoff = time.time() - older_than_seconds
+        aborted = 0
+        for page in s3_client.get_paginator("list_multipart_uploads").paginate(Bucket=bucket, Prefix=prefix):
+            for upload in page.get("Uploads", []):
+                if upload["Initiated"].timestamp() >= cutoff:
+                    continue
+                self._abort_upload(bucket, upload["Key"], upload["UploadId"], s3_client)
+                aborted += 1
+        with self._lock, self._conn:
+            stale = self._conn.execute("SELECT s3_key, upload_id FROM uploads WHERE bucket = ? AND started_at < ?", (bucket, cutoff)).fetchall()
+        for s3_key, upload_id in stale: # Checkpoints whose upload is no longer listed
+            self._forget(bucket, s3_key, upload_id)
+        with self._lock:
+            staged = self._conn.execute("SELECT s3_key FROM staged WHERE bucket = ? AND staged_at < ?", (bucket, cutoff)).fetchall()
+        for (s3_key,) in staged: # Uploaded for a session that never ran its analysis
+            if s3_key.startswith(prefix):
+                s3_client.delete_object(Bucket=bucket, Key=s3_key)
+                self.forget_staged(bucket, s3_key)
+        with self._lock:
+            in_use = {os.path.basename(self.spool_path(*key)) for key in self._claims}
+        for name in os.listdir(self.spool_dir):
+            spool = os.path.join(self.spool_dir, name)
+            if name.split(".spool")[0] + ".spool" not in in_use and os.path.getmtime(spool) < cutoff:
+                os.remove(spool)
+        return aborted
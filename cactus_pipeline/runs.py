@@ -0,0 +1,143 @@
+"""Finished analysis runs, kept on disk so sessions only need to hold a run_id.
+
+Each run is one row in SQLite: the result as JSON, or what the caller's
+``dumps`` returns (e.g. Parquet for rent rolls), packed like the result
+cache's payloads (zlib-compressed unless Parquet), plus who ran it, on which
+documents (the result cache key) and when. Recently loaded runs stay decoded
+in a process-wide LRU tier with a byte budget, so reopening a result on every
+rerun does not decode it again; decoded results are shared between sessions
+and must not be mutated.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .cache import pack_payload, unpack_payload
+
+
+def _resident_size(result, raw):
+    """Approximate memory a decoded result takes: frames in it count their own size, the rest its stored length."""
+    frames = [value for value in result.values() if hasattr(value, "memory_usage")] if isinstance(result, dict) else []
+    return len(raw) + sum(int(frame.memory_usage(deep=True).sum()) for frame in frames)
+
+
+class RunStore:
+    """Run results by run_id on disk (total-size LRU eviction) with an in-memory LRU of decoded results.
+
+    ``dumps`` works as in ResultCache; ``get`` picks the decoder by the run's
+    route from ``decoders`` (json.loads for routes not listed).
+    """
+
+    def __init__(self, path, max_bytes, memory_max_bytes):
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict() # run_id -> (result, size)
+        self._memory_bytes = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "run_id TEXT PRIMARY KEY, route TEXT, user TEXT, name TEXT, cache_key TEXT, "
+                "created_at REAL, last_access REAL, size INTEGER, raw_size INTEGER, payload BLOB)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS runs_by_user ON runs (user, created_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS runs_by_documents ON runs (cache_key)")
+
+    # --- Memory tier ---
+    def _remember(self, run_id, result, size):
+        """Keep a decoded result in memory; ``size`` is its approximate resident size (see _resident_size)."""
+        self._forget(run_id)
+        if size > self.memory_max_bytes:
+            return
+        self._memory[run_id] = (result, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_max_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    def _forget(self, run_id):
+        entry = self._memory.pop(run_id, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+
+    # --- Runs ---
+    def put(self, run_id, route, result, user=None, name=None, cache_key=None, dumps=json.dumps):
+        """Store (or replace) a run's result."""
+        raw = dumps(result)
+        raw = raw.encode("utf-8") if isinstance(raw, str) else raw
+        payload = pack_payload(raw)
+        size = _resident_size(result, raw)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO runs (run_id, route, user, name, cache_key, created_at, last_access, size, raw_size, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, route, user, name, cache_key, now, now, len(payload), len(raw), payload),
+            )
+            self._remember(run_id, result, size)
+            self._evict()
+
+    def get(self, run_id, decoders=None):
+        """The run's result (from memory if recently used), or None if it was never stored or has been evicted."""
+        now = time.time()
+        with self._lock, self._conn:
+            entry = self._memory.get(run_id)
+            if entry is not None:
+                self._memory.move_to_end(run_id)
+                self._conn.execute("UPDATE runs SET last_access = ? WHERE run_id = ?", (now, run_id))
+                return entry[0]
+            row = self._conn.execute("SELECT route, payload FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE runs SET last_access = ? WHERE run_id = ?", (now, run_id))
+        route, payload = row
+        raw = unpack_payload(payload)
+        result = (decoders or {}).get(route, json.loads)(raw)
+        size = _resident_size(result, raw)
+        with self._lock:
+            self._remember(run_id, result, size)
+        return result
+
+    def info(self, run_id):
+        """Metadata of one run (no payload), or None."""
+        runs = self._select("WHERE run_id = ?", (run_id,), 1)
+        return runs[0] if runs else None
+
+    def recent(self, user=None, route=None, cache_key=None, limit=20):
+        """Newest runs of ``user`` first (None: runs stored without one, e.g. by the CLI), optionally of one route or set of documents."""
+        clauses, params = ["user IS ?"], [user]
+        if route is not None:
+            clauses.append("route = ?"); params.append(route)
+        if cache_key is not None:
+            clauses.append("cache_key = ?"); params.append(cache_key)
+        return self._select("WHERE " + " AND ".join(clauses) + " ORDER BY created_at DESC", params, limit)
+
+    def _select(self, where, params, limit):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT run_id, route, user, name, cache_key, created_at, size FROM runs {where} LIMIT ?", (*params, limit)
+            ).fetchall()
+        columns = ("run_id", "route", "user", "name", "cache_key", "created_at", "size")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM runs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for run_id, size in self._conn.execute("SELECT run_id, size FROM runs ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+            self._forget(run_id)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM runs").fetchone()
+            return {"entries": entries, "bytes": total, "memory_entries": len(self._memory), "memory_bytes": self._memory_bytes}
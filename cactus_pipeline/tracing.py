@@ -0,0 +1,191 @@
+"""Per-stage timing for analysis runs, correlated by run_id.
+
+Each stage of a run (hashing, cache lookup, upload, backend call, JSON
+decode, rendering) is timed with ``Tracer.stage``. Every finished stage is
+
+* logged as one JSON line on the ``cactus_pipeline.trace`` logger (also
+  appended to ``TRACE_LOG_PATH`` when that setting is given),
+* added to Prometheus-style counters and histograms, written atomically to
+  ``METRICS_TEXTFILE_PATH`` when given (node_exporter textfile collector
+  format), and
+* kept in memory under its run_id, so the app can show a timing breakdown.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+TRACE_LOGGER_NAME = "cactus_pipeline.trace"
+TRACE_MAX_RUNS = 500 # Runs whose stage timings are kept in memory (oldest dropped first)
+# Histogram buckets (seconds), covering a hash of a small file up to a 5 minute backend call
+STAGE_SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRIC_PREFIX = "cactus"
+
+# Stage names used by the pipeline and the app (display order for the timing panel)
+STAGE_LABELS = {
+    "hash": "Fingerprint files",
+    "cache_lookup": "Result cache lookup",
+    "upload": "Upload to S3",
+    "preprocess": "Pre-process Excel sheets",
+    "queue": "Wait for a backend slot",
+    "backend": "Backend analysis call",
+    "decode": "Decode response JSON",
+    "analytics": "Compute rent roll analytics",
+    "job_submit": "Submit backend job",
+    "job_wait": "Wait for backend job",
+    "render": "Render results",
+}
+
+logger = logging.getLogger(TRACE_LOGGER_NAME)
+
+
+class RunTrace:
+    """Stage timings of one run; the latest timing per stage wins (e.g. one render per rerun)."""
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.stages = OrderedDict() # stage -> {"seconds": float, **attributes}
+
+    def add(self, stage, seconds, attributes):
+        self.stages.pop(stage, None)
+        self.stages[stage] = {"seconds": seconds, **attributes}
+
+    def rows(self):
+        """Stages as display rows, in pipeline order."""
+        order = list(STAGE_LABELS)
+        stages = sorted(self.stages.items(), key=lambda item: order.index(item[0]) if item[0] in order else len(order))
+        return [
+            {
+                "Stage": STAGE_LABELS.get(stage, stage),
+                "Seconds": round(record["seconds"], 3),
+                "Details": ", ".join(f"{key}={value}" for key, value in record.items() if key not in ("seconds", "route")),
+            }
+            for stage, record in stages
+        ]
+
+
+class _Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * len(STAGE_SECONDS_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(STAGE_SECONDS_BUCKETS):
+            if value <= bound:
+                self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Tracer:
+    """Collects stage timings for every run in the process; safe to share between threads."""
+
+    def __init__(self, log_path=None, metrics_path=None, max_runs=TRACE_MAX_RUNS):
+        self.metrics_path = metrics_path
+        self.max_runs = max_runs
+        self._lock = threading.Lock()
+        self._runs = OrderedDict() # run_id -> RunTrace
+        self._durations = {} # (stage, route) -> _Histogram
+        self._errors = {} # (stage, route) -> count
+        self._bytes = {} # (stage, route) -> bytes
+        if log_path:
+            _add_log_file(log_path)
+
+    @contextmanager
+    def stage(self, run_id, stage, **attributes):
+        """Time the ``with`` block as ``stage`` of ``run_id``.
+
+        Yields the attribute dict, so the block can add measurements it only
+        knows at the end (bytes, status codes). Failures are recorded with an
+        ``error`` attribute and re-raised. A ``run_id`` of None times nothing.
+        """
+        if run_id is None:
+            yield attributes
+            return
+        started = time.perf_counter()
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes["error"] = type(e).__name__
+            raise
+        finally:
+            self.record(run_id, stage, time.perf_counter() - started, **attributes)
+
+    def record(self, run_id, stage, seconds, **attributes):
+        """Record a stage timed elsewhere (e.g. a job's wait, measured across reruns)."""
+        key = (stage, attributes.get("route") or "")
+        with self._lock:
+            trace = self._runs.pop(run_id, None) or RunTrace(run_id)
+            trace.add(stage, seconds, attributes)
+            self._runs[run_id] = trace
+            while len(self._runs) > self.max_runs:
+                self._runs.popitem(last=False)
+            self._durations.setdefault(key, _Histogram()).observe(seconds)
+            if "error" in attributes:
+                self._errors[key] = self._errors.get(key, 0) + 1
+            if attributes.get("bytes"):
+                self._bytes[key] = self._bytes.get(key, 0) + attributes["bytes"]
+        logger.info(json.dumps({"ts": time.time(), "run_id": run_id, "stage": stage, "seconds": round(seconds, 6), **attributes}, default=str))
+        if self.metrics_path:
+            self.write_metrics()
+
+    def get(self, run_id):
+        """The run's RunTrace, or None if nothing was recorded for it (or it aged out)."""
+        with self._lock:
+            return self._runs.get(run_id)
+
+    def metrics_text(self):
+        """All metrics in the Prometheus text exposition format."""
+        def labels(key, **extra):
+            pairs = {"stage": key[0], "route": key[1], **extra}
+            return "{" + ",".join(f'{name}="{value}"' for name, value in pairs.items()) + "}"
+
+        with self._lock:
+            durations = {key: (list(h.bucket_counts), h.count, h.sum) for key, h in self._durations.items()}
+            errors, byte_totals = dict(self._errors), dict(self._bytes)
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_duration_seconds Time spent per analysis stage.",
+            f"# TYPE {METRIC_PREFIX}_stage_duration_seconds histogram",
+        ]
+        for key, (bucket_counts, count, total) in sorted(durations.items()):
+            for bound, bucket_count in zip(STAGE_SECONDS_BUCKETS, bucket_counts):
+                lines.append(f"{METRIC_PREFIX}_stage_duration_seconds_bucket{labels(key, le=bound)} {bucket_count}")
+            lines.append(f"{METRIC_PREFIX}_stage_duration_seconds_bucket{labels(key, le='+Inf')} {count}")
+            lines.append(f"{METRIC_PREFIX}_stage_duration_seconds_sum{labels(key)} {total}")
+            lines.append(f"{METRIC_PREFIX}_stage_duration_seconds_count{labels(key)} {count}")
+        lines += [
+            f"# HELP {METRIC_PREFIX}_stage_errors_total Stages that raised.",
+            f"# TYPE {METRIC_PREFIX}_stage_errors_total counter",
+            *(f"{METRIC_PREFIX}_stage_errors_total{labels(key)} {count}" for key, count in sorted(errors.items())),
+            f"# HELP {METRIC_PREFIX}_stage_bytes_total Bytes handled per stage (uploaded, or received from the backend).",
+            f"# TYPE {METRIC_PREFIX}_stage_bytes_total counter",
+            *(f"{METRIC_PREFIX}_stage_bytes_total{labels(key)} {count}" for key, count in sorted(byte_totals.items())),
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self):
+        """Rewrite the metrics textfile atomically, so a scraper never reads a partial file."""
+        directory = os.path.dirname(self.metrics_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.metrics_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as metrics_file:
+            metrics_file.write(self.metrics_text())
+        os.replace(temp_path, self.metrics_path)
+
+
+def _add_log_file(log_path):
+    """Append trace lines (bare JSON, one per stage) to ``log_path``; safe to call repeatedly."""
+    log_path = os.path.abspath(log_path)
+    if any(getattr(handler, "baseFilename", None) == log_path for handler in logger.handlers):
+        return
+    directory = os.path.dirname(log_path)
+    os.makedirs(directory, exist_ok=True)
+    handler = logging.FileHandler(log_path)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
@@ -0,0 +1,476 @@
+"""S3 upload engine: concurrent multipart uploads with optional content addressing.
+
+Nothing here touches Streamlit, so uploads can run on worker threads, from the
+CLI, or inside the app (which renders progress from ``on_progress``). The app
+also starts uploads speculatively while files are still being staged
+(SpeculativeUploads). Given a ResumableUploads, large files go through its
+checkpointed multipart uploads instead of s3transfer (see resumable.py).
+"""
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+from .config import S3_BASE_FOLDER
+from .resumable import RESUMABLE_MIN_BYTES
+
+# --- Upload Tuning ---
+UPLOAD_MAX_WORKERS = 4 # Files uploaded at the same time (one per Multi-Docs slot)
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024, # Files above 8 MB go multipart
+    multipart_chunksize=16 * 1024 * 1024, # 16 MB parts keep 30-80 MB memos at 2-5 parts
+    max_concurrency=8, # Parts in flight per file
+    use_threads=True,
+)
+UPLOAD_PROGRESS_REFRESH_SECONDS = 0.25
+SPECULATIVE_UPLOAD_WORKERS = 8 # Background uploads of staged files, shared by all sessions of a process
+SPECULATIVE_DELETE_WORKERS = 2 # Deletes of replaced staged files; a pool of their own, since uploads wait for them
+
+# --- Content-Addressed Uploads (opt-in) ---
+# Objects are stored once under their SHA-256; each run gets a server-side copy at the usual run-scoped key
+S3_CONTENT_FOLDER = f"{S3_BASE_FOLDER}/content/sha256"
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def run_folder(run_id):
+    """S3 folder every document of a run is uploaded to."""
+    return f"{S3_BASE_FOLDER}/{run_id}/multi_docs"
+
+
+def file_name_of(file_obj):
+    """Base name of an upload (UploadedFile names are already bare; files opened from disk carry a path)."""
+    return os.path.basename(file_obj.name)
+
+
+def _file_size(file_obj):
+    size = getattr(file_obj, "size", None)
+    if size is None: # Plain file objects: measure by seeking to the end
+        position = file_obj.tell()
+        size = file_obj.seek(0, 2)
+        file_obj.seek(position)
+    return size
+
+
+class _KeepOpen:
+    """File proxy with a no-op close().
+
+    s3transfer closes the body of single-part uploads, but the caller still
+    needs the file afterwards (hashing, retries, Streamlit reruns).
+    """
+
+    def __init__(self, file_obj):
+        self._file_obj = file_obj
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._file_obj, name)
+
+
+def _put_object(file_obj, bucket_name, s3_key, s3_client_instance, progress_callback, resumable, run_id, digest=None):
+    if resumable is not None and _file_size(file_obj) >= RESUMABLE_MIN_BYTES:
+        resumable.upload(file_obj, bucket_name, s3_key, s3_client_instance, run_id=run_id, progress_callback=progress_callback, digest=digest)
+        return
+    file_obj.seek(0)
+    s3_client_instance.upload_fileobj(
+        _KeepOpen(file_obj), bucket_name, s3_key, Config=S3_TRANSFER_CONFIG, Callback=progress_callback
+    )
+
+
+def upload_to_s3(file_obj, bucket_name, s3_folder, s3_client_instance, progress_callback=None, resumable=None, run_id=None, digest=None):
+    """Upload a single file and return its S3 key.
+
+    Raises on failure so it is safe to run on a worker thread; callers collect
+    the error against the slot the file came from. With ``resumable`` files of
+    RESUMABLE_MIN_BYTES or more are uploaded resumably, checkpointed under
+    ``run_id`` and their SHA-256 (``digest``, when already known).
+    """
+    s3_key = f"{s3_folder}/{file_name_of(file_obj)}"
+    _put_object(file_obj, bucket_name, s3_key, s3_client_instance, progress_callback, resumable, run_id, digest)
+    return s3_key
+
+
+def hash_file(file_obj):
+    """SHA-256 hex digest of a file, read in fixed-size chunks."""
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    for chunk in iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def content_key_for(file_name, digest):
+    extension = os.path.splitext(file_name)[1].lower()
+    return f"{S3_CONTENT_FOLDER}/{digest}{extension}"
+
+
+def s3_object_exists(s3_client_instance, bucket_name, s3_key):
+    try:
+        s3_client_instance.head_object(Bucket=bucket_name, Key=s3_key)
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+def upload_content_addressed(file_obj, bucket_name, s3_folder, s3_client_instance, progress_callback=None, digest=None, resumable=None, run_id=None):
+    """Store the file under its content hash, skipping the PUT when S3 already has it.
+
+    The run-scoped key the backend reads (``{s3_folder}/{file_name}``) is then
+    written with a server-side copy, so no file bytes are re-sent. Pass
+    ``digest`` when the hash is already known. Returns ``(run_s3_key, reused)``.
+    """
+    digest = digest or hash_file(file_obj)
+    content_key = content_key_for(file_name_of(file_obj), digest)
+    reused = s3_object_exists(s3_client_instance, bucket_name, content_key)
+    if reused:
+        if progress_callback:
+            progress_callback(_file_size(file_obj))
+    else:
+        _put_object(file_obj, bucket_name, content_key, s3_client_instance, progress_callback, resumable, run_id, digest)
+    run_key = f"{s3_folder}/{file_name_of(file_obj)}"
+    s3_client_instance.copy({"Bucket": bucket_name, "Key": content_key}, bucket_name, run_key, Config=S3_TRANSFER_CONFIG)
+    return run_key, reused
+
+
+class UploadProgress:
+    """Thread-safe byte counters for a batch of uploads, keyed by slot."""
+
+    def __init__(self, files_by_slot):
+        self._lock = threading.Lock()
+        self.names = {slot: file_name_of(f) for slot, f in files_by_slot.items()}
+        self.total = {slot: _file_size(f) for slot, f in files_by_slot.items()}
+        self.sent = {slot: 0 for slot in files_by_slot}
+        self.done = set()
+        self.reused = set() # Slots whose content was already in S3 (content-addressed mode)
+
+    def callback_for(self, slot):
+        def _callback(bytes_transferred):
+            with self._lock:
+                self.sent[slot] += bytes_transferred
+        return _callback
+
+    def mark_done(self, slot):
+        with self._lock:
+            self.done.add(slot)
+            self.sent[slot] = self.total[slot]
+
+    def track(self, slot, file_obj):
+        """(Re)start counting ``slot`` for a newly staged file."""
+        with self._lock:
+            self.names[slot] = file_name_of(file_obj)
+            self.total[slot] = _file_size(file_obj)
+            self.sent[slot] = 0
+            self.done.discard(slot)
+            self.reused.discard(slot)
+
+    def untrack(self, slot):
+        with self._lock:
+            for counters in (self.names, self.total, self.sent):
+                counters.pop(slot, None)
+            self.done.discard(slot)
+            self.reused.discard(slot)
+
+    def mark_reused(self, slot):
+        with self._lock:
+            self.reused.add(slot)
+
+    def fraction(self, slot):
+        with self._lock:
+            total = self.total[slot]
+            return 1.0 if not total else min(self.sent[slot] / total, 1.0)
+
+    def overall_fraction(self):
+        with self._lock:
+            total = sum(self.total.values())
+            return 1.0 if not total else min(sum(self.sent.values()) / total, 1.0)
+
+
+def upload_files_concurrently(
+    files_by_slot, bucket_name, s3_folder, s3_client_instance, on_progress=None, content_addressed=False, digests=None,
+    resumable=None, run_id=None,
+):
+    """Upload every staged file at once on a bounded worker pool.
+
+    Returns ``(s3_keys, errors, progress)``; keys and errors are keyed by slot.
+    ``on_progress`` is called on the calling thread with the shared
+    UploadProgress while uploads run, so it may safely update UI elements. With
+    ``content_addressed`` files whose hash is already in S3 are not re-sent (see
+    upload_content_addressed); ``digests`` (slot -> SHA-256) avoids hashing a
+    file twice. ``resumable`` and ``run_id`` are passed on to upload_to_s3.
+    """
+    digests = digests or {}
+    progress = UploadProgress(files_by_slot)
+    s3_keys, errors = {}, {}
+    if not files_by_slot:
+        return s3_keys, errors, progress
+
+    def _upload_slot(slot, file_obj):
+        if content_addressed:
+            s3_key, reused = upload_content_addressed(
+                file_obj, bucket_name, s3_folder, s3_client_instance, progress.callback_for(slot), digest=digests.get(slot),
+                resumable=resumable, run_id=run_id,
+            )
+            if reused:
+                progress.mark_reused(slot)
+            return s3_key
+        return upload_to_s3(
+            file_obj, bucket_name, s3_folder, s3_client_instance, progress.callback_for(slot), resumable, run_id, digests.get(slot)
+        )
+
+    with ThreadPoolExecutor(max_workers=min(UPLOAD_MAX_WORKERS, len(files_by_slot))) as executor:
+        futures = {executor.submit(_upload_slot, slot, file_obj): slot for slot, file_obj in files_by_slot.items()}
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=UPLOAD_PROGRESS_REFRESH_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                slot = futures[future]
+                try:
+                    s3_keys[slot] = future.result()
+                    progress.mark_done(slot)
+                except Exception as e:
+                    errors[slot] = _upload_error(progress.names[slot], e)
+            if on_progress:
+                on_progress(progress)
+    return s3_keys, errors, progress
+
+
+def _upload_error(file_name, error):
+    if isinstance(error, ClientError):
+        return f"Failed to upload {file_name} to S3: {error}"
+    return f"An unexpected error occurred during S3 upload of {file_name}: {error}"
+
+
+# --- Speculative Uploads (start while files are still being staged) ---
+class UploadCancelled(Exception):
+    """Raised from a transfer's progress callback to stop an upload whose file was replaced or removed."""
+
+
+def staged_file_token(file_obj):
+    """Identity of a staged file: a different token in the same slot means the user staged another file."""
+    return (file_name_of(file_obj), _file_size(file_obj), getattr(file_obj, "file_id", None))
+
+
+class _SharedBytesView(io.BufferedIOBase):
+    """Read-only file over another file's bytes with its own read position; the bytes are not copied."""
+
+    def __init__(self, data, name):
+        self._data = memoryview(data).toreadonly()
+        self._position = 0
+        self.name = name
+        self.size = len(self._data)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        start = min(self._position, self.size)
+        end = self.size if size is None or size < 0 else min(start + size, self.size)
+        self._position = end
+        return self._data[start:end].tobytes()
+
+    read1 = read
+
+    def readinto(self, buffer):
+        chunk = self.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self.size}[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+
+def _private_view(file_obj):
+    """The same bytes behind a separate read position, so a background upload never moves the caller's file.
+
+    BytesIO.getvalue() (and so UploadedFile's) hands out the buffer's bytes
+    object without copying it, and the view only ever reads from it.
+    """
+    getvalue = getattr(file_obj, "getvalue", None)
+    if getvalue is None:
+        return file_obj
+    return _SharedBytesView(getvalue(), file_obj.name)
+
+
+class _StagedUpload:
+    def __init__(self, token, file_obj, previous):
+        self.token = token
+        self.file_obj = file_obj
+        self.previous = previous # Upload this one replaces; it must be settled first (it may have written the same key)
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.committed = False # Handed to an analysis: never deleted, even if cancelled later
+        self.s3_key = None
+        self.settled = threading.Event() # Set once nothing more will be written or deleted for this upload
+        self.future = None
+
+    def failed(self):
+        return self.future.done() and self.future.exception() is not None
+
+
+class SpeculativeUploads:
+    """Uploads of one run's staged files, started in the background before the analysis is requested.
+
+    ``sync`` is called with the currently staged files on every rerun: new
+    files start uploading, and the upload of a replaced or removed file is
+    cancelled (mid-transfer through its progress callback, which aborts the
+    multipart upload) with any object it already wrote deleted.
+    ``collect`` then only waits for what is still in flight. Uploads run on a
+    shared ``executor``; each uses a private view of its file's bytes.
+    Deletes go to ``delete_executor`` (or run on the calling thread), never to
+    ``executor``: an upload waits there for the delete of the file it replaces.
+    With ``resumable``, objects not yet collected are recorded as staged, so
+    its sweep deletes those of sessions that never ran an analysis.
+    """
+
+    def __init__(
+        self, executor, bucket_name, s3_folder, s3_client_instance, content_addressed=False, resumable=None, run_id=None,
+        delete_executor=None,
+    ):
+        self.executor = executor
+        self.delete_executor = delete_executor
+        self.bucket_name = bucket_name
+        self.s3_folder = s3_folder
+        self.s3_client = s3_client_instance
+        self.content_addressed = content_addressed
+        self.resumable = resumable
+        self.run_id = run_id
+        self.progress = UploadProgress({})
+        self._lock = threading.Lock()
+        self._slots = {} # slot -> _StagedUpload
+
+    def sync(self, files_by_slot, retry_failed=False):
+        """Start uploads for newly staged files and cancel those of replaced or removed ones."""
+        with self._lock:
+            for slot in [slot for slot in self._slots if slot not in files_by_slot]:
+                self._cancel(self._slots.pop(slot))
+                self.progress.untrack(slot)
+            for slot, file_obj in files_by_slot.items():
+                task = self._slots.get(slot)
+                token = staged_file_token(file_obj)
+                if task is not None and task.token == token and not (retry_failed and task.failed()):
+                    continue
+                if task is not None:
+                    self._cancel(task)
+                self._start(slot, token, file_obj, task)
+
+    def collect(self, files_by_slot, on_progress=None):
+        """Wait for the uploads of ``files_by_slot`` (starting any that are missing or failed).
+
+        Returns ``(s3_keys, errors, progress)`` like upload_files_concurrently.
+        Collected uploads belong to the analysis from then on and are never deleted.
+        """
+        self.sync(files_by_slot, retry_failed=True)
+        with self._lock:
+            tasks = {slot: self._slots[slot] for slot in files_by_slot}
+        s3_keys, errors = {}, {}
+        pending = {task.future: slot for slot, task in tasks.items()}
+        while pending:
+            done, _ = wait(pending, timeout=UPLOAD_PROGRESS_REFRESH_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                slot = pending.pop(future)
+                try:
+                    s3_keys[slot] = future.result()
+                    with tasks[slot].lock:
+                        tasks[slot].committed = True
+                    if self.resumable is not None:
+                        self.resumable.forget_staged(self.bucket_name, s3_keys[slot])
+                except Exception as e:
+                    errors[slot] = _upload_error(self.progress.names[slot], e)
+            if on_progress:
+                on_progress(self.progress)
+        return s3_keys, errors, self.progress
+
+    def cancel_all(self):
+        """Cancel every upload not yet handed to an analysis, deleting what they wrote."""
+        with self._lock:
+            for slot, task in self._slots.items():
+                self._cancel(task)
+                self.progress.untrack(slot)
+            self._slots.clear()
+
+    def _start(self, slot, token, file_obj, previous):
+        view = _private_view(file_obj)
+        self.progress.track(slot, view)
+        task = _StagedUpload(token, view, previous)
+        task.future = self.executor.submit(self._upload, slot, task)
+        self._slots[slot] = task
+
+    def _cancel(self, task):
+        with task.lock:
+            task.cancelled = True
+            if task.s3_key is not None and not task.committed: # Finished before it was cancelled
+                task.settled.clear()
+                self._submit_delete(task)
+
+    def _submit_delete(self, task):
+        if self.delete_executor is None:
+            self._delete(task)
+        else:
+            self.delete_executor.submit(self._delete, task)
+
+    def _delete(self, task):
+        try:
+            self.s3_client.delete_object(Bucket=self.bucket_name, Key=task.s3_key)
+            if self.resumable is not None:
+                self.resumable.forget_staged(self.bucket_name, task.s3_key)
+        finally:
+            task.settled.set()
+
+    def _upload(self, slot, task):
+        if task.previous is not None:
+            task.previous.settled.wait()
+            task.previous = None
+        count_bytes = self.progress.callback_for(slot)
+
+        def _callback(bytes_transferred):
+            if task.cancelled:
+                raise UploadCancelled()
+            count_bytes(bytes_transferred)
+
+        try:
+            if task.cancelled:
+                raise UploadCancelled()
+            if self.content_addressed:
+                s3_key, reused = upload_content_addressed(
+                    task.file_obj, self.bucket_name, self.s3_folder, self.s3_client, _callback, resumable=self.resumable, run_id=self.run_id
+                )
+                if reused:
+                    self.progress.mark_reused(slot)
+            else:
+                s3_key = upload_to_s3(task.file_obj, self.bucket_name, self.s3_folder, self.s3_client, _callback, self.resumable, self.run_id)
+        except BaseException:
+            with task.lock:
+                if task.cancelled: # A single PUT can land before its progress callback raises: delete what may be there
+                    task.s3_key = f"{self.s3_folder}/{file_name_of(task.file_obj)}"
+                    self._submit_delete(task)
+                else:
+                    task.settled.set() # Nothing was written under the run-scoped key
+            raise
+        with task.lock:
+            task.s3_key = s3_key
+            if self.resumable is not None:
+                self.resumable.record_staged(self.bucket_name, s3_key)
+            if task.cancelled and not task.committed: # Cancelled while finishing
+                self._submit_delete(task)
+            else:
+                task.settled.set()
+        if task.cancelled:
+            raise UploadCancelled()
+        self.progress.mark_done(slot)
+        return s3_key
@@ -0,0 +1,200 @@
+"""Optional pre-processing of Excel uploads into compact columnar sheets.
+
+Occupancy workbooks often carry tens of MB of formatting, hidden sheets and
+pivot caches around a few MB of data. ``upload_preprocessed`` reads an
+uploaded .xlsx as a stream (openpyxl read-only mode, values only), drops
+hidden and empty sheets, normalizes each remaining sheet and uploads it as
+compressed Parquet (or gzipped CSV) next to the original, plus a JSON
+manifest describing them. The original is still uploaded and stays the
+source of truth; the backend may read the manifest instead.
+
+A normalized sheet is one table: the header is the fullest all-text row
+among the first HEADER_SCAN_ROWS non-empty rows (titles above it are kept in
+the manifest as ``preamble``), columns are named by header cell or, where
+that is blank, by spreadsheet letter (trailing empty columns trimmed), and
+every non-empty row below it becomes a row, with ``excel_row`` holding its
+number in the workbook. Each column is typed once: number if every value is
+numeric, datetime if every value is a date, text otherwise.
+"""
+import datetime
+import gzip
+import json
+import os
+import re
+import tempfile
+
+from .exports import EXPORT_SPOOL_MAX_BYTES, write_frame
+from .uploads import S3_TRANSFER_CONFIG, file_name_of
+
+PREPROCESSABLE_EXTENSIONS = (".xlsx", ".xlsm") # Legacy .xls is not readable by openpyxl; it is uploaded as is
+PREPROCESS_FORMATS = {"parquet": ".parquet", "csv": ".csv.gz"}
+MANIFEST_VERSION = 1
+EXCEL_ROW_COLUMN = "excel_row"
+HEADER_SCAN_ROWS = 50 # Non-empty rows searched for the header (report titles and notes usually come first)
+
+
+def is_preprocessable(file_name):
+    return os.path.splitext(file_name)[1].lower() in PREPROCESSABLE_EXTENSIONS
+
+
+def preprocessed_folder(s3_key):
+    """S3 "folder" the sheets and manifest of the workbook at ``s3_key`` go to."""
+    return f"{s3_key}.sheets"
+
+
+def _column_letter(index):
+    from openpyxl.utils import get_column_letter
+
+    return get_column_letter(index + 1)
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _sheet_rows(worksheet):
+    """``(excel_row, values)`` for every non-empty row, streamed, with blank cells as None and trailing ones dropped."""
+    for number, values in enumerate(worksheet.iter_rows(values_only=True), start=1):
+        values = [None if _is_blank(value) else value for value in values]
+        while values and values[-1] is None:
+            values.pop()
+        if values:
+            yield number, values
+
+
+def _header_index(rows):
+    """Index of the header among the first rows: the one with the most cells, all of them text; None if there is none."""
+    best, best_count = None, 1 # A lone text cell is a title, not a header
+    for index, values in enumerate(rows[:HEADER_SCAN_ROWS]):
+        present = [value for value in values if value is not None]
+        if len(present) > best_count and all(isinstance(value, str) for value in present):
+            best, best_count = index, len(present)
+    return best
+
+
+def _column_names(header, width):
+    names, seen = [], {EXCEL_ROW_COLUMN}
+    for index in range(width):
+        value = header[index] if header is not None and index < len(header) else None
+        name = str(value).strip() if value is not None else _column_letter(index)
+        while name in seen: # Repeated header text: suffix with the column letter
+            name = f"{name}_{_column_letter(index)}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def _typed_column(values):
+    """Column as a pandas Series of one type: number, datetime or text."""
+    import pandas as pd
+
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, int) and not isinstance(value, bool) for value in present):
+        return pd.Series(values, dtype="Int64"), "number"
+    if present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        return pd.Series(values, dtype="float64"), "number"
+    if present and all(isinstance(value, (datetime.datetime, datetime.date)) for value in present):
+        return pd.to_datetime(pd.Series(values, dtype="object")), "datetime"
+    return pd.Series([None if value is None else str(value) for value in values], dtype="string"), "text"
+
+
+def normalize_sheet(worksheet):
+    """The sheet as ``(frame, description)``, or ``(None, None)`` if it is empty.
+
+    ``description`` has the header's row number, the preamble lines above it
+    and each column's name, spreadsheet letter and type.
+    """
+    import pandas as pd
+
+    row_numbers, rows = [], []
+    for number, values in _sheet_rows(worksheet):
+        row_numbers.append(number)
+        rows.append(values)
+    if not rows:
+        return None, None
+    header_index = _header_index(rows)
+    header = rows[header_index] if header_index is not None else None
+    header_row = row_numbers[header_index] if header_index is not None else None
+    preamble = rows[:header_index] if header_index is not None else []
+    start = header_index + 1 if header_index is not None else 0
+    row_numbers, rows = row_numbers[start:], rows[start:]
+    width = max([len(values) for values in rows] + [len(header or [])])
+    frame = pd.DataFrame({EXCEL_ROW_COLUMN: pd.Series(row_numbers, dtype="int64")})
+    columns = []
+    for index, name in enumerate(_column_names(header, width)):
+        series, kind = _typed_column([values[index] if index < len(values) else None for values in rows])
+        frame[name] = series
+        columns.append({"name": name, "letter": _column_letter(index), "type": kind})
+    description = {
+        "header_row": header_row,
+        "preamble": [" ".join(str(value) for value in values if value is not None) for values in preamble],
+        "columns": columns,
+    }
+    return frame, description
+
+
+def _sheet_file_name(position, sheet_name, extension):
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "_", sheet_name).strip("_") or "sheet"
+    return f"{position:02d}_{slug}{extension}"
+
+
+def _write_sheet(frame, output_format):
+    """Write a normalized sheet to a spooled temp file, rewound for uploading."""
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+    if output_format == "csv":
+        with gzip.GzipFile(fileobj=spool, mode="wb") as compressed:
+            write_frame(frame, compressed, ".csv")
+    else:
+        write_frame(frame, spool, ".parquet")
+    spool.seek(0, 2)
+    size = spool.tell()
+    spool.seek(0)
+    return spool, size
+
+
+def upload_preprocessed(file_obj, bucket_name, s3_key, s3_client_instance, output_format="parquet"):
+    """Upload the normalized sheets of the workbook uploaded at ``s3_key`` and their manifest.
+
+    Returns ``(manifest_s3_key, bytes_uploaded)``. Raises ValueError for an
+    unknown ``output_format`` and whatever openpyxl raises for an unreadable workbook.
+    """
+    from openpyxl import load_workbook
+
+    if output_format not in PREPROCESS_FORMATS:
+        raise ValueError(f"Unsupported pre-processing format {output_format!r}; use one of {', '.join(PREPROCESS_FORMATS)}.")
+    folder = preprocessed_folder(s3_key)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "source": {"file_name": file_name_of(file_obj), "s3_key": s3_key},
+        "format": output_format,
+        "row_column": EXCEL_ROW_COLUMN,
+        "sheets": [],
+        "skipped_sheets": [],
+    }
+    uploaded = 0
+    file_obj.seek(0)
+    workbook = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        for position, worksheet in enumerate(workbook.worksheets):
+            if worksheet.sheet_state != "visible":
+                manifest["skipped_sheets"].append({"name": worksheet.title, "reason": "hidden"})
+                continue
+            frame, description = normalize_sheet(worksheet)
+            if frame is None:
+                manifest["skipped_sheets"].append({"name": worksheet.title, "reason": "empty"})
+                continue
+            sheet_key = f"{folder}/{_sheet_file_name(position, worksheet.title, PREPROCESS_FORMATS[output_format])}"
+            spool, size = _write_sheet(frame, output_format)
+            with spool:
+                s3_client_instance.upload_fileobj(spool, bucket_name, sheet_key, Config=S3_TRANSFER_CONFIG)
+            uploaded += size
+            manifest["sheets"].append({
+                "name": worksheet.title, "position": position, "s3_key": sheet_key, "rows": len(frame), "bytes": size, **description,
+            })
+    finally:
+        workbook.close()
+        file_obj.seek(0)
+    body = json.dumps(manifest, indent=2).encode("utf-8")
+    manifest_key = f"{folder}/manifest.json"
+    s3_client_instance.put_object(Bucket=bucket_name, Key=manifest_key, Body=body, ContentType="application/json")
+    return manifest_key, uploaded + len(body)
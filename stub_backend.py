@@ -0,0 +1,190 @@
+"""Local stand-in for the Cactus AI analysis backend.
+
+Serves both analysis routes in the synchronous form the app has always used
+and in job form, so the app's job mode can be exercised without the real
+service:
+
+    POST /<route>                 -> analysis result (blocks for --latency seconds)
+    POST /<route>/jobs            -> 202 {"job_id": <run_id>, "status": "queued"}
+    GET  /<route>/jobs/<job_id>   -> {"job_id", "status": queued|running|succeeded|failed, "result" | "error"}
+
+Run it and point the app's secrets at it:
+
+    python stub_backend.py --port 8000 --latency 20
+    # .streamlit/secrets.toml
+    API_BASE_URL = "http://localhost:8000"
+    API_BASE_URL_COMMERCIAL_RENT_ROLL = "http://localhost:8000"
+
+A payload whose ``run_id`` contains "fail" makes the job fail, for testing the
+error path.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROUTE_MULTI_DOCS = "cactus-ai-multi-docs-smart-analysis"
+ROUTE_RENT_ROLL = "cactus-ai-commercial-rent-roll"
+
+# Multi-Docs slot -> summary key in the result, as returned by the real backend
+MULTI_DOC_SUMMARY_KEYS = {
+    "management_summary": "m_s_summary",
+    "occupancy_report": "o_r_summary",
+    "offering_memo": "o_m_summary",
+    "other_docs": "o_d_summary",
+}
+
+
+def build_multi_docs_result(payload, report_chars=2000):
+    result = {}
+    for slot, summary_key in MULTI_DOC_SUMMARY_KEYS.items():
+        s3_key = payload.get(f"{slot}_s3_key")
+        if not s3_key:
+            continue
+        report_line = f"Stub analysis of {s3_key}: occupancy 91%, street rate $1.25/SF.\n\n"
+        result[f"{slot}_data"] = {
+            summary_key: f"Stub summary for **{s3_key}** (run {payload.get('run_id')}). Average rent $14.50/SF.",
+            "full_report": (report_line * (report_chars // len(report_line) + 1))[:report_chars],
+        }
+    return result
+
+
+def build_rent_roll_rows(row_count, seed=0):
+    rng = random.Random(seed)
+    tenants = ["Acme Corp", "Blue Bottle", "Cedar Dental", "Delta Logistics", "Evergreen Fitness", "Vacant"]
+    rows = []
+    for i in range(row_count):
+        tenant = rng.choice(tenants)
+        area = rng.randint(500, 20000)
+        start_year = rng.randint(2015, 2024)
+        rows.append({
+            "building": f"Building {i % 7 + 1}",
+            "suite": f"{100 + i}",
+            "tenant_name": tenant,
+            "square_feet": area,
+            "annual_rent": 0 if tenant == "Vacant" else round(area * rng.uniform(12, 40), 2),
+            "lease_start": None if tenant == "Vacant" else f"{start_year}-{rng.randint(1, 12):02d}-01",
+            "lease_end": None if tenant == "Vacant" else f"{start_year + rng.randint(3, 10)}-{rng.randint(1, 12):02d}-28",
+            "status": "Vacant" if tenant == "Vacant" else "Occupied",
+        })
+    return rows
+
+
+def build_rent_roll_result(payload, row_count=250):
+    return {"status": "success", "doc_url": payload.get("doc_url"), "rent_roll_json_data": build_rent_roll_rows(row_count)}
+
+
+class StubBackend:
+    """Job table plus result builders shared by the request handlers."""
+
+    def __init__(self, latency=2.0, rent_roll_rows=250, report_chars=2000):
+        self.latency = latency
+        self.rent_roll_rows = rent_roll_rows
+        self.report_chars = report_chars
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def build_result(self, route, payload):
+        if route == ROUTE_MULTI_DOCS:
+            return build_multi_docs_result(payload, self.report_chars)
+        return build_rent_roll_result(payload, self.rent_roll_rows)
+
+    def submit(self, route, payload):
+        job_id = payload.get("run_id") or str(uuid.uuid4()) # Job ids are tied to the caller's run_id
+        with self._lock:
+            # Resubmitting the same run_id returns the existing job instead of starting another
+            self._jobs.setdefault(job_id, {"route": route, "payload": payload, "submitted_at": time.time()})
+        return job_id
+
+    def status(self, route, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job["route"] != route:
+            return None
+        elapsed = time.time() - job["submitted_at"]
+        if elapsed < min(1.0, self.latency):
+            return {"job_id": job_id, "status": "queued"}
+        if elapsed < self.latency:
+            return {"job_id": job_id, "status": "running"}
+        if "fail" in job_id:
+            return {"job_id": job_id, "status": "failed", "error": "Stub backend was asked to fail this job."}
+        return {"job_id": job_id, "status": "succeeded", "result": self.build_result(route, job["payload"])}
+
+
+def make_handler(backend):
+    class StubHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _route_parts(self):
+            return [part for part in self.path.split("?", 1)[0].split("/") if part]
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return self._send_json(400, {"error": "Request body is not valid JSON."})
+            parts = self._route_parts()
+            if len(parts) == 1 and parts[0] in (ROUTE_MULTI_DOCS, ROUTE_RENT_ROLL):
+                time.sleep(backend.latency)
+                return self._send_json(200, backend.build_result(parts[0], payload))
+            if len(parts) == 2 and parts[0] in (ROUTE_MULTI_DOCS, ROUTE_RENT_ROLL) and parts[1] == "jobs":
+                job_id = backend.submit(parts[0], payload)
+                return self._send_json(202, {"job_id": job_id, "status": "queued"})
+            self._send_json(404, {"error": f"Unknown route {self.path}"})
+
+        def do_GET(self):
+            parts = self._route_parts()
+            if len(parts) == 3 and parts[1] == "jobs":
+                status = backend.status(parts[0], parts[2])
+                if status is None:
+                    return self._send_json(404, {"error": f"Unknown job {parts[2]}"})
+                return self._send_json(200, status)
+            self._send_json(404, {"error": f"Unknown route {self.path}"})
+
+        def log_message(self, format, *args): # Keep the console quiet unless asked
+            if self.server.verbose:
+                super().log_message(format, *args)
+
+    return StubHandler
+
+
+def serve(host="127.0.0.1", port=8000, backend=None, verbose=False):
+    """Start the stub on a background thread and return the server (call ``shutdown()`` to stop)."""
+    server = ThreadingHTTPServer((host, port), make_handler(backend or StubBackend()))
+    server.daemon_threads = True
+    server.verbose = verbose
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stub for the Cactus AI analysis backend.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=2.0, help="Seconds each analysis takes.")
+    parser.add_argument("--rows", type=int, default=250, help="Rent roll line items returned.")
+    parser.add_argument("--report-chars", type=int, default=2000, help="Length of each Multi-Docs full_report.")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, StubBackend(args.latency, args.rows, args.report_chars), args.verbose)
+    print(f"Stub backend listening on http://{args.host}:{args.port} (latency {args.latency}s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
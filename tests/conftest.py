@@ -0,0 +1,26 @@
+import pytest
+
+from benchmarks import s3_emulator
+from cactus_pipeline.clients import make_s3_client
+from cactus_pipeline.config import Settings
+
+
+@pytest.fixture
+def s3():
+    """The benchmarks' in-process S3 emulator with one empty bucket, ``s3.bucket``."""
+    server = s3_emulator.serve(buckets=["test-bucket"])
+    server.bucket = "test-bucket"
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def s3_client(s3):
+    return make_s3_client(Settings(
+        s3_bucket_name=s3.bucket,
+        api_base_url_multi_docs="http://backend",
+        aws_access_key_id="test",
+        aws_secret_access_key="test",
+        aws_region="us-east-1",
+        s3_endpoint_url=s3.endpoint_url,
+    ))
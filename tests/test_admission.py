@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+
+from cactus_pipeline import admission
+from cactus_pipeline.admission import AdmissionController, AdmissionShed
+
+ROUTE = "analyze"
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(admission, "ADMISSION_POLL_SECONDS", 0.01)
+
+
+class _Caller(threading.Thread):
+    """One queued backend call: records when it is granted, then holds its slot until ``release`` is set."""
+
+    def __init__(self, controller, user, name, granted, is_connected=None, hold=False):
+        super().__init__(daemon=True)
+        self.controller, self.user, self.name_, self.granted, self.is_connected = controller, user, name, granted, is_connected
+        self.release = threading.Event()
+        if not hold:
+            self.release.set()
+        self.waits, self.error = [], None
+
+    def run(self):
+        try:
+            with self.controller.admit(ROUTE, user=self.user, is_connected=self.is_connected, on_wait=lambda *wait: self.waits.append(wait)):
+                self.granted.append(self.name_)
+                self.release.wait(5)
+        except Exception as e:
+            self.error = e
+
+
+def _queued(controller):
+    return controller.stats().get(ROUTE, {}).get("queued", 0)
+
+
+def _enqueue(controller, callers):
+    """Start ``callers`` one after another, each only once the previous one is waiting in the queue."""
+    for caller in callers:
+        before = _queued(controller)
+        caller.start()
+        deadline = time.monotonic() + 5
+        while _queued(controller) == before and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+
+def _wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert condition()
+
+
+def test_users_take_turns_and_each_user_is_fifo():
+    controller, granted = AdmissionController(default_limit=1, service_seconds=10), []
+    blocker = _Caller(controller, "someone", "blocker", granted, hold=True)
+    blocker.start()
+    _wait_for(lambda: granted == ["blocker"])
+    batch = [_Caller(controller, "batch user", f"batch {i}", granted) for i in range(3)]
+    single = _Caller(controller, "single user", "single", granted)
+    _enqueue(controller, batch + [single])
+
+    time.sleep(0.05) # Let every caller report its position again with the full queue
+    assert [caller.waits[-1] for caller in batch + [single]] == [(1, 10.0), (3, 30.0), (4, 40.0), (2, 20.0)]
+
+    blocker.release.set()
+    for caller in batch + [single]:
+        caller.join(5)
+    assert granted == ["blocker", "batch 0", "single", "batch 1", "batch 2"]
+    assert controller.stats()[ROUTE]["queued"] == 0 and controller.stats()[ROUTE]["running"] == 0
+
+
+def test_estimate_counts_one_service_time_per_round_of_slots():
+    controller, granted = AdmissionController(default_limit=2, service_seconds=6), []
+    holders = [_Caller(controller, f"holder {i}", f"holder {i}", granted, hold=True) for i in range(2)]
+    for holder in holders:
+        holder.start()
+    _wait_for(lambda: len(granted) == 2)
+    waiting = [_Caller(controller, f"user {i}", f"user {i}", granted) for i in range(3)]
+    _enqueue(controller, waiting)
+
+    time.sleep(0.05)
+    assert [caller.waits[-1] for caller in waiting] == [(1, 6.0), (2, 6.0), (3, 12.0)]
+    for holder in holders:
+        holder.release.set()
+    for caller in waiting:
+        caller.join(5)
+
+
+def test_disconnected_callers_are_shed_before_reaching_the_backend():
+    controller, granted = AdmissionController(default_limit=1), []
+    blocker = _Caller(controller, "someone", "blocker", granted, hold=True)
+    blocker.start()
+    _wait_for(lambda: granted == ["blocker"])
+    connected = {"gone": True}
+    gone = _Caller(controller, "gone user", "gone", granted, is_connected=lambda: connected["gone"])
+    present = _Caller(controller, "present user", "present", granted, is_connected=lambda: True)
+    _enqueue(controller, [gone, present])
+
+    connected["gone"] = False
+    gone.join(5)
+    assert isinstance(gone.error, AdmissionShed) and controller.shed_count == 1
+    assert _queued(controller) == 1
+
+    blocker.release.set()
+    present.join(5)
+    assert granted == ["blocker", "present"] and present.error is None
+
+
+def test_caller_giving_up_while_queued_leaves_the_queue():
+    controller, granted = AdmissionController(default_limit=1), []
+    blocker = _Caller(controller, "someone", "blocker", granted, hold=True)
+    blocker.start()
+    _wait_for(lambda: granted == ["blocker"])
+
+    def _give_up(position, estimate):
+        raise KeyboardInterrupt # What a stopped Streamlit script run looks like to on_wait
+
+    with pytest.raises(KeyboardInterrupt):
+        with controller.admit(ROUTE, user="impatient", on_wait=_give_up):
+            pass
+    assert _queued(controller) == 0
+    blocker.release.set()
+    blocker.join(5)
+    assert controller.stats()[ROUTE]["running"] == 0
@@ -0,0 +1,28 @@
+import pandas as pd
+
+from cactus_pipeline.analytics import rent_roll_analytics
+from cactus_pipeline.rent_roll import rent_roll_frame
+
+AS_OF = "2026-01-01"
+
+
+def _rows(lease_end_suffix):
+    return [
+        {"building": "A", "tenant_name": "Acme", "square_feet": 1000, "annual_rent": 30000.0, "lease_end": f"2027-01-01{lease_end_suffix}"},
+        {"building": "A", "tenant_name": "Blue", "square_feet": 3000, "annual_rent": 60000.0, "lease_end": f"2029-01-01{lease_end_suffix}"},
+        {"building": "B", "tenant_name": "Vacant", "square_feet": 1000, "annual_rent": None, "lease_end": None},
+    ]
+
+
+def test_lease_dates_with_utc_designator_match_naive_dates():
+    aware = rent_roll_frame(_rows("T00:00:00Z"))
+    naive = rent_roll_frame(_rows(""))
+    assert str(aware["lease_end"].dt.tz) == "UTC"
+
+    analytics = rent_roll_analytics(aware, as_of=AS_OF)
+    expected = rent_roll_analytics(naive, as_of=AS_OF)
+
+    assert analytics.summary == expected.summary
+    assert analytics.summary["occupancy_area"] == 0.8
+    assert round(analytics.summary["walt_years_by_rent"], 2) == round((30000 * 365 + 60000 * 1096) / 90000 / 365.25, 2)
+    pd.testing.assert_frame_equal(analytics.expiry_ladder, expected.expiry_ladder)
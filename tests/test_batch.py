@@ -0,0 +1,58 @@
+import io
+import zipfile
+
+import pytest
+
+from cactus_pipeline import batch
+from cactus_pipeline.batch import ZipTooLargeError, properties_from_zip
+
+
+def _zip(members, name="batch.zip"):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w", zipfile.ZIP_DEFLATED) as archive:
+        for path, content in members.items():
+            archive.writestr(path, content)
+    data.seek(0)
+    data.name = name
+    return data
+
+
+def test_property_folders_are_split_into_slots():
+    archive = _zip({
+        "wrap/PropA/Mgmt Summary.pdf": b"m", "wrap/PropA/Rent_Roll_2024.xlsx": b"r", "wrap/PropA/photo.jpg": b"p",
+        "wrap/PropB/offering-memorandum.pdf": b"o", "wrap/PropB/misc.pdf": b"1", "wrap/PropB/extra.pdf": b"2",
+        "wrap/__MACOSX/PropA/._x.pdf": b"", "wrap/PropB/.DS_Store": b"",
+    })
+
+    properties = {name: (files, skipped) for name, files, skipped in properties_from_zip(archive)}
+
+    assert {slot: f.name for slot, f in properties["PropA"][0].items()} == {"management_summary": "Mgmt Summary.pdf", "occupancy_report": "Rent_Roll_2024.xlsx"}
+    assert properties["PropA"][1] == ["photo.jpg"]
+    assert sorted(properties["PropB"][0]) == ["offering_memo", "other_docs"]
+    assert properties["PropB"][0]["offering_memo"].read() == b"o"
+
+
+@pytest.mark.parametrize(
+    "members, limits, message",
+    [
+        ({f"P/{i}.pdf": b"" for i in range(6)}, {"BATCH_ZIP_MAX_ENTRIES": 5}, "more than 5 entries"),
+        ({"P/om.pdf": b"\0" * 2048}, {"BATCH_ZIP_MAX_FILE_BYTES": 1024}, "om.pdf is larger than"),
+        ({"A/om.pdf": b"\0" * 600, "B/om.pdf": b"\0" * 600}, {"BATCH_ZIP_MAX_TOTAL_BYTES": 1000}, "add up to more than"),
+    ],
+    ids=["entries", "file_size", "total_size"],
+)
+def test_oversized_zips_are_rejected_before_reading(monkeypatch, members, limits, message):
+    for name, value in limits.items():
+        monkeypatch.setattr(batch, name, value)
+    read = []
+    monkeypatch.setattr(zipfile.ZipFile, "read", lambda self, member, pwd=None: read.append(member))
+
+    with pytest.raises(ZipTooLargeError, match=message):
+        properties_from_zip(_zip(members))
+    assert len(read) < len(members) # The member over the limit was never decompressed
+
+
+def test_zips_within_the_limits_are_read(monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_ZIP_MAX_TOTAL_BYTES", 1200)
+    properties = properties_from_zip(_zip({"A/om.pdf": b"\0" * 600, "B/om.pdf": b"\0" * 600}))
+    assert [name for name, _, _ in properties] == ["A", "B"]
@@ -0,0 +1,75 @@
+import json
+import sqlite3
+import zlib
+
+import pandas as pd
+import pytest
+
+from cactus_pipeline import API_ENDPOINT_ROUTE_MULTI_DOCS, API_ENDPOINT_ROUTE_RENT_ROLL, Settings
+from cactus_pipeline.cache import ResultCache, pack_payload, result_cache_key, unpack_payload
+from cactus_pipeline.pipeline import Pipeline
+from cactus_pipeline.rent_roll import PARQUET_MAGIC, RENT_ROLL_ROWS_KEY, dump_rent_roll_result, load_rent_roll_result
+from cactus_pipeline.runs import RunStore
+
+RENT_ROLL = {"status": "success", RENT_ROLL_ROWS_KEY: pd.DataFrame({"suite": [str(i) for i in range(50)], "square_feet": range(50)})}
+REPORT = {"page_1": {"title": "Summary", "summary": "s" * 500, "full_report": "r" * 5000}}
+
+
+def _stored(path, table):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT payload FROM {table}").fetchone()[0]
+
+
+def test_parquet_is_stored_as_is_and_json_compressed():
+    parquet = dump_rent_roll_result(RENT_ROLL)
+
+    assert parquet[:4] == PARQUET_MAGIC and pack_payload(parquet) == parquet
+    assert pack_payload('{"a": 1}') == zlib.compress(b'{"a": 1}')
+    assert unpack_payload(pack_payload(parquet)) == parquet and unpack_payload(pack_payload('{"a": 1}')) == b'{"a": 1}'
+
+
+@pytest.mark.parametrize("result, dumps, loads", [(RENT_ROLL, dump_rent_roll_result, load_rent_roll_result), (REPORT, None, None)], ids=["parquet", "json"])
+def test_result_cache_and_run_store_round_trip(tmp_path, result, dumps, loads):
+    cache = ResultCache(str(tmp_path / "results.sqlite3"), max_bytes=1 << 20, ttl_seconds=60)
+    runs = RunStore(str(tmp_path / "runs.sqlite3"), max_bytes=1 << 20, memory_max_bytes=0)
+    options = {"dumps": dumps} if dumps else {}
+
+    cache.put("key", "route", result, **options)
+    runs.put("run", "route", result, **options)
+
+    for cached in (cache.get("key", **({"loads": loads} if loads else {})), runs.get("run", {"route": loads} if loads else None)):
+        if dumps:
+            pd.testing.assert_frame_equal(cached[RENT_ROLL_ROWS_KEY], result[RENT_ROLL_ROWS_KEY])
+        else:
+            assert cached == result
+    expected = pack_payload((dumps or json.dumps)(result))
+    assert _stored(tmp_path / "results.sqlite3", "results") == expected == _stored(tmp_path / "runs.sqlite3", "runs")
+
+
+def test_entries_written_zlib_compressed_still_load(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    cache = ResultCache(path, max_bytes=1 << 20, ttl_seconds=60)
+    cache.put("key", API_ENDPOINT_ROUTE_RENT_ROLL, RENT_ROLL, dumps=dump_rent_roll_result)
+    with sqlite3.connect(path) as conn: # As stored before Parquet was kept uncompressed
+        conn.execute("UPDATE results SET payload = ?", (zlib.compress(dump_rent_roll_result(RENT_ROLL)),))
+    conn.close()
+
+    pd.testing.assert_frame_equal(cache.get("key", loads=load_rent_roll_result)[RENT_ROLL_ROWS_KEY], RENT_ROLL[RENT_ROLL_ROWS_KEY])
+
+
+def test_cache_key_covers_everything_that_shapes_the_result():
+    docs = {"rent_roll": "0" * 64}
+    base = result_cache_key("route", docs, None, False, "http://a")
+
+    assert result_cache_key("route", docs, None, False, "http://a") == base
+    assert len({base, result_cache_key("route", docs, None, True, "http://a"), result_cache_key("route", docs, None, False, "http://b")}) == 3
+
+
+def test_lookup_key_follows_the_excel_preprocessing_setting_and_backend(tmp_path):
+    def _key(preprocess_excel=None, **settings):
+        settings = {"s3_bucket_name": "bucket", "api_base_url_multi_docs": "http://backend", **settings}
+        pipeline = Pipeline(Settings(result_cache_path=str(tmp_path / "results.sqlite3"), **settings))
+        return pipeline.lookup_cached(API_ENDPOINT_ROUTE_MULTI_DOCS, {"doc": "0" * 64}, preprocess_excel=preprocess_excel)[0]
+
+    assert _key() == _key(preprocess_excel=False) != _key(preprocess_excel=True) == _key(excel_preprocessing=True)
+    assert _key() != _key(api_base_url_multi_docs="http://other-backend")
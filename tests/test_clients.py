@@ -0,0 +1,84 @@
+import http.server
+import threading
+import time
+
+import pytest
+import requests
+from urllib3.exceptions import NewConnectionError, ProtocolError
+
+from cactus_pipeline.clients import make_http_session
+
+
+class _Backend(http.server.ThreadingHTTPServer):
+    """Counts POSTs per path; /gateway answers 504, /busy 503 + Retry-After twice, /slow never in time."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.hits = {}
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        hits = self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+        if self.path == "/gateway":
+            self._reply(504)
+        elif self.path == "/busy" and hits <= 2:
+            self._reply(503, [("Retry-After", "0")])
+        elif self.path == "/slow":
+            time.sleep(1)
+        else:
+            self._reply(200)
+
+
+@pytest.fixture
+def backend():
+    server = _Backend()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def test_post_answered_504_is_not_repeated(backend):
+    response = make_http_session().post(f"{backend.url}/gateway", json={}, timeout=(1, 5))
+    assert response.status_code == 504
+    assert backend.hits["/gateway"] == 1
+
+
+def test_post_turned_away_with_retry_after_is_repeated(backend):
+    response = make_http_session().post(f"{backend.url}/busy", json={}, timeout=(1, 5))
+    assert response.status_code == 200
+    assert backend.hits["/busy"] == 3
+
+
+def test_post_read_timeout_is_not_repeated(backend):
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        make_http_session().post(f"{backend.url}/slow", json={}, timeout=(1, 0.2))
+    assert backend.hits["/slow"] == 1
+
+
+def test_post_retry_rules_by_error():
+    retry = make_http_session().get_adapter("http://backend").max_retries
+    retried = retry.increment(method="POST", url="/x", error=NewConnectionError(None, "refused"))
+    assert retried.connect == retry.connect - 1
+    with pytest.raises(ProtocolError):
+        retry.increment(method="POST", url="/x", error=ProtocolError("connection dropped"))
+    assert not retry.is_retry("POST", 502)
+    assert not retry.is_retry("POST", 503)
+    assert retry.is_retry("POST", 503, has_retry_after=True)
+    assert retry.is_retry("GET", 504)
@@ -0,0 +1,32 @@
+import io
+
+import pandas as pd
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+from cactus_pipeline.exports import EXPORT_FORMATS, export_frame
+
+FRAME = pd.DataFrame({
+    "tenant_name": ["Acme", None, "Blue"],
+    "square_feet": [1000, 2000, 3000],
+    "lease_end": pd.to_datetime(["2027-01-01", None, "2029-06-30"]),
+})
+
+
+def _read(data, extension):
+    if extension == ".csv":
+        return pd.read_csv(io.BytesIO(data), parse_dates=["lease_end"])
+    if extension == ".parquet":
+        return pd.read_parquet(io.BytesIO(data))
+    return pd.read_excel(io.BytesIO(data))
+
+
+@pytest.mark.parametrize("extension", EXPORT_FORMATS)
+def test_export_passes_streamlit_download_conversion(extension):
+    data, _ = convert_data_to_bytes_and_infer_mime(export_frame(FRAME, extension), RuntimeError("unsupported download data"))
+
+    exported = _read(data, extension)
+    assert list(exported.columns) == list(FRAME.columns)
+    assert exported["tenant_name"].isna().tolist() == [False, True, False]
+    assert exported["square_feet"].tolist() == [1000, 2000, 3000]
+    assert exported["lease_end"].dt.strftime("%Y-%m-%d").tolist()[::2] == ["2027-01-01", "2029-06-30"]
@@ -0,0 +1,38 @@
+import sqlite3
+
+from cactus_pipeline.jobs import JobRegistry
+
+
+def _job(run_id, **fields):
+    return {
+        "run_id": run_id, "flow": "Multi-Docs Smart Analysis", "base_url": "http://backend", "route": "analyze", "job_id": "job-1",
+        "cache_key": None, "status": "queued", "submitted_at": 1.0, "user": "owner@example.com", **fields,
+    }
+
+
+def test_jobs_keep_their_owner(tmp_path):
+    registry = JobRegistry(str(tmp_path / "jobs.sqlite3"))
+
+    registry.record(_job("run-1"))
+    registry.set_status("run-1", "running")
+
+    assert registry.get("run-1") == _job("run-1", status="running")
+    assert registry.get("run-2") is None
+
+
+def test_registry_from_before_owners_gets_the_column(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE jobs (run_id TEXT PRIMARY KEY, flow TEXT, base_url TEXT, route TEXT, "
+            "job_id TEXT, cache_key TEXT, status TEXT, submitted_at REAL)"
+        )
+        conn.execute("INSERT INTO jobs VALUES ('old', 'Multi-Docs Smart Analysis', 'http://backend', 'analyze', 'job-0', NULL, 'queued', 1.0)")
+    conn.close()
+
+    registry = JobRegistry(path)
+    registry.record(_job("new"))
+
+    assert registry.get("old")["user"] is None
+    assert registry.get("new")["user"] == "owner@example.com"
+    JobRegistry(path) # Reopening an up-to-date registry leaves it alone
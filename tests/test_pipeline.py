@@ -0,0 +1,59 @@
+import threading
+import time
+
+import requests
+
+from cactus_pipeline import Settings
+from cactus_pipeline.pipeline import AnalysisOutcome, Pipeline
+
+
+def _pipeline(max_parallel=2):
+    return Pipeline(Settings(s3_bucket_name="bucket", api_base_url_multi_docs="http://backend", batch_max_parallel=max_parallel))
+
+
+def test_run_many_yields_every_item_and_reports_failures():
+    def analyze(payload, run_id, name, **options):
+        if payload == "http":
+            raise requests.exceptions.HTTPError("503 Server Error")
+        if payload == "broken":
+            raise ValueError("unreadable file")
+        return AnalysisOutcome("route", run_id, name, result={"payload": payload, **options})
+
+    items = [("a", "ok"), ("b", "http"), ("c", "broken"), ("d", "ok")]
+    outcomes = {outcome.name: outcome for outcome in _pipeline().run_many(analyze, items, force_refresh=True)}
+
+    assert sorted(outcomes) == ["a", "b", "c", "d"]
+    assert outcomes["a"].ok and outcomes["a"].result == {"payload": "ok", "force_refresh": True}
+    assert outcomes["b"].error == "API request failed with HTTP error: 503 Server Error"
+    assert outcomes["c"].error == "unreadable file"
+    assert len({outcome.run_id for outcome in outcomes.values()}) == 4
+
+
+def test_closing_run_many_early_cancels_queued_items_and_hands_off_running_ones():
+    release, started, abandoned = threading.Event(), [], []
+    delivered = threading.Event()
+
+    def analyze(payload, run_id, name, **options):
+        started.append(name)
+        if payload == "slow":
+            release.wait(5)
+        return AnalysisOutcome("route", run_id, name, result=payload)
+
+    def on_abandoned(outcome):
+        abandoned.append(outcome.name)
+        delivered.set()
+
+    items = [("fast", "fast"), ("slow", "slow")] + [(f"queued {i}", "slow") for i in range(5)]
+    outcomes = _pipeline(max_parallel=2).run_many(analyze, items, on_abandoned=on_abandoned)
+    assert next(outcomes).name == "fast"
+    time.sleep(0.1) # The freed worker picks up the first queued item
+
+    closed_at = time.perf_counter()
+    outcomes.close()
+    assert time.perf_counter() - closed_at < 1 # Did not wait for "slow"
+    release.set()
+    assert delivered.wait(5)
+    time.sleep(0.1)
+
+    assert sorted(started) == ["fast", "queued 0", "slow"] # The other queued items were cancelled, not run
+    assert sorted(abandoned) == ["queued 0", "slow"]
@@ -0,0 +1,161 @@
+import json
+
+import pandas as pd
+import pytest
+
+import stub_backend
+from cactus_pipeline.rent_roll import (
+    RENT_ROLL_ROWS_KEY,
+    RentRollFrameBuilder,
+    dump_rent_roll_result,
+    iter_bytes,
+    load_rent_roll_result,
+    parse_rent_roll_json,
+    query_rent_roll,
+    read_rent_roll_response,
+    rent_roll_frame,
+)
+
+STUB_RESULT = stub_backend.build_rent_roll_result({"doc_url": "rent_roll.xlsx"}, row_count=250)
+CHUNK_SIZES = (1, 7, 64, 4096, 1 << 20)
+
+
+class _StreamedResponse:
+    """The parts of a ``stream=True`` requests response read_rent_roll_response uses."""
+
+    def __init__(self, body, chunk_size):
+        self.body, self.chunk_size, self.closed = body, chunk_size, False
+
+    def iter_content(self, chunk_size):
+        return iter_bytes(self.body, self.chunk_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.closed = True
+
+
+def _frame_of(rows, chunk_rows):
+    builder = RentRollFrameBuilder(chunk_rows=chunk_rows)
+    for row in rows:
+        builder.add(row)
+    return builder.finish()
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("indent", (None, 2))
+def test_stub_response_parses_like_decoded_rows(chunk_size, indent):
+    body = json.dumps(STUB_RESULT, indent=indent).encode("utf-8")
+    response = _StreamedResponse(body, chunk_size)
+
+    result, received = read_rent_roll_response(response)
+
+    assert received == len(body) and response.closed
+    assert {key: value for key, value in result.items() if key != RENT_ROLL_ROWS_KEY} == {"status": "success", "doc_url": "rent_roll.xlsx"}
+    pd.testing.assert_frame_equal(result[RENT_ROLL_ROWS_KEY], rent_roll_frame(STUB_RESULT[RENT_ROLL_ROWS_KEY]))
+
+
+def test_stub_rows_get_column_types():
+    frame = rent_roll_frame(STUB_RESULT[RENT_ROLL_ROWS_KEY])
+
+    assert pd.api.types.is_integer_dtype(frame["square_feet"])
+    assert pd.api.types.is_float_dtype(frame["annual_rent"])
+    assert pd.api.types.is_datetime64_any_dtype(frame["lease_end"]) and frame["lease_end"].dt.tz is None
+    assert isinstance(frame["tenant_name"].dtype, pd.CategoricalDtype)
+    assert pd.api.types.is_string_dtype(frame["suite"])
+    vacant = frame["tenant_name"] == "Vacant"
+    assert frame.loc[vacant, "lease_end"].isna().all() and frame.loc[~vacant, "lease_end"].notna().all()
+
+
+TRICKY_VALUES = ["a},b", '}, {"x": 1}', 'q"},', {"n": {"m": "},"}}, [1, {"k": "},"}], "", None]
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_batch_cuts_never_split_values(chunk_size):
+    rows = [{"suite": str(i), "note": TRICKY_VALUES[i % len(TRICKY_VALUES)], "area": i} for i in range(120)]
+    document = {"status": "s},", RENT_ROLL_ROWS_KEY: rows, "after": [{"z": "},"}]}
+
+    result = parse_rent_roll_json(iter_bytes(json.dumps(document).encode("utf-8"), chunk_size))
+
+    assert result["status"] == "s}," and result["after"] == [{"z": "},"}]
+    pd.testing.assert_frame_equal(result[RENT_ROLL_ROWS_KEY], rent_roll_frame(rows))
+    assert result[RENT_ROLL_ROWS_KEY]["note"].iloc[3] == json.dumps({"n": {"m": "},"}})
+
+
+@pytest.mark.parametrize(
+    "document, rows_path, expected",
+    [
+        ({"data": {"rows": [{"a": 1}, {"a": 2}], "page": 1}}, ("data", "rows"), {"data": {"page": 1}}),
+        ({"status": "error", "message": "bad file"}, (RENT_ROLL_ROWS_KEY,), {"status": "error", "message": "bad file"}),
+        ({RENT_ROLL_ROWS_KEY: []}, (RENT_ROLL_ROWS_KEY,), {}),
+        ([1, 2], (RENT_ROLL_ROWS_KEY,), None),
+    ],
+    ids=["nested_rows", "error_body", "no_rows", "not_an_object"],
+)
+def test_documents_outside_the_rows_are_plain_json(document, rows_path, expected):
+    result = parse_rent_roll_json(iter_bytes(json.dumps(document).encode("utf-8"), 5), rows_path)
+
+    if expected is None:
+        assert result == document
+        return
+    container = result
+    for key in rows_path[:-1]:
+        container = container[key]
+    rows = container.pop(rows_path[-1], None)
+    assert result == expected
+    if rows is not None:
+        assert len(rows) == len(document[rows_path[0]] if len(rows_path) == 1 else document["data"]["rows"])
+
+
+@pytest.mark.parametrize(
+    "values, check",
+    [
+        ([None, None, 1, 2.5], lambda column: pd.api.types.is_float_dtype(column)),
+        ([None, None, None, None], lambda column: column.isna().all()),
+        ([1, 2, 3, "N/A"], lambda column: column.astype(str).tolist() == ["1", "2", "3", "N/A"]),
+        (["2024-01-31", None, "TBD", "2025-02-28"], lambda column: column.dropna().astype(str).tolist() == ["2024-01-31", "TBD", "2025-02-28"]),
+        ([True, False, None, True], lambda column: column.dtype == "boolean" and column.dropna().tolist() == [True, False, True]),
+        ([{"a": 1}, [1], "x", None], lambda column: column.dropna().tolist() == ['{"a": 1}', "[1]", "x"]),
+    ],
+    ids=["numeric_after_nulls", "all_null", "number_then_text", "date_then_text", "booleans", "nested_values"],
+)
+@pytest.mark.parametrize("chunk_rows", (1, 2, 5000))
+def test_column_type_is_decided_over_the_whole_column(values, check, chunk_rows):
+    frame = _frame_of([{"column": value} for value in values], chunk_rows)
+
+    assert check(frame["column"])
+    assert frame["column"].isna().tolist() == [value is None for value in values]
+    pd.testing.assert_frame_equal(load_rent_roll_result(dump_rent_roll_result({RENT_ROLL_ROWS_KEY: frame}))[RENT_ROLL_ROWS_KEY], frame)
+
+
+def test_missing_text_stays_missing():
+    frame = rent_roll_frame([{"tenant_name": f"Tenant {i}", "suite": str(i)} for i in range(10)] + [{"tenant_name": None, "suite": "99"}])
+
+    assert frame["tenant_name"].isna().tolist() == [False] * 10 + [True]
+    assert len(query_rent_roll(frame, search="none")) == 0
+
+
+@pytest.mark.parametrize(
+    "values, expected_tz, expected",
+    [
+        (["2024-01-31", "2024-02-29T10:30"], None, ["2024-01-31 00:00", "2024-02-29 10:30"]),
+        (["2024-01-31T00:00:00Z", "2024-02-29T00:00:00Z"], "UTC", ["2024-01-31 00:00", "2024-02-29 00:00"]),
+        (["2027-01-01T00:00:00Z", "2027-01-01"], "UTC", ["2027-01-01 00:00", "2027-01-01 00:00"]),
+        (["2027-01-01T00:00:00+02:00", "2027-01-01T00:00:00-05:00"], "UTC", ["2026-12-31 22:00", "2027-01-01 05:00"]),
+        (["01/31/2024", "2/1/2024"], None, ["2024-01-31 00:00", "2024-02-01 00:00"]),
+        (["2024-1-31", "2024-02-01"], "text", None),
+        (["2024-01-31", "soon"], "text", None),
+        (["2024-02-30", "2024-03-01"], "text", None),
+    ],
+    ids=["iso", "utc", "utc_and_naive", "mixed_offsets", "us", "unpadded", "not_a_date", "invalid_day"],
+)
+def test_date_detection(values, expected_tz, expected):
+    column = rent_roll_frame([{"lease_end": value} for value in values])["lease_end"]
+
+    if expected_tz == "text":
+        assert not pd.api.types.is_datetime64_any_dtype(column)
+        assert column.astype(str).tolist() == values
+        return
+    assert str(column.dt.tz) == str(expected_tz)
+    assert column.dt.strftime("%Y-%m-%d %H:%M").tolist() == expected
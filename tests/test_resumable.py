@@ -0,0 +1,105 @@
+import io
+import os
+import time
+
+import pytest
+
+from cactus_pipeline import resumable as resumable_module
+from cactus_pipeline.resumable import ResumableUploads
+
+BUCKET = "test-bucket" # conftest's s3.bucket
+PART_BYTES = 64 * 1024
+CONTENT = os.urandom(10 * PART_BYTES + 100) # 11 parts, the last one short
+
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    monkeypatch.setattr(resumable_module, "RESUMABLE_PART_BYTES", PART_BYTES)
+    return ResumableUploads(str(tmp_path / "uploads.sqlite3"), str(tmp_path / "spool"))
+
+
+def _sent_parts(s3_client, monkeypatch, failing=None):
+    """Record the part numbers sent from now on; sending part ``failing`` raises a connection error."""
+    upload_part, sent = type(s3_client).upload_part.__get__(s3_client), []
+
+    def _upload_part(**kwargs):
+        if kwargs["PartNumber"] == failing:
+            raise OSError("connection reset")
+        sent.append(kwargs["PartNumber"])
+        return upload_part(**kwargs)
+
+    monkeypatch.setattr(s3_client, "upload_part", _upload_part)
+    return sent
+
+
+def _fail_upload(uploads, s3_client, monkeypatch, s3_key, failing):
+    _sent_parts(s3_client, monkeypatch, failing)
+    with pytest.raises(OSError):
+        uploads.upload(io.BytesIO(CONTENT), BUCKET, s3_key, s3_client, run_id="run-a")
+    return uploads.checkpoint(BUCKET, s3_key)["parts"]
+
+
+@pytest.mark.parametrize("retry_key", ["runs/run-a/doc.pdf", "runs/run-b/doc.pdf"], ids=["same_key", "new_run_id"])
+def test_retry_resumes_after_the_failed_part(s3, s3_client, uploads, monkeypatch, retry_key):
+    done = _fail_upload(uploads, s3_client, monkeypatch, "runs/run-a/doc.pdf", failing=5)
+    assert 5 not in done and len(done) >= 4
+    sent_parts = _sent_parts(s3_client, monkeypatch)
+
+    progress = []
+    assert uploads.upload(
+        io.BytesIO(CONTENT), BUCKET, retry_key, s3_client, run_id="run-b",
+        progress_callback=lambda bytes_transferred: progress.append(bytes_transferred),
+    ) == retry_key
+
+    assert sorted(sent_parts) == [number for number in range(1, 12) if number not in done]
+    assert sum(progress) == len(CONTENT)
+    assert s3.state.buckets[BUCKET] == {retry_key: CONTENT}
+    assert not s3.state.uploads
+    assert uploads.checkpoint(BUCKET, "runs/run-a/doc.pdf") is None and uploads.checkpoint(BUCKET, retry_key) is None
+    assert not os.listdir(uploads.spool_dir)
+
+
+def test_other_content_starts_over(s3, s3_client, uploads, monkeypatch):
+    _fail_upload(uploads, s3_client, monkeypatch, "runs/run-a/doc.pdf", failing=5)
+    sent_parts = _sent_parts(s3_client, monkeypatch)
+    changed = CONTENT[:-1] + bytes([CONTENT[-1] ^ 1])
+
+    uploads.upload(io.BytesIO(changed), BUCKET, "runs/run-b/doc.pdf", s3_client)
+
+    assert sorted(sent_parts) == list(range(1, 12))
+    assert s3.state.buckets[BUCKET] == {"runs/run-b/doc.pdf": changed}
+    assert uploads.checkpoint(BUCKET, "runs/run-a/doc.pdf") is not None # Left for the sweep
+    assert len(s3.state.uploads) == 1
+
+
+def test_known_digest_is_not_recomputed(s3, s3_client, uploads, monkeypatch):
+    monkeypatch.setattr(resumable_module, "_content_digest", lambda path: pytest.fail("hashed a file whose digest was given"))
+
+    uploads.upload(io.BytesIO(CONTENT), BUCKET, "runs/run-a/doc.pdf", s3_client, digest="0" * 64)
+
+    assert s3.state.buckets[BUCKET] == {"runs/run-a/doc.pdf": CONTENT}
+
+
+def test_sweep_aborts_old_uploads_and_deletes_unclaimed_staged_objects(s3, s3_client, uploads, monkeypatch):
+    _fail_upload(uploads, s3_client, monkeypatch, "runs/old/doc.pdf", failing=2)
+    (old_upload,) = s3.state.uploads.values()
+    old_upload["initiated"] = time.time() - 7200
+    recent_id = s3_client.create_multipart_upload(Bucket=BUCKET, Key="runs/recent/doc.pdf")["UploadId"]
+    for key in ("runs/staged/a.pdf", "runs/claimed/b.pdf", "elsewhere/c.pdf"):
+        s3_client.put_object(Bucket=BUCKET, Key=key, Body=b"staged")
+        uploads.record_staged(BUCKET, key)
+    uploads.forget_staged(BUCKET, "runs/claimed/b.pdf")
+
+    assert uploads.sweep(s3_client, BUCKET, "runs/", older_than_seconds=3600) == 1
+
+    assert list(s3.state.uploads) == [recent_id]
+    assert uploads.checkpoint(BUCKET, "runs/old/doc.pdf") is None
+    assert set(s3.state.buckets[BUCKET]) == {"runs/staged/a.pdf", "runs/claimed/b.pdf", "elsewhere/c.pdf"}
+    assert os.listdir(uploads.spool_dir) # Spooled within the cutoff
+
+    time.sleep(1.1) # The listing reports whole seconds
+    assert uploads.sweep(s3_client, BUCKET, "runs/", older_than_seconds=0) == 1
+
+    assert not s3.state.uploads
+    assert set(s3.state.buckets[BUCKET]) == {"runs/claimed/b.pdf", "elsewhere/c.pdf"}
+    assert not os.listdir(uploads.spool_dir)
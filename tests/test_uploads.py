@@ -0,0 +1,178 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cactus_pipeline import resumable as resumable_module
+from cactus_pipeline import uploads as uploads_module
+from cactus_pipeline.resumable import ResumableUploads
+from cactus_pipeline.uploads import SpeculativeUploads, _private_view
+
+
+class _Staged(io.BytesIO):
+    """Stands in for a Streamlit UploadedFile."""
+
+    def __init__(self, data, name="doc.pdf", file_id="1"):
+        super().__init__(data)
+        self.name, self.file_id = name, file_id
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=1) # One worker: queued work runs in order, so _drain waits for it
+    yield executor
+    executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def resumable(tmp_path):
+    return ResumableUploads(str(tmp_path / "uploads.sqlite3"), str(tmp_path / "spool"))
+
+
+@pytest.fixture
+def staged(s3, s3_client, executor, resumable):
+    return SpeculativeUploads(executor, s3.bucket, "runs/run-a", s3_client, resumable=resumable, run_id="run-a")
+
+
+def _drain(executor):
+    executor.submit(lambda: None).result()
+
+
+def _objects(s3):
+    return dict(s3.state.buckets[s3.bucket])
+
+
+def _gate(s3_client, event_name):
+    """Hold the first request for ``event_name`` until the returned ``release`` is set; ``entered`` is set once it is held."""
+    entered, release = threading.Event(), threading.Event()
+
+    def _hold(**kwargs):
+        if not entered.is_set():
+            entered.set()
+            release.wait(timeout=10)
+
+    s3_client.meta.events.register(event_name, _hold)
+    return entered, release
+
+
+def test_cancel_before_the_upload_starts_writes_nothing(s3, staged, executor):
+    blocker = threading.Event()
+    executor.submit(blocker.wait)
+    staged.sync({"doc": _Staged(b"x" * 1000)})
+
+    staged.cancel_all()
+    blocker.set()
+    _drain(executor)
+
+    assert _objects(s3) == {}
+
+
+def test_cancel_after_the_upload_finished_deletes_the_object(s3, s3_client, staged, executor, resumable):
+    staged.sync({"doc": _Staged(b"x" * 1000)})
+    _drain(executor)
+    assert _objects(s3) == {"runs/run-a/doc.pdf": b"x" * 1000}
+
+    staged.cancel_all()
+
+    assert _objects(s3) == {}
+    s3_client.put_object(Bucket=s3.bucket, Key="runs/run-a/doc.pdf", Body=b"written again")
+    resumable.sweep(s3_client, s3.bucket, "runs/", older_than_seconds=0)
+    assert _objects(s3) == {"runs/run-a/doc.pdf": b"written again"} # No longer recorded as staged
+
+
+def test_collected_uploads_survive_cancel_and_sweep(s3, s3_client, staged, resumable):
+    document = _Staged(b"x" * 1000)
+
+    s3_keys, errors, _ = staged.collect({"doc": document})
+    staged.cancel_all()
+    resumable.sweep(s3_client, s3.bucket, "runs/", older_than_seconds=0)
+
+    assert (s3_keys, errors) == ({"doc": "runs/run-a/doc.pdf"}, {})
+    assert _objects(s3) == {"runs/run-a/doc.pdf": b"x" * 1000}
+
+
+def test_uncollected_uploads_are_swept(s3, s3_client, staged, executor, resumable):
+    staged.sync({"doc": _Staged(b"x" * 1000)})
+    _drain(executor)
+
+    resumable.sweep(s3_client, s3.bucket, "runs/", older_than_seconds=0)
+
+    assert _objects(s3) == {}
+
+
+def test_collect_retries_a_failed_upload(s3, s3_client, staged, executor):
+    attempts = []
+
+    def _fail_first(**kwargs):
+        attempts.append(kwargs["model"].name)
+        if len(attempts) == 1:
+            raise RuntimeError("backend dropped the upload")
+
+    s3_client.meta.events.register("before-call.s3.PutObject", _fail_first)
+    staged.sync({"doc": _Staged(b"x" * 1000)})
+    _drain(executor)
+
+    s3_keys, errors, progress = staged.collect({"doc": _Staged(b"x" * 1000)})
+
+    assert (s3_keys, errors) == ({"doc": "runs/run-a/doc.pdf"}, {})
+    assert len(attempts) == 2 and progress.done == {"doc"}
+    assert _objects(s3) == {"runs/run-a/doc.pdf": b"x" * 1000}
+
+
+def test_collect_reports_an_upload_that_keeps_failing(s3, s3_client, staged):
+    def _fail(**kwargs):
+        raise RuntimeError("backend dropped the upload")
+
+    s3_client.meta.events.register("before-call.s3.PutObject", _fail)
+
+    s3_keys, errors, _ = staged.collect({"doc": _Staged(b"x" * 1000)})
+
+    assert s3_keys == {} and "backend dropped the upload" in errors["doc"]
+    assert _objects(s3) == {}
+
+
+@pytest.mark.parametrize(
+    "event_name, resumable_upload",
+    [("before-send.s3.PutObject", False), ("after-call.s3.PutObject", False), ("before-send.s3.UploadPart", True)],
+    ids=["replaced_while_sending", "replaced_after_the_put_landed", "replaced_mid_multipart"],
+)
+def test_file_replaced_mid_upload_leaves_only_the_new_one(s3, s3_client, staged, executor, monkeypatch, event_name, resumable_upload):
+    if resumable_upload:
+        monkeypatch.setattr(uploads_module, "RESUMABLE_MIN_BYTES", 0)
+        monkeypatch.setattr(resumable_module, "RESUMABLE_PART_BYTES", 64 * 1024)
+    first, second = _Staged(b"1" * 200_000, file_id="1"), _Staged(b"2" * 150_000, file_id="2")
+    entered, release = _gate(s3_client, event_name)
+    staged.sync({"doc": first})
+    assert entered.wait(timeout=10)
+
+    staged.sync({"doc": second}) # Same name, so the same key: the new upload waits for the old one to be cleaned up
+    release.set()
+    s3_keys, errors, _ = staged.collect({"doc": second})
+
+    assert (s3_keys, errors) == ({"doc": "runs/run-a/doc.pdf"}, {})
+    _drain(executor)
+    assert _objects(s3) == {"runs/run-a/doc.pdf": b"2" * 150_000}
+    assert not s3.state.uploads
+
+
+def test_private_view_reads_the_same_bytes_without_moving_the_file():
+    data = bytes(range(256)) * 4
+    document = _Staged(data)
+    document.seek(10)
+
+    view = _private_view(document)
+
+    assert view.read(5) == data[:5] and document.tell() == 10
+    buffer = bytearray(8)
+    assert view.readinto(buffer) == 8 and bytes(buffer) == data[5:13]
+    assert view.seek(-3, io.SEEK_END) == len(data) - 3 and view.read() == data[-3:]
+    assert view.read(10) == b"" and view.seek(5000) == 5000 and view.read() == b""
+    view.seek(0)
+    assert view.read() == data and view.name == "doc.pdf" and view.size == len(data)
+    assert not view.writable()
+
+
+def test_private_view_keeps_files_without_a_buffer():
+    with open(__file__, "rb") as document:
+        assert _private_view(document) is document